@@ -18,36 +18,976 @@ import time
 import os
 import json 
 import base64
+import gzip
+import hashlib
+import lzma
+import zlib
+import struct
+import tempfile
+import random
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+try:
+    import dropbox
+except ImportError:  # only needed for BACKUP_BACKEND=dropbox
+    dropbox = None
+from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Tuple
 import threading
 import time
 import asyncio
+import functools
+import itertools
+import sys
+import queue
+import warnings
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from collections import OrderedDict, deque
 
 DB_PATH = 'confessions.db'
 # Enhanced GitHub Backup Configuration
 GITHUB_ACCESS_TOKEN = os.getenv('GITHUB_ACCESS_TOKEN')
 GITHUB_REPO_OWNER = os.getenv('GITHUB_REPO_OWNER')
 GITHUB_REPO_NAME = os.getenv('GITHUB_REPO_NAME')
-GITHUB_BACKUP_PATH = "data/confessions.db"
+GITHUB_BACKUP_PATH = "data/confessions.db"  # legacy single-file backups, still restorable
+GITHUB_BRANCH = "main"
+GITHUB_API_URL = os.getenv('GITHUB_API_URL', 'https://api.github.com')
+GITHUB_TIMEOUT_SECONDS = 30  # per request; a hung connection must not wedge the backup worker
+GITHUB_MAX_RETRIES = 4  # retries on 429/5xx/connection errors
+GITHUB_BACKOFF_SECONDS = 1.0  # first retry delay, doubled per attempt with jitter
+
+# Backup storage: "github" (default), "local" (a directory, e.g. fast disk for hot backups) or "dropbox"
+BACKUP_BACKEND = os.getenv('BACKUP_BACKEND', 'github')
+BACKUP_LOCAL_DIR = os.getenv('BACKUP_LOCAL_DIR', 'backups')
+DROPBOX_ACCESS_TOKEN = os.getenv('DROPBOX_ACCESS_TOKEN')
+BACKUP_DROPBOX_ROOT = os.getenv('BACKUP_DROPBOX_ROOT', '/confessions-backup')
+# Object keys, the same on every backend
+BACKUP_MANIFEST_KEY = "data/confessions.manifest.json"
+BACKUP_CHUNK_DIR = "data/chunks"
+BACKUP_DELTA_DIR = "data/deltas"
+BACKUP_LOG_DIR = "data/log"
+BACKUP_INDEX_KEY = "data/confessions.index.json"
+BACKUP_VERSION_DIR = "data/versions"
+# Grandfather-father-son retention: (bucket length in seconds, newest buckets kept), one version per bucket
+BACKUP_RETENTION = [
+    (5 * 60, 12),  # 12 five-minute versions
+    (60 * 60, 24),  # 24 hourly
+    (24 * 60 * 60, 14),  # 14 daily
+]
 
 # Backup control variables
-backup_in_progress = False
 BACKUP_INTERVAL_MINUTES = 5  # 5-minute backup interval
+BACKUP_MIN_INTERVAL_SECONDS = 60  # at most one upload per minute, however many writes
+BACKUP_MAX_STALENESS_SECONDS = BACKUP_INTERVAL_MINUTES * 60  # upload at least this often even without triggers
+BACKUP_COMPRESSION = "gzip"  # "gzip" (fast) or "lzma" (smaller, several times slower)
+BACKUP_CHUNK_SIZE = 4 * 1024 * 1024  # bytes of snapshot per chunk; bounds memory per upload step
+BACKUP_MAX_DELTA_BYTES = 4 * BACKUP_CHUNK_SIZE  # larger page deltas become a rebase, so restore memory stays bounded too
+BACKUP_STREAM_BLOCK_SIZE = 1024 * 1024  # read/decompress step when streaming a single-file backup
+BACKUP_MANIFEST_FORMAT = "chunked-v1"
+BACKUP_INCREMENTAL = True  # ship changed pages between full bases
+BACKUP_MAX_DELTAS = 48  # deltas before the chain is folded into a new base
+BACKUP_REBASE_RATIO = 0.5  # ...or once the chain outgrows this share of the database
+BACKUP_TEST_TIMEOUT_SECONDS = 120  # /test_github_backup waits this long for its upload
+CHANGE_LOG_SHIP_SECONDS = 15  # ship logged writes this often between snapshots (the recovery point objective)
+CHANGE_LOG_SEGMENT_MAX_ROWS = 5000
+CHANGE_LOG_MAX_ROWS = 100_000  # unshipped rows kept while shipping fails; older ones are pruned ...
+CHANGE_LOG_MAX_AGE_SECONDS = 24 * 60 * 60  # ... as are rows older than this
+BACKUP_FAILURE_WINDOW_SECONDS = 60 * 60  # rolling window for the recent failure count
+_backup_lock = threading.Lock()
+_manifest_lock = threading.Lock()  # serializes manifest commits between snapshot backups and log shipping
+_last_backup_digest = None  # sha256 of the last snapshot the backend accepted
+_backup_page_state = None  # page fingerprints of that snapshot, the base for the next delta
+_backup_index = None  # retained versions as last read or written
+_version_manifests = {}  # version key -> manifest; versions never change once written
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+GZIP_MAGIC = b"\x1f\x8b"
+XZ_MAGIC = b"\xfd7zXZ\x00"
+DELTA_MAGIC = b"CFDELTA1"
+
+def compress_backup(data: bytes) -> bytes:
+    """Compress a snapshot deterministically (same input, same bytes) for upload"""
+    if BACKUP_COMPRESSION == "lzma":
+        return lzma.compress(data, preset=6)
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+def decompress_backup(data: bytes) -> bytes:
+    """Return the raw database from a backup in any format we have ever uploaded"""
+    if data.startswith(GZIP_MAGIC):
+        return gzip.decompress(data)
+    if data.startswith(XZ_MAGIC):
+        return lzma.decompress(data)
+    return data
+
+def write_decompressed(blocks, f):
+    """Write a backup arriving as byte blocks to f, decompressing on the fly.
+
+    Output is produced at most BACKUP_STREAM_BLOCK_SIZE at a time, so memory
+    stays bounded however well the data compresses.
+    """
+    decompressor = None
+    for block in blocks:
+        if not block:
+            continue
+        if decompressor is None:
+            if block.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(wbits=31)
+            elif block.startswith(XZ_MAGIC):
+                decompressor = lzma.LZMADecompressor()
+            else:
+                decompressor = False
+        if decompressor is False:
+            f.write(block)
+        elif isinstance(decompressor, lzma.LZMADecompressor):
+            f.write(decompressor.decompress(block, BACKUP_STREAM_BLOCK_SIZE))
+            while not decompressor.needs_input and not decompressor.eof:
+                f.write(decompressor.decompress(b"", BACKUP_STREAM_BLOCK_SIZE))
+        else:
+            while block:
+                f.write(decompressor.decompress(block, BACKUP_STREAM_BLOCK_SIZE))
+                block = decompressor.unconsumed_tail
+    if decompressor:
+        if isinstance(decompressor, lzma.LZMADecompressor):
+            if not decompressor.eof:
+                raise ValueError("truncated xz backup")
+        else:
+            f.write(decompressor.flush())
+            if not decompressor.eof:
+                raise ValueError("truncated gzip backup")
+
+def git_blob_sha(data: bytes) -> str:
+    """SHA GitHub reports for a file with this content"""
+    return hashlib.sha1(b"blob %d\x00" % len(data) + data).hexdigest()
+
+def create_db_snapshot() -> Optional[str]:
+    """Write a transactionally consistent copy of the database to a temp file and validate it.
+
+    Uses the online backup API in a single step. In WAL mode that step is
+    just a read transaction, so writers are not blocked. A stepwise copy
+    would restart every time another connection commits, and under steady
+    writes it may never finish. Returns the snapshot path (the caller
+    deletes it) or None if the snapshot fails quick_check.
+    """
+    fd, snapshot_path = tempfile.mkstemp(prefix="confessions-", suffix=".snapshot", dir=os.path.dirname(os.path.abspath(DB_PATH)))
+    os.close(fd)
+    dst = sqlite3.connect(snapshot_path)
+    try:
+        # Read through the pool gate, so a restore cannot swap the file out from under the copy
+        with db_connection() as src:
+            src.backup(dst)
+        # Self-contained file: no -wal sidecar needed when it is restored
+        dst.execute("PRAGMA journal_mode=DELETE")
+        # Logged changes travel as segments; the snapshot keeps only its log position (sqlite_sequence)
+        if dst.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_log'").fetchone():
+            dst.execute("DELETE FROM change_log")
+            dst.commit()
+        result = dst.execute("PRAGMA quick_check").fetchone()[0]
+    except Exception:
+        dst.close()
+        os.remove(snapshot_path)
+        raise
+    dst.close()
+
+    if result != "ok":
+        print(f"❌ Snapshot failed quick_check: {result}")
+        os.remove(snapshot_path)
+        return None
+    return snapshot_path
+
+def _github_headers() -> Dict[str, str]:
+    return {
+        'Authorization': f'token {GITHUB_ACCESS_TOKEN}',
+        'Accept': 'application/vnd.github.v3+json'
+    }
+
+def _github_url(path: str) -> str:
+    return f'{GITHUB_API_URL}/repos/{GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME}/{path}'
+
+class BackupConflict(Exception):
+    """The manifest changed under us; reload it and try again"""
+
+class GitHubConflict(BackupConflict):
+    """The branch moved under us (409/422); the cached head is stale"""
+
+class GitHubTransport:
+    """Pooled HTTPS session to the GitHub API with timeouts and retry/backoff.
+
+    Requests that fail with 429, a 5xx or a connection error are retried with
+    exponential backoff plus jitter (honouring Retry-After). The transport also
+    remembers the commit, tree and manifest of its own last ref update, so a
+    steady-state backup does not have to read them back before committing.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_retries: int = GITHUB_MAX_RETRIES, backoff: float = GITHUB_BACKOFF_SECONDS,
+                 timeout: float = GITHUB_TIMEOUT_SECONDS):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.head = None  # {'commit', 'tree', 'manifest'} after our last successful ref update
+        self.calls = 0
+        self.retries = 0
+        self._session = None
+        self._lock = threading.Lock()
+
+    def session(self) -> requests.Session:
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=4))
+                self._session = session
+            return self._session
+
+    def _delay(self, attempt: int, response=None) -> float:
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return self.backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def request(self, method: str, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        kwargs['headers'] = {**_github_headers(), **kwargs.get('headers', {})}
+        for attempt in range(self.max_retries + 1):
+            self.calls += 1
+            try:
+                response = self.session().request(method, _github_url(path), **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self._delay(attempt)
+                print(f"⚠️ GitHub {method} {path} failed ({e}), retrying in {delay:.1f}s")
+            else:
+                rate_limited = response.status_code == 403 and response.headers.get('X-RateLimit-Remaining') == '0'
+                if attempt == self.max_retries or not (response.status_code in self.RETRY_STATUSES or rate_limited):
+                    return response
+                delay = self._delay(attempt, response)
+                print(f"⚠️ GitHub {method} {path} returned {response.status_code}, retrying in {delay:.1f}s")
+            self.retries += 1
+            time.sleep(delay)
+
+    def get(self, path: str, **kwargs) -> requests.Response:
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path: str, **kwargs) -> requests.Response:
+        return self.request('POST', path, **kwargs)
+
+    def patch(self, path: str, **kwargs) -> requests.Response:
+        return self.request('PATCH', path, **kwargs)
+
+    def remember_head(self, commit_sha: str, tree_sha: str, manifest: Dict[str, Any]):
+        self.head = {'commit': commit_sha, 'tree': tree_sha, 'manifest': manifest}
+
+    def forget_head(self):
+        self.head = None
+
+def _raise_for_status(response: requests.Response):
+    if response.status_code in (409, 422):
+        raise GitHubConflict(f"{response.status_code} {response.text[:200]}")
+    response.raise_for_status()
+
+def backup_object_keys(manifest: Dict[str, Any]) -> Dict[str, str]:
+    """Object key -> backend locator for every object a manifest references"""
+    keys = {f"{BACKUP_CHUNK_DIR}/{c['sha256']}": c['blob'] for c in manifest['chunks']}
+    for d in manifest.get('deltas') or []:
+        keys[f"{BACKUP_DELTA_DIR}/{d['sha256']}"] = d['blob']
+    for segment in manifest.get('log') or []:
+        keys[_log_segment_key(segment['first_seq'], segment['last_seq'])] = segment['blob']
+    return keys
+
+def _log_segment_key(first_seq: int, last_seq: int) -> str:
+    return f"{BACKUP_LOG_DIR}/{first_seq:012d}-{last_seq:012d}"
+
+class BackupBackend:
+    """Where backup objects live: chunks, deltas and log segments, plus the manifest tying them together.
+
+    Objects are immutable and content-addressed. put() returns the locator
+    recorded in the manifest (the key itself unless the store names objects
+    its own way), and get() raises KeyError for a missing object. Named
+    documents (manifest, version index, retained versions) are read by key
+    alone. publish() makes a new manifest current together with any extra
+    documents, then removes the objects the caller found unreferenced.
+    """
+
+    name = "none"
+
+    def is_configured(self) -> bool:
+        raise NotImplementedError
+
+    def describe(self) -> str:
+        return self.name
+
+    def put(self, key: str, data: bytes) -> str:
+        raise NotImplementedError
+
+    def get(self, key: str, locator: str) -> bytes:
+        raise NotImplementedError
+
+    def list(self, prefix: str = "") -> List[str]:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def read(self, key: str) -> Optional[bytes]:
+        """A named document, or None if it does not exist"""
+        try:
+            return self.get(key, key)
+        except KeyError:
+            return None
+
+    def load_manifest(self) -> Optional[Dict[str, Any]]:
+        """The manifest as currently stored, or None before the first backup"""
+        data = self.read(BACKUP_MANIFEST_KEY)
+        return json.loads(data) if data is not None else None
+
+    def current_manifest(self) -> Optional[Dict[str, Any]]:
+        """Like load_manifest, but may answer from what this process last published"""
+        return self.load_manifest()
+
+    def publish(self, manifest: Dict[str, Any], previous: Optional[Dict[str, Any]], message: str,
+                documents: Optional[Dict[str, bytes]] = None, removed: List[str] = ()):
+        for key, data in (documents or {}).items():
+            self.put(key, data)
+        self.put(BACKUP_MANIFEST_KEY, json.dumps(manifest, indent=1).encode())
+        for key in removed:
+            self.delete(key)
+
+    def refresh(self):
+        """Drop anything cached about the remote state after a conflict"""
+
+    @contextmanager
+    def open_legacy_snapshot(self):
+        """Byte blocks of a pre-manifest single-file backup, or None if this store has none"""
+        yield None
+
+class GitHubBackend(BackupBackend):
+    """Objects are git blobs on GITHUB_BRANCH; every publish is one commit built with the git data API.
+
+    Blob uploads go through the pooled transport and only become reachable
+    once the commit lands. The head of our own last commit is cached, so a
+    steady-state publish skips reading the ref and tree back; if someone
+    else moved the branch, the non-forced ref update fails with GitHubConflict.
+    """
+
+    name = "github"
+
+    def __init__(self, transport: Optional[GitHubTransport] = None):
+        self.transport = transport or GitHubTransport()
+
+    def is_configured(self) -> bool:
+        return all([GITHUB_ACCESS_TOKEN, GITHUB_REPO_OWNER, GITHUB_REPO_NAME])
+
+    def describe(self) -> str:
+        return f"GitHub {GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME}@{GITHUB_BRANCH}"
+
+    def put(self, key: str, data: bytes) -> str:
+        response = self.transport.post('git/blobs', timeout=60,
+                                       json={'content': base64.b64encode(data).decode('ascii'), 'encoding': 'base64'})
+        response.raise_for_status()
+        blob_sha = response.json()['sha']
+        if blob_sha != git_blob_sha(data):
+            raise RuntimeError(f"GitHub stored blob as {blob_sha}, expected {git_blob_sha(data)}")
+        return blob_sha
+
+    def get(self, key: str, locator: str) -> bytes:
+        response = self.transport.get(f"git/blobs/{locator}", timeout=60)
+        if response.status_code == 404:
+            raise KeyError(key)
+        response.raise_for_status()
+        return base64.b64decode(response.json()['content'])
+
+    def list(self, prefix: str = "") -> List[str]:
+        response = self.transport.get(f'git/trees/{GITHUB_BRANCH}', params={'recursive': '1'}, timeout=60)
+        if response.status_code in (404, 409):  # no branch or an empty repository
+            return []
+        response.raise_for_status()
+        return sorted(entry['path'] for entry in response.json()['tree']
+                      if entry['type'] == 'blob' and entry['path'].startswith(prefix))
+
+    def delete(self, key: str):
+        self._commit([{'path': key, 'mode': '100644', 'type': 'blob', 'sha': None}], f"Remove {key}")
+
+    def read(self, key: str) -> Optional[bytes]:
+        response = self.transport.get(f'contents/{key}', params={'ref': GITHUB_BRANCH})
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return base64.b64decode(response.json()['content'])
+
+    def current_manifest(self) -> Optional[Dict[str, Any]]:
+        head = self.transport.head
+        return head['manifest'] if head else self.load_manifest()
+
+    def publish(self, manifest: Dict[str, Any], previous: Optional[Dict[str, Any]], message: str,
+                documents: Optional[Dict[str, bytes]] = None, removed: List[str] = ()):
+        # base_tree already holds everything the previous manifest referenced, so send only the difference
+        old_keys = backup_object_keys(previous) if previous else {}
+        entries = [{'path': BACKUP_MANIFEST_KEY, 'mode': '100644', 'type': 'blob',
+                    'content': json.dumps(manifest, indent=1)}]
+        entries += [{'path': key, 'mode': '100644', 'type': 'blob', 'content': data.decode()}
+                    for key, data in (documents or {}).items()]
+        entries += [{'path': key, 'mode': '100644', 'type': 'blob', 'sha': sha}
+                    for key, sha in backup_object_keys(manifest).items() if old_keys.get(key) != sha]
+        # Removed objects drop out of the tree (they stay in history)
+        entries += [{'path': key, 'mode': '100644', 'type': 'blob', 'sha': None} for key in removed]
+        self._commit(entries, message, manifest)
+
+    def _commit(self, entries: List[Dict[str, Any]], message: str, manifest: Optional[Dict[str, Any]] = None):
+        head = self.transport.head
+        if head and manifest is not None:
+            head_sha, base_tree = head['commit'], head['tree']
+        else:
+            response = self.transport.get(f'git/ref/heads/{GITHUB_BRANCH}')
+            _raise_for_status(response)
+            head_sha = response.json()['object']['sha']
+
+            response = self.transport.get(f'git/commits/{head_sha}')
+            _raise_for_status(response)
+            base_tree = response.json()['tree']['sha']
+
+        response = self.transport.post('git/trees', timeout=60, json={'base_tree': base_tree, 'tree': entries})
+        _raise_for_status(response)
+        tree_sha = response.json()['sha']
+
+        response = self.transport.post('git/commits', json={'message': message, 'tree': tree_sha, 'parents': [head_sha]})
+        _raise_for_status(response)
+        commit_sha = response.json()['sha']
+
+        # Not forced: a fast-forward check rejects the update if someone else committed meanwhile
+        response = self.transport.patch(f'git/refs/heads/{GITHUB_BRANCH}', json={'sha': commit_sha, 'force': False})
+        _raise_for_status(response)
+        if manifest is not None:
+            self.transport.remember_head(commit_sha, tree_sha, manifest)
+        else:
+            self.transport.forget_head()
+
+    def refresh(self):
+        self.transport.forget_head()
+
+    @contextmanager
+    def open_legacy_snapshot(self):
+        # The raw media type streams the file itself instead of base64 inside JSON
+        response = self.transport.get(f'contents/{GITHUB_BACKUP_PATH}', params={'ref': GITHUB_BRANCH}, stream=True,
+                                      headers={'Accept': 'application/vnd.github.raw'})
+        try:
+            yield response.iter_content(BACKUP_STREAM_BLOCK_SIZE) if response.status_code == 200 else None
+        finally:
+            response.close()
+
+class LocalBackend(BackupBackend):
+    """Objects are files under a directory, e.g. a fast local or mounted disk for hot backups"""
+
+    name = "local"
+
+    def __init__(self, root: str = None):
+        self.root = os.path.abspath(root or BACKUP_LOCAL_DIR)
+
+    def is_configured(self) -> bool:
+        return bool(self.root)
+
+    def describe(self) -> str:
+        return f"Local {self.root}"
+
+    def _path(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Backup key escapes the backup directory: {key}")
+        return path
+
+    def put(self, key: str, data: bytes) -> str:
+        path = self._path(key)
+        # Content-addressed objects never change once written; named documents are overwritten
+        if key.startswith((BACKUP_CHUNK_DIR, BACKUP_DELTA_DIR, BACKUP_LOG_DIR)) and os.path.exists(path):
+            return key
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key
+
+    def get(self, key: str, locator: str) -> bytes:
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            raise KeyError(key)
+
+    def list(self, prefix: str = "") -> List[str]:
+        keys = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                key = os.path.relpath(os.path.join(dirpath, filename), self.root).replace(os.sep, '/')
+                if key.startswith(prefix) and not filename.endswith('.tmp'):
+                    keys.append(key)
+        return sorted(keys)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+class DropboxBackend(BackupBackend):
+    """Objects are files under BACKUP_DROPBOX_ROOT in a Dropbox app folder, for cold off-site copies"""
+
+    name = "dropbox"
+
+    def __init__(self, token: str = None, root: str = None):
+        self.token = token or DROPBOX_ACCESS_TOKEN
+        self.root = (root or BACKUP_DROPBOX_ROOT).rstrip('/')
+        self._client = None
+
+    def is_configured(self) -> bool:
+        return dropbox is not None and bool(self.token)
+
+    def describe(self) -> str:
+        return f"Dropbox {self.root}"
+
+    @property
+    def client(self):
+        if self._client is None:
+            if dropbox is None:
+                raise RuntimeError("BACKUP_BACKEND=dropbox needs the dropbox package")
+            self._client = dropbox.Dropbox(self.token, timeout=GITHUB_TIMEOUT_SECONDS)
+        return self._client
+
+    def _path(self, key: str) -> str:
+        return f"{self.root}/{key}"
+
+    @staticmethod
+    def _is_not_found(error) -> bool:
+        reason = error.error
+        if hasattr(reason, 'is_path') and reason.is_path():
+            return reason.get_path().is_not_found()
+        if hasattr(reason, 'is_path_lookup') and reason.is_path_lookup():
+            return reason.get_path_lookup().is_not_found()
+        return False
+
+    def put(self, key: str, data: bytes) -> str:
+        self.client.files_upload(data, self._path(key), mode=dropbox.files.WriteMode.overwrite, mute=True)
+        return key
+
+    def get(self, key: str, locator: str) -> bytes:
+        try:
+            _, response = self.client.files_download(self._path(key))
+        except dropbox.exceptions.ApiError as e:
+            if self._is_not_found(e):
+                raise KeyError(key)
+            raise
+        return response.content
+
+    def list(self, prefix: str = "") -> List[str]:
+        try:
+            result = self.client.files_list_folder(self.root, recursive=True)
+        except dropbox.exceptions.ApiError as e:
+            if self._is_not_found(e):
+                return []
+            raise
+        keys = []
+        while True:
+            for entry in result.entries:
+                if isinstance(entry, dropbox.files.FileMetadata):
+                    key = entry.path_display[len(self.root) + 1:]
+                    if key.startswith(prefix):
+                        keys.append(key)
+            if not result.has_more:
+                return sorted(keys)
+            result = self.client.files_list_folder_continue(result.cursor)
+
+    def delete(self, key: str):
+        try:
+            self.client.files_delete_v2(self._path(key))
+        except dropbox.exceptions.ApiError as e:
+            if not self._is_not_found(e):
+                raise
+
+BACKUP_BACKENDS = {
+    'github': GitHubBackend,
+    'local': LocalBackend,
+    'dropbox': DropboxBackend,
+}
+
+def create_backup_backend(name: str = None) -> BackupBackend:
+    name = (name or BACKUP_BACKEND).lower()
+    if name not in BACKUP_BACKENDS:
+        raise ValueError(f"Unknown BACKUP_BACKEND {name!r}; expected one of {', '.join(BACKUP_BACKENDS)}")
+    return BACKUP_BACKENDS[name]()
+
+backup_backend = create_backup_backend()
+
+def database_row_counts(cur) -> Dict[str, int]:
+    """Rows per user table (the change log excluded), for sanity checks after a restore"""
+    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' AND name != 'change_log' ORDER BY name")
+    tables = [row[0] for row in cur.fetchall()]
+    counts = {}
+    for table in tables:
+        cur.execute(f'SELECT COUNT(*) FROM "{table}"')
+        counts[table] = cur.fetchone()[0]
+    return counts
+
+def snapshot_metadata(snapshot_path: str) -> Dict[str, Any]:
+    """What the manifest records about a snapshot besides its bytes: change-log position and row counts"""
+    conn = sqlite3.connect(snapshot_path)
+    try:
+        cur = conn.cursor()
+        return {'log_seq': change_log_position(cur), 'tables': database_row_counts(cur)}
+    finally:
+        conn.close()
+
+def verify_database_file(path: str, expected_tables: Optional[Dict[str, int]] = None) -> bool:
+    """Full PRAGMA integrity_check, plus the row counts the manifest recorded if given"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        problems = [row[0] for row in conn.execute("PRAGMA integrity_check(20)")]
+        if problems != ["ok"]:
+            print(f"❌ Restored database failed integrity_check: {'; '.join(problems)}")
+            return False
+        if expected_tables:
+            actual = database_row_counts(conn.cursor())
+            mismatched = {table: (count, actual.get(table)) for table, count in expected_tables.items()
+                          if actual.get(table) != count}
+            if mismatched:
+                print(f"❌ Restored database row counts differ from the manifest (expected, found): {mismatched}")
+                return False
+    except sqlite3.Error as e:
+        print(f"❌ Restored database is unreadable: {e}")
+        return False
+    finally:
+        conn.close()
+    return True
+
+def sqlite_page_size(header: bytes) -> int:
+    """Page size from the 100-byte SQLite file header (stored as 1 for 65536)"""
+    size = struct.unpack('>H', header[16:18])[0]
+    return 65536 if size == 1 else size
+
+def scan_snapshot(snapshot_path: str) -> Tuple[str, List[Tuple[str, int]], int, List[bytes]]:
+    """Stream the snapshot once.
+
+    Returns the whole-file sha256, (sha256, size) for each chunk, the SQLite
+    page size and a short fingerprint of every page for incremental backups.
+    """
+    file_hash = hashlib.sha256()
+    chunks = []
+    pages = []
+    page_size = 0
+    with open(snapshot_path, 'rb') as f:
+        while True:
+            data = f.read(BACKUP_CHUNK_SIZE)
+            if not data:
+                break
+            if not page_size:
+                page_size = sqlite_page_size(data)
+            file_hash.update(data)
+            chunks.append((hashlib.sha256(data).hexdigest(), len(data)))
+            view = memoryview(data)
+            pages.extend(hashlib.blake2b(view[i:i + page_size], digest_size=16).digest()
+                         for i in range(0, len(data), page_size))
+    return file_hash.hexdigest(), chunks, page_size, pages
+
+def backup_head_digest(manifest: Dict[str, Any]) -> str:
+    """sha256 of the database a manifest restores to (base plus all deltas)"""
+    deltas = manifest.get('deltas') or []
+    return deltas[-1]['sha256'] if deltas else manifest['sha256']
+
+def backup_log_position(manifest: Dict[str, Any]) -> int:
+    """Change-log seq up to which a manifest (snapshot plus shipped segments) covers the database"""
+    deltas = manifest.get('deltas') or []
+    position = deltas[-1].get('log_seq', 0) if deltas else manifest.get('log_seq', 0)
+    return max([position] + [segment['last_seq'] for segment in manifest.get('log') or []])
+
+def _upload_full_backup(snapshot_path: str, digest: str, chunk_hashes: List[Tuple[str, int]], metadata: Dict[str, Any],
+                        previous: Optional[Dict[str, Any]], run: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """Upload a new base: every chunk the remote does not have yet, no deltas"""
+    run['kind'] = 'full'
+    known = {c['sha256']: c for c in previous['chunks']} if previous else {}
+    before = set(known)
+    chunks = []
+    uploaded_bytes = 0
+    with open(snapshot_path, 'rb') as f:
+        for chunk_sha, size in chunk_hashes:
+            if chunk_sha in known:
+                f.seek(size, os.SEEK_CUR)
+            else:
+                with _timed(run, 'compress'):
+                    compressed = compress_backup(f.read(size))
+                with _timed(run, 'upload'):
+                    blob_sha = backup_backend.put(f"{BACKUP_CHUNK_DIR}/{chunk_sha}", compressed)
+                stored_size = len(compressed)
+                uploaded_bytes += stored_size
+                run['bytes_sent'] += stored_size
+                known[chunk_sha] = {'sha256': chunk_sha, 'size': size, 'blob': blob_sha, 'stored_size': stored_size}
+            chunks.append(known[chunk_sha])
+
+    file_size = os.path.getsize(snapshot_path)
+    manifest = {
+        'format': BACKUP_MANIFEST_FORMAT,
+        'created_at': int(time.time()),
+        'size': file_size,
+        'sha256': digest,
+        'chunk_size': BACKUP_CHUNK_SIZE,
+        'compression': BACKUP_COMPRESSION,
+        'chunks': chunks,
+        'deltas': [],
+        **metadata,
+        # Segments the new base does not cover yet
+        'log': [segment for segment in previous.get('log') or [] if segment['last_seq'] > metadata['log_seq']] if previous else [],
+    }
+    new_chunks = len({c['sha256'] for c in chunks} - before)
+    message = (f'Database backup {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} - {file_size} bytes, '
+               f'{new_chunks}/{len(chunks)} chunks new ({uploaded_bytes} bytes uploaded)')
+    return manifest, message
+
+def _upload_delta_backup(snapshot_path: str, digest: str, page_size: int, changed: List[int], metadata: Dict[str, Any],
+                         previous: Dict[str, Any], run: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+    """Upload the pages that changed since the manifest head as one delta on top of it"""
+    run['kind'] = 'delta'
+    file_size = os.path.getsize(snapshot_path)
+    delta = bytearray(DELTA_MAGIC + struct.pack('>IQI', page_size, file_size, len(changed)))
+    with open(snapshot_path, 'rb') as f:
+        for page_no in changed:
+            f.seek(page_no * page_size)
+            delta += struct.pack('>I', page_no) + f.read(page_size)
+    with _timed(run, 'compress'):
+        compressed = compress_backup(bytes(delta))
+    with _timed(run, 'upload'):
+        blob_sha = backup_backend.put(f"{BACKUP_DELTA_DIR}/{digest}", compressed)
+    run['bytes_sent'] += len(compressed)
+
+    manifest = dict(previous)
+    manifest['deltas'] = list(previous.get('deltas') or []) + [{
+        'sha256': digest,
+        'size': file_size,
+        'pages': len(changed),
+        'blob': blob_sha,
+        'stored_size': len(compressed),
+        'created_at': int(time.time()),
+        **metadata,
+    }]
+    message = (f'Database backup {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} - {file_size} bytes, '
+               f'delta {len(manifest["deltas"])} with {len(changed)} pages ({len(compressed)} bytes uploaded)')
+    return manifest, message
+
+def _changed_pages(page_size: int, pages: List[bytes], previous: Optional[Dict[str, Any]]) -> Optional[List[int]]:
+    """Pages that differ from the remote head, or None when a full rebase is due"""
+    state = _backup_page_state
+    if not BACKUP_INCREMENTAL or previous is None or state is None:
+        return None
+    if state['digest'] != backup_head_digest(previous) or state['page_size'] != page_size:
+        return None
+    deltas = previous.get('deltas') or []
+    if len(deltas) >= BACKUP_MAX_DELTAS:
+        return None
+
+    old = state['pages']
+    changed = [i for i, fingerprint in enumerate(pages) if i >= len(old) or old[i] != fingerprint]
+    if len(changed) * page_size > BACKUP_MAX_DELTA_BYTES:
+        return None
+    # Rebase once the delta chain costs a sizeable share of the database itself
+    delta_bytes = sum(d['stored_size'] for d in deltas) + len(changed) * page_size
+    if delta_bytes > previous['size'] * BACKUP_REBASE_RATIO:
+        return None
+    return changed
+
+def load_backup_index(refresh: bool = False) -> List[Dict[str, Any]]:
+    """Retained versions, oldest first. One small document, cached after the first read."""
+    global _backup_index
+    if _backup_index is None or refresh:
+        data = backup_backend.read(BACKUP_INDEX_KEY)
+        _backup_index = json.loads(data)['versions'] if data is not None else []
+    return _backup_index
+
+def forget_backup_index():
+    global _backup_index
+    _backup_index = None
+
+def load_version_manifest(version: Dict[str, Any]) -> Dict[str, Any]:
+    """The manifest a retained version points at (cached: versions never change)"""
+    manifest = _version_manifests.get(version['key'])
+    if manifest is None:
+        data = backup_backend.read(version['key'])
+        if data is None:
+            raise KeyError(version['key'])
+        manifest = _version_manifests[version['key']] = json.loads(data)
+    return manifest
+
+def select_retained_versions(versions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Grandfather-father-son: per BACKUP_RETENTION tier, the newest version in each of the newest buckets"""
+    keep = set()
+    for period, count in BACKUP_RETENTION:
+        newest_in_bucket = {}
+        for version in versions:  # oldest first, so later versions win their bucket
+            newest_in_bucket[version['created_at'] // period] = version['id']
+        keep.update(newest_in_bucket[bucket] for bucket in sorted(newest_in_bucket)[-count:])
+    if versions:
+        keep.add(versions[-1]['id'])
+    return [version for version in versions if version['id'] in keep]
+
+def publish_backup(manifest: Dict[str, Any], previous: Optional[Dict[str, Any]], message: str, new_version: bool):
+    """Make manifest current. Snapshot backups also record it as a version and prune the index.
+
+    An object is removed only once neither the new manifest nor any retained
+    version references it, so every version in the index stays restorable.
+    """
+    global _backup_index
+    versions = load_backup_index()
+    retained, dropped, documents = versions, [], {}
+    if new_version:
+        created_at = manifest['deltas'][-1]['created_at'] if manifest.get('deltas') else manifest['created_at']
+        head_digest = backup_head_digest(manifest)
+        version_id = f"{time.strftime('%Y%m%d-%H%M%S', time.gmtime(created_at))}-{head_digest[:8]}"
+        version = {
+            'id': version_id,
+            'created_at': created_at,
+            'size': manifest['deltas'][-1]['size'] if manifest.get('deltas') else manifest['size'],
+            'sha256': head_digest,
+            'key': f"{BACKUP_VERSION_DIR}/{version_id}.json",
+        }
+        _version_manifests[version['key']] = manifest
+        retained = select_retained_versions(versions + [version])
+        dropped = [v for v in versions if v not in retained]
+        documents[version['key']] = json.dumps(manifest, indent=1).encode()
+        documents[BACKUP_INDEX_KEY] = json.dumps({'versions': retained}, indent=1).encode()
+
+    candidates = set(backup_object_keys(previous)) if previous else set()
+    for version in dropped:
+        candidates.update(backup_object_keys(load_version_manifest(version)))
+    candidates -= set(backup_object_keys(manifest))
+    if candidates:
+        for version in retained:
+            candidates -= set(backup_object_keys(load_version_manifest(version)))
+    removed = sorted(candidates) + [version['key'] for version in dropped]
+
+    backup_backend.publish(manifest, previous, message, documents, removed)
+    _backup_index = retained
+    for version in dropped:
+        _version_manifests.pop(version['key'], None)
+
+def list_backup_versions() -> List[Dict[str, Any]]:
+    """Retained versions, newest first, from a single fresh read of the index"""
+    return list(reversed(load_backup_index(refresh=True)))
+
+def find_backup_version(ref: str) -> Optional[Dict[str, Any]]:
+    """A version by its number in list_backup_versions (1 = newest) or by id prefix"""
+    versions = list_backup_versions()
+    if ref.isdigit():
+        return versions[int(ref) - 1] if 1 <= int(ref) <= len(versions) else None
+    matches = [version for version in versions if version['id'].startswith(ref)]
+    return matches[0] if len(matches) == 1 else None
+
+@contextmanager
+def _timed(run: Dict[str, Any], phase: str):
+    """Add the time spent in the block to run['phases'][phase]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        run['phases'][phase] = run['phases'].get(phase, 0.0) + time.perf_counter() - start
+
+class BackupMetrics:
+    """Outcome, phase timings and bytes of every backup_database run.
+
+    Phases are snapshot (online backup copy), scan (hashing chunks and
+    pages), compress, upload (object puts) and publish (manifest, version
+    and index commit). Failures are also kept with their timestamps so the
+    count over the last window_seconds can be reported.
+    """
+
+    PHASES = ('snapshot', 'scan', 'compress', 'upload', 'publish')
+
+    def __init__(self, window_seconds: float = BACKUP_FAILURE_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.successes = 0
+        self.failures = 0
+        self.unchanged = 0
+        self.bytes_sent = 0
+        self.last_success = None  # wall-clock time of the last good backup (uploaded or already current)
+        self.last_failure = None
+        self.last_error = None
+        self.last_run = None
+        self._failure_times = deque()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_run() -> Dict[str, Any]:
+        return {'kind': None, 'phases': {}, 'bytes_sent': 0, 'started': time.perf_counter()}
+
+    def record(self, run: Dict[str, Any], outcome: str, error: Optional[str] = None):
+        """outcome is 'uploaded', 'unchanged' or 'failed'"""
+        now = time.time()
+        with self._lock:
+            self.last_run = {
+                'outcome': outcome, 'kind': run['kind'], 'finished': now,
+                'duration': time.perf_counter() - run['started'],
+                'phases': dict(run['phases']), 'bytes_sent': run['bytes_sent'],
+            }
+            self.bytes_sent += run['bytes_sent']
+            if outcome == 'failed':
+                self.failures += 1
+                self.last_failure = now
+                self.last_error = error
+                self._failure_times.append(now)
+            else:
+                if outcome == 'unchanged':
+                    self.unchanged += 1
+                else:
+                    self.successes += 1
+                self.last_success = now
+            self._trim(now)
+
+    def _trim(self, now: float):
+        while self._failure_times and self._failure_times[0] < now - self.window_seconds:
+            self._failure_times.popleft()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            self._trim(now)
+            return {
+                'successes': self.successes, 'failures': self.failures, 'unchanged': self.unchanged,
+                'recent_failures': len(self._failure_times), 'bytes_sent': self.bytes_sent,
+                'last_success': self.last_success, 'last_failure': self.last_failure,
+                'last_error': self.last_error,
+                'seconds_since_success': now - self.last_success if self.last_success else None,
+                'last_run': dict(self.last_run) if self.last_run else None,
+            }
+
+backup_metrics = BackupMetrics()
 
 def backup_database():
-    """Enhanced backup database to GitHub with error handling and retry logic"""
-    global backup_in_progress
-    
-    if backup_in_progress:
+    """Enhanced backup database to the configured backend with error handling and retry logic.
+
+    The snapshot is split into BACKUP_CHUNK_SIZE chunks addressed by sha256.
+    A full backup (the base) uploads only the chunks the remote manifest does
+    not list yet, streamed one at a time from the snapshot file. Between bases
+    each backup ships just the SQLite pages that changed since the previous
+    one as a delta, so upload cost follows write volume instead of database
+    size; the chain is folded into a new base every BACKUP_MAX_DELTAS deltas or
+    once it outgrows BACKUP_REBASE_RATIO of the database.
+    """
+    global _last_backup_digest, _backup_page_state
+
+    if not _backup_lock.acquire(blocking=False):
         print("⏳ Backup already in progress, skipping...")
         return False
         
-    backup_in_progress = True
+    snapshot_path = None
+    run = backup_metrics.new_run()
+    outcome, error = 'failed', None
     try:
         if not os.path.exists(DB_PATH):
             print("❌ No local database to backup")
+            error = "no local database"
             return False
         
         file_size = os.path.getsize(DB_PATH)
@@ -55,202 +995,822 @@ def backup_database():
         
         if file_size == 0:
             print("❌ Database file is empty, skipping backup")
+            error = "database file is empty"
             return False
             
-        # Read database file
-        with open(DB_PATH, 'rb') as f:
-            db_content = f.read()
-        
-        # Encode to base64 for GitHub
-        encoded_content = base64.b64encode(db_content).decode('utf-8')
-        
-        headers = {
-            'Authorization': f'token {GITHUB_ACCESS_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
-        # Get existing file SHA
-        url = f'https://api.github.com/repos/{GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME}/contents/{GITHUB_BACKUP_PATH}'
-        response = requests.get(url, headers=headers)
-        
-        sha = None
-        if response.status_code == 200:
-            sha = response.json().get('sha')
-        
-        # Prepare data for upload
-        data = {
-            'message': f'Database backup {datetime.now().strftime("%Y-%m-%d %H:%M:%S")} - {file_size} bytes',
-            'content': encoded_content,
-            'branch': 'main'
-        }
-        
-        if sha:
-            data['sha'] = sha
-        
-        # Upload to GitHub with timeout
-        response = requests.put(url, headers=headers, json=data, timeout=30)
+        with _timed(run, 'snapshot'):
+            snapshot_path = create_db_snapshot()
+        if snapshot_path is None:
+            error = "snapshot failed quick_check"
+            return False
         
-        if response.status_code in [200, 201]:
-            print(f"✅ Database backed up to GitHub: {GITHUB_BACKUP_PATH}")
+        # Nothing changed since the last successful upload
+        with _timed(run, 'scan'):
+            digest, chunk_hashes, page_size, pages = scan_snapshot(snapshot_path)
+        if digest == _last_backup_digest:
+            print("⏭️ Database unchanged since last backup, skipping upload")
+            outcome = 'unchanged'
             return True
-        else:
-            print(f"❌ GitHub backup failed: {response.status_code} - {response.text}")
-            return False
+        with _timed(run, 'scan'):
+            metadata = snapshot_metadata(snapshot_path)
+        
+        with _manifest_lock:
+            for attempt in range(2):
+                previous = backup_backend.current_manifest()
+                if previous and backup_head_digest(previous) == digest:
+                    _last_backup_digest = digest
+                    _backup_page_state = {'digest': digest, 'page_size': page_size, 'pages': pages}
+                    print("⏭️ Backend already has this snapshot, skipping upload")
+                    outcome = 'unchanged'
+                    return True
+                
+                changed = _changed_pages(page_size, pages, previous)
+                try:
+                    if changed is None:
+                        manifest, message = _upload_full_backup(snapshot_path, digest, chunk_hashes, metadata, previous, run)
+                    else:
+                        manifest, message = _upload_delta_backup(snapshot_path, digest, page_size, changed, metadata, previous, run)
+                    with _timed(run, 'publish'):
+                        publish_backup(manifest, previous, message, new_version=True)
+                    break
+                except BackupConflict as e:
+                    # Someone else changed the manifest: reload it and build on that instead
+                    backup_backend.refresh()
+                    forget_backup_index()
+                    if attempt:
+                        raise
+                    print(f"🔁 Backup manifest changed ({e}), reloading and retrying")
+        
+        _last_backup_digest = digest
+        _backup_page_state = {'digest': digest, 'page_size': page_size, 'pages': pages}
+        print(f"✅ Database backed up to {backup_backend.describe()}: {message}")
+        outcome = 'uploaded'
+        return True
         
     except Exception as e:
         print(f"❌ Backup failed: {e}")
+        error = str(e)
         return False
     finally:
-        backup_in_progress = False
+        if snapshot_path and os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+        backup_metrics.record(run, outcome, error)
+        _backup_lock.release()
+
+def apply_backup_delta(f, data: bytes):
+    """Write the pages of one delta into an open database file and set its final size"""
+    if not data.startswith(DELTA_MAGIC):
+        raise ValueError("not a backup delta")
+    offset = len(DELTA_MAGIC)
+    page_size, file_size, count = struct.unpack_from('>IQI', data, offset)
+    offset += struct.calcsize('>IQI')
+    for _ in range(count):
+        page_no = struct.unpack_from('>I', data, offset)[0]
+        offset += 4
+        f.seek(page_no * page_size)
+        f.write(data[offset:offset + page_size])
+        offset += page_size
+    f.truncate(file_size)
+
+def _file_sha256(path: str) -> str:
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for data in iter(lambda: f.read(BACKUP_CHUNK_SIZE), b''):
+            file_hash.update(data)
+    return file_hash.hexdigest()
+
+def download_backup(dest_path: str, until: Optional[float] = None, manifest: Optional[Dict[str, Any]] = None) -> bool:
+    """Stream a backup from the backend into dest_path: the base chunks, every delta in order, then the change log.
+
+    Restores the current manifest unless another one (a retained version) is
+    given. With until (a unix timestamp) only deltas and logged changes up to
+    that moment are applied, which rebuilds the database as it was at that time.
+    Chunks and deltas are checked against their checksums, and the rebuilt
+    snapshot must pass integrity_check and match the manifest row counts
+    before the change log is replayed on top of it.
+    """
+    global _backup_page_state
+    is_head = manifest is None
+    if is_head:
+        manifest = backup_backend.load_manifest()
+
+    if manifest is None:
+        # Legacy single-file backup written through the GitHub contents API
+        with backup_backend.open_legacy_snapshot() as blocks:
+            if blocks is None:
+                print(f"❌ No backup found in {backup_backend.describe()}")
+                return False
+            with open(dest_path, 'wb') as f:
+                write_decompressed(blocks, f)
+        return verify_database_file(dest_path)
+
+    file_hash = hashlib.sha256()
+    with open(dest_path, 'wb') as f:
+        for chunk in manifest['chunks']:
+            data = decompress_backup(backup_backend.get(f"{BACKUP_CHUNK_DIR}/{chunk['sha256']}", chunk['blob']))
+            if hashlib.sha256(data).hexdigest() != chunk['sha256']:
+                print(f"❌ Backup chunk {chunk['sha256'][:12]} failed verification")
+                return False
+            file_hash.update(data)
+            f.write(data)
+    if file_hash.hexdigest() != manifest['sha256']:
+        print("❌ Restored snapshot does not match the manifest checksum")
+        return False
+
+    deltas = [d for d in manifest.get('deltas') or [] if until is None or d['created_at'] <= until]
+    if deltas:
+        with open(dest_path, 'r+b') as f:
+            for delta in deltas:
+                data = backup_backend.get(f"{BACKUP_DELTA_DIR}/{delta['sha256']}", delta['blob'])
+                apply_backup_delta(f, decompress_backup(data))
+        if _file_sha256(dest_path) != deltas[-1]['sha256']:
+            print("❌ Replayed deltas do not match the manifest checksum")
+            return False
+    if not verify_database_file(dest_path, (deltas[-1] if deltas else manifest).get('tables')):
+        return False
+
+    if is_head and until is None:
+        # This file is now the remote head, so the next backup can be a delta on top of it
+        digest, _, page_size, pages = scan_snapshot(dest_path)
+        _backup_page_state = {'digest': digest, 'page_size': page_size, 'pages': pages}
+
+    position = deltas[-1].get('log_seq', 0) if deltas else manifest.get('log_seq', 0)
+    entries = fetch_change_log(manifest, position)
+    if until is not None:
+        entries = list(itertools.takewhile(lambda entry: entry['ts'] <= until, entries))
+    if entries:
+        conn = sqlite3.connect(dest_path, isolation_level=None)
+        try:
+            last_seq = replay_change_log(conn, entries)
+            result = conn.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            conn.close()
+        if result != "ok":
+            print(f"❌ Database failed quick_check after replaying the change log: {result}")
+            return False
+        print(f"📜 Replayed {len(entries)} logged change(s) up to #{last_seq}")
+    return True
+
+def recover_database_to(until: float, dest_path: str) -> bool:
+    """Point-in-time recovery into a separate file; the live database is not touched.
+
+    Picks, among the current manifest and the retained versions, the one
+    whose base is at or before that moment and whose deltas and log reach
+    furthest towards it, then applies what it has up to that moment.
+    """
+    manifest = backup_backend.load_manifest()
+    if manifest is None:
+        print(f"❌ No chunked backup in {backup_backend.describe()} to recover from")
+        return False
+    candidates = [manifest] + [load_version_manifest(version) for version in list_backup_versions()]
+
+    def covered_until(m: Dict[str, Any]) -> float:
+        return max([m['created_at']] + [d['created_at'] for d in m.get('deltas') or []]
+                   + [segment['last_ts'] for segment in m.get('log') or []])
+
+    eligible = [m for m in candidates if m['created_at'] <= until]
+    if not eligible:
+        oldest = min(m['created_at'] for m in candidates)
+        print(f"❌ Oldest recoverable point is {datetime.fromtimestamp(oldest)}")
+        return False
+    covering = [m for m in eligible if covered_until(m) >= until]
+    chosen = min(covering, key=covered_until) if covering else max(eligible, key=covered_until)
+    if not download_backup(dest_path, until=until, manifest=chosen):
+        return False
+    print(f"✅ Database as of {datetime.fromtimestamp(until)} written to {dest_path}")
+    return True
 
-def restore_database_from_github():
-    """Enhanced restore database from GitHub backup with validation"""
+def restore_database_from_github(version: Optional[str] = None):
+    """Enhanced restore database from the configured backup backend with validation.
+
+    Restores the latest backup, or a retained version (number or id, see
+    list_backup_versions) when one is given. A version restore also makes
+    that version the remote head, so changes shipped afterwards extend the
+    restored timeline instead of the one it replaced. The head moves only
+    after the local swap succeeded; if publishing it fails, the restore
+    still stands and the next snapshot replaces the old head.
+    """
+    global _last_backup_digest, _backup_page_state, _last_restore_error
+    download_path = None
+    _last_restore_error = None
     try:
-        print("🔄 Attempting to restore database from GitHub...")
+        print(f"🔄 Attempting to restore database from {backup_backend.describe()}...")
         
-        if not all([GITHUB_ACCESS_TOKEN, GITHUB_REPO_OWNER, GITHUB_REPO_NAME]):
-            print("❌ GitHub credentials missing, cannot restore")
+        if not backup_backend.is_configured():
+            print(f"❌ Backup backend {backup_backend.name} is not configured, cannot restore")
             return False
         
-        headers = {
-            'Authorization': f'token {GITHUB_ACCESS_TOKEN}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        
-        url = f'https://api.github.com/repos/{GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME}/contents/{GITHUB_BACKUP_PATH}'
-        response = requests.get(url, headers=headers, timeout=30)
+        fd, download_path = tempfile.mkstemp(prefix="confessions-", suffix=".restore", dir=os.path.dirname(os.path.abspath(DB_PATH)))
+        os.close(fd)
         
-        if response.status_code != 200:
-            print("❌ No backup file found in GitHub")
-            return False
+        # Held until the swap: no backup can snapshot the old file meanwhile, and the shipper
+        # cannot publish rows of the old database against the new head
+        with _backup_lock, _manifest_lock:
+            try:
+                if version is None:
+                    if not download_backup(download_path):
+                        return False
+                else:
+                    entry = find_backup_version(version)
+                    if entry is None:
+                        print(f"❌ No retained backup version matches {version!r}")
+                        return False
+                    print(f"🕰️ Restoring version {entry['id']}")
+                    manifest = load_version_manifest(entry)
+                    if not download_backup(download_path, manifest=manifest):
+                        return False
+                    # Segment keys are named by seq range; number new changes past everything the old head shipped
+                    head = backup_backend.load_manifest()
+                    conn = sqlite3.connect(download_path)
+                    try:
+                        cur = conn.cursor()
+                        set_change_log_position(cur, max(change_log_position(cur), backup_log_position(head)))
+                        conn.commit()
+                    finally:
+                        conn.close()
+            except Exception as e:
+                print(f"❌ Failed to download backup content: {e}")
+                _last_restore_error = e
+                return False
             
-        file_data = response.json()
-        encoded_content = file_data.get('content', '')
-        encoded_content = encoded_content.replace('\n', '')
-        
-        try:
-            db_content = base64.b64decode(encoded_content)
-        except Exception as e:
-            print(f"❌ Failed to decode backup content: {e}")
-            return False
-        
-        # Create backup of current database before restoration
-        if os.path.exists(DB_PATH):
+            with open(download_path, 'rb') as f:
+                if not f.read(len(SQLITE_MAGIC)) == SQLITE_MAGIC:
+                    print("❌ Backup content is not an SQLite database")
+                    return False
+            
+            # The download was verified in full, so the swap is the last step and cannot leave a partial file.
+            # The current database is copied aside first, inside the same quiesced window.
+            had_database = os.path.exists(DB_PATH)
             backup_name = f"{DB_PATH}.backup.{int(time.time())}"
-            shutil.copy2(DB_PATH, backup_name)
-            print(f"📦 Current database backed up as: {backup_name}")
-        
-        with open(DB_PATH, 'wb') as f:
-            f.write(db_content)
+            replace_database_file(download_path, keep_previous=backup_name)
+            profile_cache.clear()
+            if had_database:
+                print(f"📦 Previous database backed up as: {backup_name}")
             
-        # Verify restoration
-        if os.path.exists(DB_PATH) and os.path.getsize(DB_PATH) > 0:
-            print(f"✅ Database restored from GitHub: {GITHUB_BACKUP_PATH}")
-            print(f"📊 Restored database size: {os.path.getsize(DB_PATH)} bytes")
-            return True
-        else:
-            print("❌ Restoration failed: database file is empty or missing")
-            return False
+            if version is not None:
+                _last_backup_digest = None
+                _backup_page_state = None
+                # Only now that the local file is the version does the head follow it;
+                # segments of the discarded timeline drop out with the old head
+                try:
+                    publish_backup(manifest, head, f"Restore version {entry['id']}", new_version=False)
+                except Exception as e:
+                    print(f"⚠️ Restored locally, but the backup head still points at the old timeline: {e}")
+                    if isinstance(e, BackupConflict):
+                        backup_backend.refresh()
+                        forget_backup_index()
+                    # Rows logged from here on do not extend the old head; hold them back until a snapshot replaces it
+                    with db_transaction() as cur:
+                        mark_change_log_gap(cur)
+                    backup_worker.request_immediate()
+        
+        print(f"✅ Database restored from {backup_backend.describe()}")
+        print(f"📊 Restored database size: {os.path.getsize(DB_PATH)} bytes")
+        return True
         
     except Exception as e:
         print(f"❌ Restoration failed: {e}")
+        _last_restore_error = e
         return False
+    finally:
+        if download_path and os.path.exists(download_path):
+            os.remove(download_path)
 
-def backup_on_startup():
-    """Enhanced startup procedure with guaranteed restoration"""
-    print("🚀 Starting enhanced database initialization...")
-    
-    max_retries = 3
-    retry_delay = 5
-    
-    for attempt in range(max_retries):
-        needs_restore = False
-        
-        if not os.path.exists(DB_PATH):
-            print(f"❌ Attempt {attempt + 1}: Database file not found - needs restoration")
-            needs_restore = True
-        else:
-            db_size = os.path.getsize(DB_PATH)
-            print(f"📊 Attempt {attempt + 1}: Existing database size: {db_size} bytes")
-            
-            if db_size == 0:
-                print(f"❌ Attempt {attempt + 1}: Database file is empty - needs restoration")
-                needs_restore = True
-            else:
-                try:
-                    conn = sqlite3.connect(DB_PATH)
-                    cursor = conn.cursor()
-                    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-                    tables = cursor.fetchall()
-                    conn.close()
-                    
-                    table_count = len(tables)
-                    print(f"✅ Database valid. Tables found: {table_count}")
-                    
-                    if table_count == 0:
-                        needs_restore = True
-                        print(f"❌ Attempt {attempt + 1}: No tables found - needs restoration")
-                    else:
-                        print("✅ Local database is valid, no restoration needed")
-                        break
-                except Exception as e:
-                    print(f"❌ Attempt {attempt + 1}: Database corrupted - needs restoration: {e}")
-                    needs_restore = True
-        
-        if needs_restore:
-            print(f"🔄 Attempt {attempt + 1}: Database needs restoration, attempting from GitHub...")
-            success = restore_database_from_github()
-            if success:
-                print("✅ Database restoration completed!")
-                break
-            else:
-                print(f"❌ Database restoration failed! Retrying in {retry_delay} seconds...")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-        else:
+# Why the last restore_database_from_github call failed, when an exception was behind it
+_last_restore_error = None
+
+def is_permanent_backup_error(error: BaseException) -> bool:
+    """Backend errors a retry cannot fix: rejected credentials, a missing repository or folder, missing objects"""
+    if isinstance(error, KeyError):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        response = error.response
+        rate_limited = response.status_code == 403 and response.headers.get('X-RateLimit-Remaining') == '0'
+        return response.status_code in (401, 403, 404) and not rate_limited
+    return dropbox is not None and isinstance(error, dropbox.exceptions.AuthError)
+
+STARTUP_RESTORE_RETRY_SECONDS = 5
+STARTUP_RESTORE_MAX_RETRY_SECONDS = 300
+
+class StartupState:
+    """Startup phases with their elapsed time, and whether the bot serves requests yet.
+
+    The bot starts polling before a needed restore has finished; until
+    set_ready() it runs degraded and turns updates away instead of using a
+    database that is missing or about to be replaced. Only the admin
+    commands in STARTUP_ADMIN_COMMANDS get through meanwhile.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phase = "starting"
+        self.restore_attempts = 0
+        self.failure = None  # why the startup restore gave up, if it did
+        self.ready = threading.Event()
+        self._first_update = threading.Event()
+        self._bot = None
+        self._loop = None
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def mark(self, phase: str):
+        self.phase = phase
+        print(f"⏱️ Startup: {phase} after {self.elapsed():.2f}s")
+
+    def set_ready(self):
+        self.mark("ready")
+        self.ready.set()
+
+    def fail(self, reason: str):
+        """The startup restore gave up: stay degraded and tell the admin"""
+        self.failure = reason
+        self.mark(f"restore failed ({reason})")
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.notify_admin(), self._loop)
+
+    async def attach(self, bot):
+        """Called from post_init: failures from now on reach the admin as a message"""
+        self._bot = bot
+        self._loop = asyncio.get_running_loop()
+        if self.failure is not None:
+            await self.notify_admin()
+
+    async def notify_admin(self):
+        try:
+            await self._bot.send_message(
+                chat_id=ADMIN_USER_ID,
+                text=f"❌ Startup restore from {backup_backend.describe()} failed and will not be retried: "
+                     f"{self.failure}\nThe bot stays degraded. Fix the backup settings and restart it."
+            )
+        except Exception as e:
+            logger.error(f"Could not notify the admin of the failed restore: {e}")
+
+    def note_update(self):
+        if not self._first_update.is_set():
+            self._first_update.set()
+            self.mark(f"first update received ({'ready' if self.ready.is_set() else 'degraded'})")
+
+startup = StartupState()
+
+# Admin commands that read only in-memory state, so they are safe while the startup restore runs
+STARTUP_ADMIN_COMMANDS = {'backup_status'}
+
+def check_local_database() -> bool:
+    """Quick check that the local database can be used as is: header and schema only, no full scan"""
+    if not os.path.exists(DB_PATH) or os.path.getsize(DB_PATH) == 0:
+        print("❌ Local database missing or empty")
+        return False
+    try:
+        with open(DB_PATH, 'rb') as f:
+            if f.read(len(SQLITE_MAGIC)) != SQLITE_MAGIC:
+                print("❌ Local database is not an SQLite file")
+                return False
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+        try:
+            table_count = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table'").fetchone()[0]
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"❌ Local database unreadable: {e}")
+        return False
+    if table_count == 0:
+        print("❌ Local database has no tables")
+        return False
+    print(f"✅ Local database valid ({os.path.getsize(DB_PATH)} bytes, {table_count} tables)")
+    return True
+
+def backup_exists() -> bool:
+    """Whether the backend holds any backup (raises if the backend cannot be reached)"""
+    if not backup_backend.is_configured():
+        return False
+    if backup_backend.load_manifest() is not None:
+        return True
+    with backup_backend.open_legacy_snapshot() as blocks:
+        return blocks is not None
+
+def finish_startup() -> bool:
+    """Create or migrate the schema, start the backup threads and leave degraded mode"""
+    if not init_db():
+        print("❌ Failed to initialize database!")
+        return False
+    startup.mark("database ready")
+    schedule_backups()
+    startup.set_ready()
+    return True
+
+def restore_on_startup():
+    """Restore the database in the background while the bot runs degraded.
+
+    Starts with an empty database only when the backend has nothing to
+    restore. While a backup exists but cannot be fetched it keeps retrying
+    with a growing delay, because an empty database would be uploaded over
+    the real backup. Errors a retry cannot fix (see is_permanent_backup_error)
+    end the attempts instead: the bot stays degraded and the admin is told.
+    """
+    delay = STARTUP_RESTORE_RETRY_SECONDS
+    while True:
+        startup.restore_attempts += 1
+        print(f"🔄 Startup restore attempt {startup.restore_attempts} from {backup_backend.describe()}...")
+        if restore_database_from_github():
+            startup.mark("restore finished")
             break
-    
-    # Always create fresh backup after startup
-    print("🔄 Creating fresh backup after startup...")
-    backup_database()
+        error = _last_restore_error
+        if error is None or not is_permanent_backup_error(error):
+            try:
+                if not backup_exists():
+                    startup.mark("no backup to restore, starting with an empty database")
+                    break
+            except Exception as e:
+                print(f"❌ Backend check failed: {e}")
+                error = e
+        if error is not None and is_permanent_backup_error(error):
+            startup.fail(f"{type(error).__name__}: {error}")
+            return
+        print(f"❌ Startup restore failed, retrying in {delay} seconds...")
+        time.sleep(delay)
+        delay = min(delay * 2, STARTUP_RESTORE_MAX_RETRY_SECONDS)
+    finish_startup()
+
+class BackupWorker:
+    """Single long-lived thread that turns backup triggers into coalesced uploads.
+
+    Writes only set a dirty flag. The worker uploads a dirty database once
+    min_interval has passed since its previous attempt, so N triggers in that
+    window cost one upload. If nothing is flagged, it still uploads once the
+    last successful backup is older than max_staleness. A failed upload leaves
+    the flag set and is retried after min_interval.
+    """
+
+    def __init__(self, min_interval: float = BACKUP_MIN_INTERVAL_SECONDS, max_staleness: float = BACKUP_MAX_STALENESS_SECONDS):
+        self.min_interval = min_interval
+        self.max_staleness = max_staleness
+        self.dirty = False
+        self.triggers = 0
+        self.coalesced_triggers = 0
+        self.uploads = 0
+        self.failures = 0
+        self.last_success = None  # wall-clock time of the last successful upload
+        self.last_result = None  # outcome of the last attempt
+        self._started = 0  # attempts taken up so far ...
+        self._finished = 0  # ... and the last of them to complete
+        self._pending_triggers = 0
+        self._force = False
+        self._last_attempt = time.monotonic()
+        self._last_success_mono = time.monotonic()
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def in_progress(self) -> bool:
+        return _backup_lock.locked()
+
+    @property
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="backup_thread", daemon=True)
+                self._thread.start()
+
+    def mark_dirty(self):
+        with self._cond:
+            self.dirty = True
+            self.triggers += 1
+            self._pending_triggers += 1
+            self._cond.notify_all()
+
+    def request_immediate(self):
+        """Upload as soon as the worker is free, ignoring min_interval"""
+        with self._cond:
+            self._force = True
+            self._cond.notify_all()
+
+    def run_now(self, timeout: float) -> Optional[bool]:
+        """Request an upload and wait for it; True or False as backup_database returned, None on timeout.
+
+        An attempt already running when this is called does not count: it may
+        have snapshotted the database before the caller's last write.
+        """
+        self.start()
+        with self._cond:
+            target = self._started + 1
+            self._force = True
+            self._cond.notify_all()
+            if not self._cond.wait_for(lambda: self._finished >= target, timeout):
+                return None
+            return self.last_result
+
+    def _next_deadline(self) -> float:
+        if self._force:
+            return 0
+        if self.dirty:
+            return self._last_attempt + self.min_interval
+        return self._last_success_mono + self.max_staleness
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    remaining = self._next_deadline() - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                pending = self._pending_triggers
+                self._pending_triggers = 0
+                self.dirty = False
+                self._force = False
+                self._last_attempt = time.monotonic()
+                self._started += 1
+                attempt = self._started
+
+            success = backup_database()
+
+            with self._cond:
+                self._finished = attempt
+                self.last_result = success
+                self._cond.notify_all()
+                if success:
+                    self.uploads += 1
+                    self.coalesced_triggers += max(pending - 1, 0)
+                    self.last_success = time.time()
+                    self._last_success_mono = time.monotonic()
+                    print(f"✅ Backup uploaded ({pending} write trigger(s) coalesced into it)")
+                else:
+                    self.failures += 1
+                    if pending:
+                        self.dirty = True
+                        self._pending_triggers += pending
+
+backup_worker = BackupWorker()
 
 def schedule_backups():
-    """Schedule automatic backups every 5 minutes"""
-    def backup_loop():
+    """Start the backup worker (also covers the periodic backup interval)"""
+    backup_worker.start()
+    change_log_shipper.start()
+    print(f"✅ Backup worker running (min interval {BACKUP_MIN_INTERVAL_SECONDS}s, max staleness {BACKUP_MAX_STALENESS_SECONDS}s, "
+          f"change log every {CHANGE_LOG_SHIP_SECONDS}s)")
+
+def ship_change_log() -> int:
+    """Upload logged changes the remote manifest does not cover yet as one segment; returns rows shipped"""
+    if not backup_backend.is_configured():
+        return 0
+    with _manifest_lock:
+        manifest = backup_backend.current_manifest()
+        if manifest is None:
+            # Segments roll forward from a snapshot; wait for the first one
+            prune_change_log()
+            return 0
+        position = backup_log_position(manifest)
+        with db_transaction() as cur:
+            # Rows the snapshot already covers, including gaps it closed
+            cur.execute("DELETE FROM change_log WHERE seq <= ?", (position,))
+            cur.execute("SELECT 1 FROM change_log WHERE op = 'G' LIMIT 1")
+            gap = cur.fetchone() is not None
+            if not gap:
+                cur.execute(
+                    "SELECT seq, ts, tbl, op, row_id, data FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?",
+                    (position, CHANGE_LOG_SEGMENT_MAX_ROWS)
+                )
+                rows = cur.fetchall()
+        if gap:
+            # Segments past a gap would replay onto the wrong base; only a snapshot can continue the log
+            print("⚠️ Change log has a gap the remote head does not cover; requesting a snapshot")
+            backup_worker.request_immediate()
+            return 0
+        if not rows:
+            return 0
+
+        keys = ('seq', 'ts', 'tbl', 'op', 'row_id', 'data')
+        compressed = compress_backup("\n".join(json.dumps(dict(zip(keys, row))) for row in rows).encode())
+        segment = {
+            'first_seq': rows[0][0],
+            'last_seq': rows[-1][0],
+            'first_ts': rows[0][1],
+            'last_ts': rows[-1][1],
+            'rows': len(rows),
+            'blob': backup_backend.put(_log_segment_key(rows[0][0], rows[-1][0]), compressed),
+            'stored_size': len(compressed),
+        }
+        updated = dict(manifest)
+        updated['log'] = list(manifest.get('log') or []) + [segment]
+        try:
+            publish_backup(updated, manifest, f"Change log {segment['first_seq']}-{segment['last_seq']} "
+                                              f"({len(rows)} rows, {len(compressed)} bytes)", new_version=False)
+        except BackupConflict:
+            backup_backend.refresh()
+            forget_backup_index()
+            raise
+
+    # Shipped rows are no longer needed locally (snapshots never carry them)
+    with db_transaction() as cur:
+        cur.execute("DELETE FROM change_log WHERE seq <= ?", (segment['last_seq'],))
+    return len(rows)
+
+def mark_change_log_gap(cur):
+    """Log a 'G' (gap) marker: the log no longer extends the remote head, so nothing ships until a snapshot does"""
+    cur.execute(f"INSERT INTO change_log (ts, tbl, op, row_id, data) VALUES ({_CHANGE_LOG_TS}, '', 'G', 0, NULL)")
+
+def prune_change_log() -> int:
+    """Bound a log that cannot be shipped: at most CHANGE_LOG_MAX_ROWS rows, none older than CHANGE_LOG_MAX_AGE_SECONDS.
+
+    Pruning leaves a 'G' (gap) marker row. ship_change_log will not publish
+    past it, and the next snapshot covers it. Returns rows pruned.
+    """
+    with db_transaction() as cur:
+        cur.execute(
+            "DELETE FROM change_log WHERE op <> 'G' AND (seq <= (SELECT MAX(seq) FROM change_log) - ? OR ts < ?)",
+            (CHANGE_LOG_MAX_ROWS, time.time() - CHANGE_LOG_MAX_AGE_SECONDS)
+        )
+        pruned = cur.rowcount
+        if pruned:
+            mark_change_log_gap(cur)
+    if pruned:
+        print(f"⚠️ Pruned {pruned} unshipped change log rows")
+    return pruned
+
+def fetch_change_log(manifest: Dict[str, Any], after_seq: int) -> List[Dict[str, Any]]:
+    """Logged changes after after_seq from every shipped segment, in order"""
+    entries = []
+    for segment in manifest.get('log') or []:
+        if segment['last_seq'] <= after_seq:
+            continue
+        data = decompress_backup(backup_backend.get(_log_segment_key(segment['first_seq'], segment['last_seq']),
+                                                    segment['blob']))
+        entries.extend(entry for entry in map(json.loads, data.decode().splitlines()) if entry['seq'] > after_seq)
+    return entries
+
+class ChangeLogShipper:
+    """Ships the change log every few seconds while there are writes, so a
+    crash loses at most ship_interval of data instead of a whole backup interval."""
+
+    def __init__(self, ship_interval: float = CHANGE_LOG_SHIP_SECONDS):
+        self.ship_interval = ship_interval
+        self.segments = 0
+        self.rows = 0
+        self.failures = 0
+        self.last_success = None
+        self.pending_writes = 0  # writes marked since the last completed shipment
+        self.pending_since = None  # wall-clock time of the oldest of them
+        self._pending = False
+        self._last_attempt = 0.0
+        self._cond = threading.Condition()
+        self._thread = None
+
+    @property
+    def is_alive(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="changelog_thread", daemon=True)
+                self._thread.start()
+
+    def mark_pending(self):
+        with self._cond:
+            self._pending = True
+            self.pending_writes += 1
+            if self.pending_since is None:
+                self.pending_since = time.time()
+            self._cond.notify()
+
+    def backlog(self) -> Tuple[int, float]:
+        """Writes not shipped yet and the age of the oldest, from memory only"""
+        with self._cond:
+            return self.pending_writes, time.time() - self.pending_since if self.pending_since else 0.0
+
+    def _run(self):
         while True:
-            time.sleep(BACKUP_INTERVAL_MINUTES * 60)  # 5 minutes
-            print(f"🔄 Scheduled backup triggered ({BACKUP_INTERVAL_MINUTES}-minute interval)")
-            backup_database()
-    
-    backup_thread = threading.Thread(target=backup_loop, daemon=True)
-    backup_thread.start()
-    print(f"✅ Scheduled backups enabled (every {BACKUP_INTERVAL_MINUTES} minutes)")
+            with self._cond:
+                while True:
+                    if self._pending:
+                        remaining = self._last_attempt + self.ship_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+                self._pending = False
+                self._last_attempt = time.monotonic()
+                taken_writes, started = self.pending_writes, time.time()
 
-def trigger_immediate_backup():
-    """Enhanced immediate backup with queuing"""
-    print("🔄 Triggering immediate backup...")
-    
-    # Use threading to avoid blocking
-    def backup_wrapper():
-        success = backup_database()
-        if success:
-            print("✅ Immediate backup completed!")
-        else:
-            print("❌ Immediate backup failed!")
-        return success
-    
-    backup_thread = threading.Thread(target=backup_wrapper, daemon=True)
-    backup_thread.start()
-    return True
+            try:
+                shipped = ship_change_log()
+            except Exception as e:
+                print(f"❌ Change log shipping failed: {e}")
+                with self._cond:
+                    self.failures += 1
+                    self._pending = True
+                try:
+                    prune_change_log()
+                except Exception as e:
+                    print(f"❌ Change log pruning failed: {e}")
+                continue
+            with self._cond:
+                if shipped:
+                    self.segments += 1
+                    self.rows += shipped
+                    self.last_success = time.time()
+                # A full segment means there is more waiting
+                if shipped >= CHANGE_LOG_SEGMENT_MAX_ROWS:
+                    self._pending = True
+                else:
+                    # Everything marked before this attempt is shipped; later writes are at most this old
+                    self.pending_writes -= taken_writes
+                    self.pending_since = started if self.pending_writes else None
+
+change_log_shipper = ChangeLogShipper()
+
+def backup_telemetry() -> Dict[str, Any]:
+    """One consistent view of the backup worker, the last runs and the change log shipper"""
+    telemetry = backup_metrics.stats()
+    telemetry.update({
+        'worker_alive': backup_worker.is_alive,
+        'in_progress': backup_worker.in_progress,
+        'dirty': backup_worker.dirty,
+        'triggers': backup_worker.triggers,
+        'coalesced_triggers': backup_worker.coalesced_triggers,
+        'shipper_alive': change_log_shipper.is_alive,
+        'log_segments': change_log_shipper.segments,
+        'log_rows_shipped': change_log_shipper.rows,
+        'log_failures': change_log_shipper.failures,
+    })
+    # In-memory counters only: this also serves /metrics on Flask threads, before the database may exist
+    telemetry['log_pending_writes'], telemetry['log_lag_seconds'] = change_log_shipper.backlog()
+    return telemetry
+
+def render_backup_metrics() -> str:
+    """backup_telemetry() in the Prometheus text exposition format"""
+    telemetry = backup_telemetry()
+    last_run = telemetry['last_run'] or {}
+    metrics = [
+        ('backup_runs_total', 'counter', 'Backup runs by outcome',
+         [({'outcome': 'uploaded'}, telemetry['successes']), ({'outcome': 'unchanged'}, telemetry['unchanged']),
+          ({'outcome': 'failed'}, telemetry['failures'])]),
+        ('backup_recent_failures', 'gauge', f'Failed backups in the last {BACKUP_FAILURE_WINDOW_SECONDS} seconds',
+         [({}, telemetry['recent_failures'])]),
+        ('backup_bytes_sent_total', 'counter', 'Compressed bytes uploaded by backups', [({}, telemetry['bytes_sent'])]),
+        ('backup_last_success_timestamp_seconds', 'gauge', 'Unix time of the last good backup',
+         [({}, telemetry['last_success'])]),
+        ('backup_seconds_since_success', 'gauge', 'Age of the last good backup',
+         [({}, telemetry['seconds_since_success'])]),
+        ('backup_last_duration_seconds', 'gauge', 'Duration of the last backup run', [({}, last_run.get('duration'))]),
+        ('backup_last_phase_seconds', 'gauge', 'Time per phase of the last backup run',
+         [({'phase': phase}, last_run.get('phases', {}).get(phase, 0.0) if last_run else None)
+          for phase in BackupMetrics.PHASES]),
+        ('backup_last_bytes_sent', 'gauge', 'Compressed bytes uploaded by the last backup run',
+         [({}, last_run.get('bytes_sent'))]),
+        ('backup_triggers_total', 'counter', 'Write triggers received by the backup worker', [({}, telemetry['triggers'])]),
+        ('backup_coalesced_triggers_total', 'counter', 'Write triggers folded into another upload',
+         [({}, telemetry['coalesced_triggers'])]),
+        ('backup_pending_changes', 'gauge', 'Writes not yet in a snapshot backup', [({}, int(telemetry['dirty']))]),
+        ('backup_worker_up', 'gauge', 'Backup worker thread alive', [({}, int(telemetry['worker_alive']))]),
+        ('backup_changelog_shipper_up', 'gauge', 'Change log shipper thread alive', [({}, int(telemetry['shipper_alive']))]),
+        ('backup_changelog_segments_total', 'counter', 'Change log segments shipped', [({}, telemetry['log_segments'])]),
+        ('backup_changelog_rows_total', 'counter', 'Change log rows shipped', [({}, telemetry['log_rows_shipped'])]),
+        ('backup_changelog_failures_total', 'counter', 'Failed change log shipments', [({}, telemetry['log_failures'])]),
+        ('backup_changelog_pending_writes', 'gauge', 'Committed writes not yet shipped', [({}, telemetry['log_pending_writes'])]),
+        ('backup_changelog_lag_seconds', 'gauge', 'Age of the oldest unshipped logged write',
+         [({}, telemetry['log_lag_seconds'])]),
+    ]
+    return format_prometheus(metrics)
+
+def format_prometheus(metrics: List[Tuple[str, str, str, List[Tuple[Dict[str, str], Any]]]]) -> str:
+    """(name, type, help, [(labels, value)]) families in the text exposition format; None values are skipped"""
+    lines = []
+    for name, kind, help_text, samples in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is None:
+                continue
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "never"
+    if seconds < 120:
+        return f"{seconds:.0f}s"
+    if seconds < 2 * 3600:
+        return f"{seconds / 60:.0f}m"
+    return f"{seconds / 3600:.1f}h"
 
 # Enhanced backup triggers for all database operations
 def enhanced_backup_trigger():
-    """Trigger backup in a non-blocking way"""
-    threading.Thread(target=trigger_immediate_backup, daemon=True).start()
+    """Mark the database dirty; the backup worker coalesces these into one upload"""
+    backup_worker.mark_dirty()
+    change_log_shipper.mark_pending()
 
 # Use standard library html escape
 from html import escape as html_escape 
-from telegram.error import BadRequest, TelegramError
+from telegram.error import BadRequest, RetryAfter, TelegramError
+from telegram.warnings import PTBDeprecationWarning
+from telegram.helpers import escape_markdown
 import shutil  # Added for file operations
 
 from telegram import (
@@ -267,11 +1827,15 @@ from telegram.ext import (
     CallbackQueryHandler,
     ConversationHandler,
     ContextTypes,
+    TypeHandler,
+    ApplicationHandlerStop,
+    BaseRateLimiter,
+    BaseUpdateProcessor,
     filters,
 )
 
-from keep_alive import keep_alive
-keep_alive()
+from keep_alive import keep_alive, register_metrics
+keep_alive(metrics=render_backup_metrics)
 
 # ------------------------------ CONFIG ------------------------------
 BOT_TOKEN = os.environ.get('BOT_TOKEN')
@@ -285,6 +1849,12 @@ MAX_COMMENT_DEPTH = 5
 MAX_CATEGORIES = 3
 COMMENTS_PER_PAGE = 10
 
+# Aura awarded to the author for each event
+AURA_PER_LIKE = 1
+AURA_PER_DISLIKE = -1
+AURA_PER_COMMENT = 1
+AURA_PER_APPROVED_CONFESSION = 5
+
 CATEGORIES: List[str] = [
     "School", "Relationship", "Family", "Work", "Personal Life", 
     "Funny", "Random", "Gaming", "Study", "Tech", 
@@ -322,157 +1892,819 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# ------------------------------ ENHANCED DATABASE HELPERS ------------------------------
-
-def init_db():
-    """Initialize database with enhanced error handling"""
+# ------------------------------ DATABASE CONNECTION POOL ------------------------------
+
+DB_BUSY_TIMEOUT_MS = 5000
+DB_CACHE_SIZE_KB = 16384           # page cache per connection (negative PRAGMA value = KiB)
+DB_MMAP_SIZE = 64 * 1024 * 1024    # memory-mapped I/O window
+
+_db_local = threading.local()
+_db_registry_lock = threading.Lock()
+_db_connections: Dict[int, sqlite3.Connection] = {}
+_db_generation = 0
+_db_wal_enabled = False
+_db_in_use = threading.Condition()  # guards the two counters below
+_db_active_users = 0  # threads inside db_connection()
+_db_quiescing = False  # a swap or close is waiting for them to leave
+
+def _open_db_connection() -> sqlite3.Connection:
+    """Open a connection and apply the per-connection PRAGMAs once"""
+    global _db_wal_enabled
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    cur = conn.cursor()
+    if not _db_wal_enabled:
+        # journal_mode is persistent in the database file, so it only needs to be set once
+        cur.execute("PRAGMA journal_mode=WAL")
+        _db_wal_enabled = True
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
+    cur.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+    cur.close()
+    return conn
+
+def get_db_connection() -> sqlite3.Connection:
+    """Return the long-lived connection owned by the calling thread.
+
+    Every thread (including the one running the asyncio event loop) gets its own
+    connection, opened lazily and kept for the lifetime of the thread.
+    """
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None or getattr(_db_local, 'generation', None) != _db_generation:
+        # Opened under the registry lock so it cannot race replace_database_file
+        with _db_registry_lock:
+            conn = _open_db_connection()
+            _db_local.conn = conn
+            _db_local.generation = _db_generation
+            # Drop connections left behind by threads that have exited
+            live_threads = {t.ident for t in threading.enumerate()}
+            for ident in [i for i in _db_connections if i not in live_threads]:
+                _db_connections.pop(ident).close()
+            _db_connections[threading.get_ident()] = conn
+    return conn
+
+@contextmanager
+def _db_pool_quiesced():
+    """Wait until no thread is inside db_connection(), then hold the pool with every connection closed.
+
+    A connection is only ever closed while nobody is using it, and no thread
+    can open a new one until the block exits and bumps the generation.
+    """
+    global _db_generation, _db_wal_enabled, _db_quiescing
+    if getattr(_db_local, 'depth', 0):
+        raise RuntimeError("cannot quiesce the connection pool from inside a database operation")
+    with _db_in_use:
+        _db_quiescing = True
+        while _db_active_users:
+            _db_in_use.wait()
+    try:
+        with _db_registry_lock:
+            for conn in _db_connections.values():
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close pooled database connection: {e}")
+            _db_connections.clear()
+            yield
+            _db_generation += 1
+            _db_wal_enabled = False
+    finally:
+        with _db_in_use:
+            _db_quiescing = False
+            _db_in_use.notify_all()
+
+def close_db_connections():
+    """Close every pooled connection once idle; threads reconnect on their next query"""
+    with _db_pool_quiesced():
+        pass
+
+def replace_database_file(path: str, keep_previous: Optional[str] = None):
+    """Atomically swap the file at path in as the database and make every thread reconnect.
+
+    In-flight operations finish on the old file first; operations that start
+    meanwhile wait and then run on the new one. Nothing can open the old file
+    or pair the new one with a stale WAL while the rename happens. With
+    keep_previous, the old database is copied there in the same window, so
+    no write can land between the copy and the swap.
+    """
+    with open(path, 'rb+') as f:
+        os.fsync(f.fileno())
+    with _db_pool_quiesced():
+        if keep_previous and os.path.exists(DB_PATH):
+            # Every connection is closed and the last close checkpointed the WAL, so the file is complete
+            shutil.copy2(DB_PATH, keep_previous)
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(DB_PATH + suffix):
+                os.remove(DB_PATH + suffix)
+        os.replace(path, DB_PATH)
+        dir_fd = os.open(os.path.dirname(os.path.abspath(DB_PATH)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+@contextmanager
+def db_connection():
+    """The calling thread's pooled connection, held in use until the block exits (re-entrant)"""
+    global _db_active_users
+    depth = getattr(_db_local, 'depth', 0)
+    if depth == 0:
+        with _db_in_use:
+            while _db_quiescing:
+                _db_in_use.wait()
+            _db_active_users += 1
+    _db_local.depth = depth + 1
     try:
-        conn = sqlite3.connect(DB_PATH)
+        yield get_db_connection()
+    finally:
+        _db_local.depth = depth
+        if depth == 0:
+            with _db_in_use:
+                _db_active_users -= 1
+                if not _db_active_users:
+                    _db_in_use.notify_all()
+
+@contextmanager
+def db_cursor():
+    """Cursor on the pooled connection for read-only helpers"""
+    with db_connection() as conn:
         cur = conn.cursor()
-        
-        # Confessions table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS confessions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, content TEXT, 
-                file_id TEXT, file_type TEXT, created_at INTEGER, status TEXT, 
-                admin_message_id INTEGER, channel_message_id INTEGER, 
-                categories TEXT 
-            )
-        """)
-        
-        # Rate limit table
-        cur.execute("CREATE TABLE IF NOT EXISTS rate_limit (user_id INTEGER PRIMARY KEY, last_ts INTEGER)")
-        
-        # Comments table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS comments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, conf_id INTEGER, user_id INTEGER, 
-                content TEXT, parent_comment_id INTEGER, created_at INTEGER,
-                bot_message_id INTEGER, file_id TEXT, file_type TEXT
-            )
-        """)
-        
-        # Comment votes table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS comment_votes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT, comment_id INTEGER, user_id INTEGER, 
-                vote_type TEXT, UNIQUE(comment_id, user_id), 
-                FOREIGN KEY(comment_id) REFERENCES comments(id)
-            )
-        """)
-        
-        # Follows table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS follows (
-                follower_id INTEGER NOT NULL, following_id INTEGER NOT NULL, 
-                created_at INTEGER, PRIMARY KEY (follower_id, following_id)
-            )
-        """)
-        
-        # User profiles table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                user_id INTEGER PRIMARY KEY, aura_points INTEGER DEFAULT 0,
-                bio TEXT, department TEXT, created_at INTEGER,
-                nickname TEXT, terms_accepted BOOLEAN DEFAULT FALSE,
-                start_used BOOLEAN DEFAULT FALSE
-            )
-        """)
-        
-        # Chat requests table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS chat_requests (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                from_user_id INTEGER NOT NULL,
-                to_user_id INTEGER NOT NULL,
-                status TEXT DEFAULT 'pending',
-                created_at INTEGER,
-                UNIQUE(from_user_id, to_user_id)
+        try:
+            yield cur
+        finally:
+            cur.close()
+
+def call_after_transaction(callback, *args):
+    """Run callback once the calling thread's current transaction commits or rolls back"""
+    pending = getattr(_db_local, 'after_transaction', None)
+    if pending is None:
+        pending = _db_local.after_transaction = []
+    pending.append((callback, args))
+
+def run_after_transaction_callbacks():
+    pending = getattr(_db_local, 'after_transaction', None)
+    while pending:
+        callback, args = pending.pop(0)
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"After-transaction callback failed: {e}")
+
+@contextmanager
+def db_transaction():
+    """Cursor on the pooled connection that commits on success and rolls back on error"""
+    with db_connection() as conn:
+        cur = conn.cursor()
+        try:
+            yield cur
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+            run_after_transaction_callbacks()
+
+# ------------------------------ SCHEMA MIGRATIONS ------------------------------
+
+def _add_column_if_missing(cur: sqlite3.Cursor, table: str, column: str, definition: str):
+    cur.execute(f"PRAGMA table_info({table})")
+    if column not in {row[1] for row in cur.fetchall()}:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+def _migrate_legacy_columns(cur: sqlite3.Cursor):
+    """Columns that pre-versioned databases may be missing"""
+    _add_column_if_missing(cur, "comments", "bot_message_id", "INTEGER")
+    _add_column_if_missing(cur, "confessions", "channel_message_id", "INTEGER")
+    _add_column_if_missing(cur, "confessions", "categories", "TEXT")
+    _add_column_if_missing(cur, "user_profiles", "nickname", "TEXT")
+    _add_column_if_missing(cur, "user_profiles", "terms_accepted", "BOOLEAN DEFAULT FALSE")
+    _add_column_if_missing(cur, "user_profiles", "start_used", "BOOLEAN DEFAULT FALSE")
+    _add_column_if_missing(cur, "comments", "file_id", "TEXT")
+    _add_column_if_missing(cur, "comments", "file_type", "TEXT")
+
+# Counter columns and the aggregate each one caches, used by the backfill/repair pass
+COUNTER_COLUMNS = [
+    ("comments", "likes", "SELECT COUNT(*) FROM comment_votes WHERE comment_id = comments.id AND vote_type = 'like'"),
+    ("comments", "dislikes", "SELECT COUNT(*) FROM comment_votes WHERE comment_id = comments.id AND vote_type = 'dislike'"),
+    ("confessions", "comment_count", "SELECT COUNT(*) FROM comments WHERE conf_id = confessions.id"),
+    ("confessions", "root_comment_count", "SELECT COUNT(*) FROM comments WHERE conf_id = confessions.id AND parent_comment_id IS NULL"),
+    ("user_profiles", "follower_count", "SELECT COUNT(*) FROM follows WHERE following_id = user_profiles.user_id"),
+    ("user_profiles", "following_count", "SELECT COUNT(*) FROM follows WHERE follower_id = user_profiles.user_id"),
+]
+
+# Same defaults get_user_profile uses, so a profile created by a follow trigger looks the same
+_ENSURE_PROFILE_SQL = """
+    INSERT OR IGNORE INTO user_profiles (user_id, aura_points, bio, department, created_at, nickname, terms_accepted, start_used)
+    VALUES ({user_id}, 0, 'No bio set', 'Not specified', CAST(strftime('%s', 'now') AS INTEGER), 'Anonymous', 0, 0);
+"""
+
+COUNTER_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_comment_votes_insert AFTER INSERT ON comment_votes BEGIN
+        UPDATE comments SET likes = likes + (NEW.vote_type = 'like'), dislikes = dislikes + (NEW.vote_type = 'dislike')
+        WHERE id = NEW.comment_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_comment_votes_delete AFTER DELETE ON comment_votes BEGIN
+        UPDATE comments SET likes = likes - (OLD.vote_type = 'like'), dislikes = dislikes - (OLD.vote_type = 'dislike')
+        WHERE id = OLD.comment_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_comment_votes_update AFTER UPDATE OF vote_type ON comment_votes BEGIN
+        UPDATE comments SET likes = likes - (OLD.vote_type = 'like') + (NEW.vote_type = 'like'),
+                            dislikes = dislikes - (OLD.vote_type = 'dislike') + (NEW.vote_type = 'dislike')
+        WHERE id = NEW.comment_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_comments_insert AFTER INSERT ON comments BEGIN
+        UPDATE confessions SET comment_count = comment_count + 1 WHERE id = NEW.conf_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_comments_delete AFTER DELETE ON comments BEGIN
+        UPDATE confessions SET comment_count = comment_count - 1 WHERE id = OLD.conf_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS trg_follows_insert AFTER INSERT ON follows BEGIN
+        {_ENSURE_PROFILE_SQL.format(user_id="NEW.following_id")}
+        {_ENSURE_PROFILE_SQL.format(user_id="NEW.follower_id")}
+        UPDATE user_profiles SET follower_count = follower_count + 1 WHERE user_id = NEW.following_id;
+        UPDATE user_profiles SET following_count = following_count + 1 WHERE user_id = NEW.follower_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_follows_delete AFTER DELETE ON follows BEGIN
+        UPDATE user_profiles SET follower_count = follower_count - 1 WHERE user_id = OLD.following_id;
+        UPDATE user_profiles SET following_count = following_count - 1 WHERE user_id = OLD.follower_id;
+    END
+    """,
+]
+
+ROOT_COMMENT_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_comments_insert_root AFTER INSERT ON comments WHEN NEW.parent_comment_id IS NULL BEGIN
+        UPDATE confessions SET root_comment_count = root_comment_count + 1 WHERE id = NEW.conf_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_comments_delete_root AFTER DELETE ON comments WHEN OLD.parent_comment_id IS NULL BEGIN
+        UPDATE confessions SET root_comment_count = root_comment_count - 1 WHERE id = OLD.conf_id;
+    END
+    """,
+]
+
+def _add_counter_columns(cur: sqlite3.Cursor):
+    for table, column, _ in COUNTER_COLUMNS:
+        _add_column_if_missing(cur, table, column, "INTEGER NOT NULL DEFAULT 0")
+
+def repair_counters_in(cur: sqlite3.Cursor) -> Dict[str, int]:
+    """Recompute every counter column from its source table, returning how many rows had drifted"""
+    for column in ("following_id", "follower_id"):
+        cur.execute(f"SELECT DISTINCT {column} FROM follows WHERE {column} NOT IN (SELECT user_id FROM user_profiles)")
+        for (user_id,) in cur.fetchall():
+            cur.execute(_ENSURE_PROFILE_SQL.format(user_id="?"), (user_id,))
+
+    drifted = {}
+    for table, column, aggregate in COUNTER_COLUMNS:
+        cur.execute(f"UPDATE {table} SET {column} = ({aggregate}) WHERE {column} IS NOT ({aggregate})")
+        drifted[f"{table}.{column}"] = cur.rowcount
+    return drifted
+
+def add_aura(cur: sqlite3.Cursor, user_id: Optional[int], delta: int):
+    """Apply an incremental aura change inside the caller's transaction"""
+    if user_id is None or delta == 0:
+        return
+    cur.execute(_ENSURE_PROFILE_SQL.format(user_id="?"), (user_id,))
+    cur.execute("UPDATE user_profiles SET aura_points = aura_points + ? WHERE user_id = ?", (delta, user_id))
+    call_after_transaction(profile_cache.invalidate, user_id)
+
+def vote_aura_delta(old_vote: Optional[str], new_vote: Optional[str]) -> int:
+    """Aura change for the comment author when a vote goes from old_vote to new_vote (None = no vote)"""
+    points = {'like': AURA_PER_LIKE, 'dislike': AURA_PER_DISLIKE, None: 0}
+    return points.get(new_vote, 0) - points.get(old_vote, 0)
+
+def recompute_aura_in(cur: sqlite3.Cursor) -> int:
+    """Rebuild every aura score from votes, comments and approved confessions in one set-based pass"""
+    cur.execute("""
+        INSERT OR IGNORE INTO user_profiles (user_id, aura_points, bio, department, created_at, nickname, terms_accepted, start_used)
+        SELECT user_id, 0, 'No bio set', 'Not specified', CAST(strftime('%s', 'now') AS INTEGER), 'Anonymous', 0, 0
+        FROM (SELECT user_id FROM comments UNION SELECT user_id FROM confessions WHERE status = 'approved')
+        WHERE user_id IS NOT NULL
+    """)
+    cur.execute("""
+        WITH scores AS (
+            SELECT user_id, SUM(points) AS points FROM (
+                SELECT c.user_id, CASE v.vote_type WHEN 'like' THEN ? WHEN 'dislike' THEN ? ELSE 0 END AS points
+                FROM comment_votes v JOIN comments c ON c.id = v.comment_id
+                UNION ALL
+                SELECT user_id, ? FROM comments
+                UNION ALL
+                SELECT user_id, ? FROM confessions WHERE status = 'approved'
             )
+            GROUP BY user_id
+        )
+        UPDATE user_profiles SET aura_points = COALESCE(scores.points, 0)
+        FROM user_profiles AS p LEFT JOIN scores ON scores.user_id = p.user_id
+        WHERE p.user_id = user_profiles.user_id AND user_profiles.aura_points IS NOT COALESCE(scores.points, 0)
+    """, (AURA_PER_LIKE, AURA_PER_DISLIKE, AURA_PER_COMMENT, AURA_PER_APPROVED_CONFESSION))
+    cur.execute("SELECT changes()")
+    return cur.fetchone()[0]
+
+# Append-only log of every write, shipped in small segments between snapshots
+# so a restore can roll forward to within seconds of a crash. Inserts log the
+# row image ('I'), updates only the columns that changed ('P'), deletes the
+# rowid ('D'). Rows logged as 'U' by earlier versions carry a full image.
+CHANGE_LOG_UNTRACKED_TABLES = ('change_log', 'schema_version', 'sqlite_sequence')
+
+CHANGE_LOG_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts REAL NOT NULL,
+        tbl TEXT NOT NULL,
+        op TEXT NOT NULL,
+        row_id INTEGER NOT NULL,
+        data TEXT
+    )
+"""
+
+_CHANGE_LOG_TS = "(julianday('now') - 2440587.5) * 86400.0"
+
+CHANGE_LOG_TRIGGER_OPS = ('insert', 'update', 'rekey', 'delete')
+
+def _create_change_log_triggers(cur: sqlite3.Cursor):
+    """(Re)create the change-log triggers on every table.
+
+    The row image lists the columns that exist now, so any later migration
+    that adds a column must run this again (init_db does, via sync_change_log).
+    """
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")
+    tables = [row[0] for row in cur.fetchall() if row[0] not in CHANGE_LOG_UNTRACKED_TABLES]
+    for table in tables:
+        cur.execute(f'PRAGMA table_info("{table}")')
+        columns = [row[1] for row in cur.fetchall()]
+        image = ", ".join(f"'{column}', NEW.\"{column}\"" for column in columns)
+        changed = " OR ".join(f'OLD."{column}" IS NOT NEW."{column}"' for column in columns)
+        patch = " UNION ALL ".join(f"SELECT '{column}' AS k, NEW.\"{column}\" AS v WHERE OLD.\"{column}\" IS NOT NEW.\"{column}\""
+                                   for column in columns)
+        for op in CHANGE_LOG_TRIGGER_OPS:
+            cur.execute(f"DROP TRIGGER IF EXISTS trg_log_{table}_{op}")
+        cur.execute(f"""
+            CREATE TRIGGER trg_log_{table}_insert AFTER INSERT ON "{table}" BEGIN
+                INSERT INTO change_log (ts, tbl, op, row_id, data)
+                VALUES ({_CHANGE_LOG_TS}, '{table}', 'I', NEW.rowid, json_object({image}));
+            END
         """)
-        
-        # Active chats table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS active_chats (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user1_id INTEGER NOT NULL,
-                user2_id INTEGER NOT NULL,
-                created_at INTEGER,
-                UNIQUE(user1_id, user2_id)
-            )
+        # A counter bump logs {"likes": 5}, not the whole comment with its content
+        cur.execute(f"""
+            CREATE TRIGGER trg_log_{table}_update AFTER UPDATE ON "{table}"
+            WHEN OLD.rowid = NEW.rowid AND ({changed}) BEGIN
+                INSERT INTO change_log (ts, tbl, op, row_id, data)
+                SELECT {_CHANGE_LOG_TS}, '{table}', 'P', NEW.rowid, json_group_object(k, v) FROM ({patch});
+            END
         """)
-        
-        # Chat messages table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS chat_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chat_id INTEGER,
-                from_user_id INTEGER NOT NULL,
-                to_user_id INTEGER NOT NULL,
-                content TEXT NOT NULL,
-                created_at INTEGER,
-                FOREIGN KEY(chat_id) REFERENCES active_chats(id)
-            )
+        cur.execute(f"""
+            CREATE TRIGGER trg_log_{table}_rekey AFTER UPDATE ON "{table}" WHEN OLD.rowid <> NEW.rowid BEGIN
+                INSERT INTO change_log (ts, tbl, op, row_id, data)
+                VALUES ({_CHANGE_LOG_TS}, '{table}', 'D', OLD.rowid, NULL);
+                INSERT INTO change_log (ts, tbl, op, row_id, data)
+                VALUES ({_CHANGE_LOG_TS}, '{table}', 'I', NEW.rowid, json_object({image}));
+            END
         """)
-        
-        # Blocked users table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS blocked_users (
-                blocker_id INTEGER NOT NULL,
-                blocked_id INTEGER NOT NULL,
-                created_at INTEGER,
-                PRIMARY KEY (blocker_id, blocked_id)
-            )
+        cur.execute(f"""
+            CREATE TRIGGER trg_log_{table}_delete AFTER DELETE ON "{table}" BEGIN
+                INSERT INTO change_log (ts, tbl, op, row_id, data)
+                VALUES ({_CHANGE_LOG_TS}, '{table}', 'D', OLD.rowid, NULL);
+            END
         """)
-        
-        # User reports table
+
+def sync_change_log(cur: sqlite3.Cursor) -> bool:
+    """Log writes only while there is a backup backend to ship them to; returns whether logging is on.
+
+    With a backend the triggers are recreated, which also picks up columns
+    added since. Without one they are dropped and the log is emptied.
+    """
+    if backup_backend.is_configured():
+        _create_change_log_triggers(cur)
+        return True
+    cur.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'trg\\_log\\_%' ESCAPE '\\'")
+    for (name,) in cur.fetchall():
+        cur.execute(f'DROP TRIGGER "{name}"')
+    cur.execute("DELETE FROM change_log")
+    return False
+
+def change_log_position(cur: sqlite3.Cursor) -> int:
+    """Highest change-log sequence number ever assigned in this database"""
+    cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'")
+    row = cur.fetchone()
+    return row[0] if row else 0
+
+def set_change_log_position(cur: sqlite3.Cursor, seq: int):
+    """Make the next logged change get seq + 1"""
+    cur.execute("DELETE FROM sqlite_sequence WHERE name = 'change_log'")
+    cur.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('change_log', ?)", (seq,))
+
+def replay_change_log(conn: sqlite3.Connection, entries: List[Dict[str, Any]]) -> int:
+    """Apply logged row images in order to a restored database; returns the last seq applied.
+
+    Every trigger is dropped for the duration: the images already contain
+    the counters the triggers maintained, and replay must not log itself.
+    """
+    cur = conn.cursor()
+    cur.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'")
+    triggers = cur.fetchall()
+    last_seq = change_log_position(cur)
+    cur.execute("BEGIN IMMEDIATE")
+    try:
+        for name, _ in triggers:
+            cur.execute(f'DROP TRIGGER "{name}"')
+        for entry in entries:
+            table = entry['tbl']
+            if entry['op'] == 'D':
+                cur.execute(f'DELETE FROM "{table}" WHERE rowid = ?', (entry['row_id'],))
+            elif entry['op'] == 'P':
+                patch = json.loads(entry['data'])
+                assignments = ", ".join(f'"{column}" = ?' for column in patch)
+                cur.execute(f'UPDATE "{table}" SET {assignments} WHERE rowid = ?', (*patch.values(), entry['row_id']))
+            else:
+                image = json.loads(entry['data'])
+                columns = ", ".join(f'"{column}"' for column in image)
+                placeholders = ", ".join("?" * len(image))
+                cur.execute(f'INSERT OR REPLACE INTO "{table}" (rowid, {columns}) VALUES (?, {placeholders})',
+                            (entry['row_id'], *image.values()))
+            last_seq = max(last_seq, entry['seq'])
+        # New writes after recovery continue the shipped numbering instead of reusing it
+        set_change_log_position(cur, last_seq)
+        for _, sql in triggers:
+            cur.execute(sql)
+        cur.execute("COMMIT")
+    except Exception:
+        cur.execute("ROLLBACK")
+        raise
+    return last_seq
+
+# Numbered, append-only. Each step is either an SQL statement or a callable taking a cursor.
+SCHEMA_MIGRATIONS = [
+    (1, "Legacy columns", [
+        _migrate_legacy_columns,
+    ]),
+    (2, "Hot-path indexes", [
+        "CREATE INDEX IF NOT EXISTS idx_comments_conf_root ON comments (conf_id, parent_comment_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_comments_parent ON comments (parent_comment_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_comments_user ON comments (user_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_comment_votes_comment ON comment_votes (comment_id, vote_type)",
+        "CREATE INDEX IF NOT EXISTS idx_follows_following ON follows (following_id, follower_id)",
+        "CREATE INDEX IF NOT EXISTS idx_confessions_user_status ON confessions (user_id, status, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_confessions_status ON confessions (status)",
+        "CREATE INDEX IF NOT EXISTS idx_chat_messages_chat ON chat_messages (chat_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_active_chats_user2 ON active_chats (user2_id)",
+    ]),
+    (3, "Denormalized vote, comment and follow counters", [
+        _add_counter_columns,
+        *COUNTER_TRIGGERS,
+        repair_counters_in,
+    ]),
+    (4, "Aura backfill", [
+        recompute_aura_in,
+    ]),
+    (5, "Root comment counter for keyset pagination", [
+        _add_counter_columns,
+        *ROOT_COMMENT_TRIGGERS,
+        repair_counters_in,
+    ]),
+    (6, "Change log for point-in-time recovery", [
+        CHANGE_LOG_TABLE_SQL,
+        _create_change_log_triggers,
+    ]),
+]
+
+def get_schema_version() -> int:
+    with db_cursor() as cur:
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cur.fetchone()[0]
+
+def run_migrations() -> int:
+    """Apply every pending migration, each in its own transaction. Safe to run on every start."""
+    with db_transaction() as cur:
         cur.execute("""
-            CREATE TABLE IF NOT EXISTS user_reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                reporter_id INTEGER NOT NULL,
-                reported_user_id INTEGER NOT NULL,
-                reason TEXT,
-                custom_reason TEXT,
-                created_at INTEGER
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at INTEGER
             )
         """)
-        
-        # Admin messages table
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS admin_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                message_text TEXT NOT NULL,
-                created_at INTEGER
+
+    current_version = get_schema_version()
+    for version, description, steps in SCHEMA_MIGRATIONS:
+        if version <= current_version:
+            continue
+        with db_transaction() as cur:
+            for step in steps:
+                if callable(step):
+                    step(cur)
+                else:
+                    cur.execute(step)
+            cur.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, int(time.time()))
             )
-        """)
-        
-        # Check and add columns if missing
-        try: cur.execute("SELECT bot_message_id FROM comments LIMIT 1")
-        except sqlite3.OperationalError: cur.execute("ALTER TABLE comments ADD COLUMN bot_message_id INTEGER")
-            
-        try: cur.execute("SELECT channel_message_id FROM confessions LIMIT 1")
-        except sqlite3.OperationalError: cur.execute("ALTER TABLE confessions ADD COLUMN channel_message_id INTEGER")
-            
-        try: cur.execute("SELECT categories FROM confessions LIMIT 1")
-        except sqlite3.OperationalError: cur.execute("ALTER TABLE confessions ADD COLUMN categories TEXT")
-        
-        try: cur.execute("SELECT nickname FROM user_profiles LIMIT 1")
-        except sqlite3.OperationalError: cur.execute("ALTER TABLE user_profiles ADD COLUMN nickname TEXT")
-            
-        try: cur.execute("SELECT terms_accepted FROM user_profiles LIMIT 1")
-        except sqlite3.OperationalError: cur.execute("ALTER TABLE user_profiles ADD COLUMN terms_accepted BOOLEAN DEFAULT FALSE")
-        
-        try: cur.execute("SELECT start_used FROM user_profiles LIMIT 1")
-        except sqlite3.OperationalError: cur.execute("ALTER TABLE user_profiles ADD COLUMN start_used BOOLEAN DEFAULT FALSE")
+        current_version = version
+        print(f"✅ Applied schema migration {version}: {description}")
+    return current_version
+
+# ------------------------------ RECORD TYPES ------------------------------
+
+class Record:
+    """Slotted row record.
+
+    Handlers were written against plain dicts, so records also answer
+    record['field'] and record.get('field'). A slot the query did not select
+    reads as None instead of raising.
+    """
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name, value in fields.items():
+            setattr(self, name, value)
+
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key, None)
+
+    def __setitem__(self, key: str, value):
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__ and hasattr(self, key)
+
+    def get(self, key: str, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key, default)
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__ if hasattr(self, name))
+        return f"{type(self).__name__}({fields})"
+
+class Confession(Record):
+    __slots__ = ('id', 'user_id', 'content', 'file_id', 'file_type', 'created_at', 'status',
+                 'admin_message_id', 'channel_message_id', 'categories')
+
+class Comment(Record):
+    __slots__ = ('id', 'conf_id', 'user_id', 'content', 'parent_comment_id', 'created_at',
+                 'bot_message_id', 'file_id', 'file_type', 'conf_content', 'likes', 'dislikes', 'replies')
+
+class Profile(Record):
+    __slots__ = ('user_id', 'aura_points', 'bio', 'department', 'nickname', 'terms_accepted', 'start_used')
+
+class ChatMessage(Record):
+    __slots__ = ('id', 'from_user_id', 'to_user_id', 'content', 'created_at')
+
+def record_factory(cls, columns: str):
+    """Build an sqlite3 row factory for a fixed SELECT column list.
+
+    Each column is assigned to the slot of the same name, which skips the
+    per-row dicts it replaces. Pass the same string to the SELECT so the two
+    cannot drift apart.
+    """
+    names = tuple(column.split()[-1].split('.')[-1] for column in columns.split(','))
+    for name in names:
+        if name not in cls.__slots__:
+            raise ValueError(f"Column {name!r} has no slot on {cls.__name__}")
+    new = cls.__new__
+
+    def build(cursor, row):
+        record = new(cls)
+        for name, value in zip(names, row):
+            setattr(record, name, value)
+        return record
+    return build
+
+CONFESSION_COLUMNS = "id, user_id, content, file_id, file_type, created_at, status, admin_message_id, channel_message_id, categories"
+COMMENT_COLUMNS = "id, conf_id, user_id, content, parent_comment_id, created_at, bot_message_id, file_id, file_type"
+COMMENT_PAGE_COLUMNS = f"{COMMENT_COLUMNS}, likes, dislikes"
+USER_COMMENT_COLUMNS = "c.id, c.content, c.created_at, conf.id AS conf_id, conf.content AS conf_content, c.file_id, c.file_type"
+PROFILE_COLUMNS = "user_id, aura_points, bio, department, nickname, terms_accepted, start_used"
+CHAT_MESSAGE_COLUMNS = "id, from_user_id, to_user_id, content, created_at"
+
+_confession_row = record_factory(Confession, CONFESSION_COLUMNS)
+_comment_row = record_factory(Comment, COMMENT_COLUMNS)
+_comment_page_row = record_factory(Comment, COMMENT_PAGE_COLUMNS)
+_user_comment_row = record_factory(Comment, USER_COMMENT_COLUMNS)
+_profile_row = record_factory(Profile, PROFILE_COLUMNS)
+_chat_message_row = record_factory(ChatMessage, CHAT_MESSAGE_COLUMNS)
+
+# ------------------------------ PROFILE CACHE ------------------------------
+
+PROFILE_CACHE_MAX_SIZE = 4096
+PROFILE_CACHE_TTL_SECONDS = 300
+
+class ProfileCache:
+    """Bounded LRU cache of Profile records with a TTL and an epoch guard.
+
+    Every invalidation stamps the key with a new epoch. A loader takes the
+    current epoch before it queries and put() drops its result if the key was
+    invalidated in the meantime, so a slow read can never overwrite a newer
+    write. Invalidations are issued after the writing transaction commits.
+    Cached records are shared, so callers must treat them as read-only.
+    """
+
+    def __init__(self, max_size: int = PROFILE_CACHE_MAX_SIZE, ttl_seconds: int = PROFILE_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # user_id -> (epoch, expires_at, profile or None)
+        self._epoch = 0
+        self._evicted_epoch = 0
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Tuple[Optional[Profile], int]:
+        """Return (profile or None, epoch token to pass to put on a miss)"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[2] is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[2], self._epoch
+            self.misses += 1
+            return None, self._epoch
+
+    def put(self, user_id: int, profile: Profile, token: int):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            last_change = entry[0] if entry is not None else self._evicted_epoch
+            if last_change > token:
+                return
+            self._entries[user_id] = (last_change, time.monotonic() + self.ttl_seconds, profile)
+            self._entries.move_to_end(user_id)
+            self._evict()
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += 1
+            self._entries[user_id] = (self._epoch, 0, None)
+            self._entries.move_to_end(user_id)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._evicted_epoch = self._epoch
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            _, (epoch, _, _) = self._entries.popitem(last=False)
+            self._evicted_epoch = max(self._evicted_epoch, epoch)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+profile_cache = ProfileCache()
 
-        try: cur.execute("SELECT file_id FROM comments LIMIT 1")
-        except sqlite3.OperationalError: 
-            cur.execute("ALTER TABLE comments ADD COLUMN file_id TEXT")
-            cur.execute("ALTER TABLE comments ADD COLUMN file_type TEXT")
+# ------------------------------ ENHANCED DATABASE HELPERS ------------------------------
+
+def init_db():
+    """Initialize database with enhanced error handling"""
+    try:
+        with db_transaction() as cur:
+            # Confessions table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS confessions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, content TEXT,
+                    file_id TEXT, file_type TEXT, created_at INTEGER, status TEXT,
+                    admin_message_id INTEGER, channel_message_id INTEGER,
+                    categories TEXT
+                )
+            """)
+
+            # Rate limit table
+            cur.execute("CREATE TABLE IF NOT EXISTS rate_limit (user_id INTEGER PRIMARY KEY, last_ts INTEGER)")
+
+            # Comments table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS comments (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, conf_id INTEGER, user_id INTEGER,
+                    content TEXT, parent_comment_id INTEGER, created_at INTEGER,
+                    bot_message_id INTEGER, file_id TEXT, file_type TEXT
+                )
+            """)
+
+            # Comment votes table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS comment_votes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, comment_id INTEGER, user_id INTEGER,
+                    vote_type TEXT, UNIQUE(comment_id, user_id),
+                    FOREIGN KEY(comment_id) REFERENCES comments(id)
+                )
+            """)
+
+            # Follows table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS follows (
+                    follower_id INTEGER NOT NULL, following_id INTEGER NOT NULL,
+                    created_at INTEGER, PRIMARY KEY (follower_id, following_id)
+                )
+            """)
+
+            # User profiles table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS user_profiles (
+                    user_id INTEGER PRIMARY KEY, aura_points INTEGER DEFAULT 0,
+                    bio TEXT, department TEXT, created_at INTEGER,
+                    nickname TEXT, terms_accepted BOOLEAN DEFAULT FALSE,
+                    start_used BOOLEAN DEFAULT FALSE
+                )
+            """)
+
+            # Chat requests table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS chat_requests (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    from_user_id INTEGER NOT NULL,
+                    to_user_id INTEGER NOT NULL,
+                    status TEXT DEFAULT 'pending',
+                    created_at INTEGER,
+                    UNIQUE(from_user_id, to_user_id)
+                )
+            """)
+
+            # Active chats table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS active_chats (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user1_id INTEGER NOT NULL,
+                    user2_id INTEGER NOT NULL,
+                    created_at INTEGER,
+                    UNIQUE(user1_id, user2_id)
+                )
+            """)
+
+            # Chat messages table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS chat_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chat_id INTEGER,
+                    from_user_id INTEGER NOT NULL,
+                    to_user_id INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    created_at INTEGER,
+                    FOREIGN KEY(chat_id) REFERENCES active_chats(id)
+                )
+            """)
+
+            # Blocked users table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS blocked_users (
+                    blocker_id INTEGER NOT NULL,
+                    blocked_id INTEGER NOT NULL,
+                    created_at INTEGER,
+                    PRIMARY KEY (blocker_id, blocked_id)
+                )
+            """)
+
+            # User reports table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS user_reports (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    reporter_id INTEGER NOT NULL,
+                    reported_user_id INTEGER NOT NULL,
+                    reason TEXT,
+                    custom_reason TEXT,
+                    created_at INTEGER
+                )
+            """)
+
+            # Admin messages table
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS admin_messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id INTEGER NOT NULL,
+                    message_text TEXT NOT NULL,
+                    created_at INTEGER
+                )
+            """)
+
+        # Versioned schema changes and indexes
+        run_migrations()
+        with db_transaction() as cur:
+            sync_change_log(cur)
 
-        conn.commit()
-        conn.close()
         print("✅ Database initialized successfully")
         return True
     except Exception as e:
@@ -481,248 +2713,257 @@ def init_db():
 
 def save_confession(user_id: int, content: str, file_id: str, file_type: str) -> int:
     ts = int(time.time())
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO confessions (user_id, content, file_id, file_type, created_at, status, categories) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (user_id, content, file_id, file_type, ts, "draft", None),
-    )
-    conf_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute(
+            "INSERT INTO confessions (user_id, content, file_id, file_type, created_at, status, categories) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (user_id, content, file_id, file_type, ts, "draft", None),
+        )
+        conf_id = cur.lastrowid
+
     # ENHANCED BACKUP after confession save
     enhanced_backup_trigger()
-    
+
     return conf_id
 
 def save_comment(conf_id: int, user_id: int, content: str, parent_comment_id: Optional[int] = None, file_id: str = None, file_type: str = None) -> int:
     ts = int(time.time())
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO comments (conf_id, user_id, content, parent_comment_id, created_at, file_id, file_type) VALUES (?, ?, ?, ?, ?, ?, ?)",
-        (conf_id, user_id, content, parent_comment_id, ts, file_id, file_type),
-    )
-    comment_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute(
+            "INSERT INTO comments (conf_id, user_id, content, parent_comment_id, created_at, file_id, file_type) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (conf_id, user_id, content, parent_comment_id, ts, file_id, file_type),
+        )
+        comment_id = cur.lastrowid
+        add_aura(cur, user_id, AURA_PER_COMMENT)
+
     # ENHANCED BACKUP after comment
     enhanced_backup_trigger()
-    
+
     return comment_id
 
-def get_comment(comment_id: int) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, conf_id, user_id, content, parent_comment_id, created_at, bot_message_id, file_id, file_type FROM comments WHERE id = ?",
-        (comment_id,)
-    )
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return None
-    return {
-        'id': row[0], 'conf_id': row[1], 'user_id': row[2], 'content': row[3],
-        'parent_comment_id': row[4], 'created_at': row[5], 'bot_message_id': row[6],
-        'file_id': row[7], 'file_type': row[8]
-    }
+def get_comment(comment_id: int) -> Optional[Comment]:
+    with db_cursor() as cur:
+        cur.row_factory = _comment_row
+        cur.execute(
+            f"SELECT {COMMENT_COLUMNS} FROM comments WHERE id = ?",
+            (comment_id,)
+        )
+        return cur.fetchone()
 
-def update_comment_message_id(comment_id: int, bot_message_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def write_comment_message_id(cur, comment_id: int, bot_message_id: int):
     cur.execute("UPDATE comments SET bot_message_id = ? WHERE id = ?", (bot_message_id, comment_id))
-    conn.commit()
-    conn.close()
+
+def write_comment_message_ids(cur, message_ids: Dict[int, int]):
+    cur.executemany("UPDATE comments SET bot_message_id = ? WHERE id = ?",
+                    [(bot_message_id, comment_id) for comment_id, bot_message_id in message_ids.items()])
+
+def update_comment_message_id(comment_id: int, bot_message_id: int):
+    db_writer.submit(write_comment_message_id, comment_id, bot_message_id).result()
 
 def get_comment_message_id(comment_id: int) -> Optional[int]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT bot_message_id FROM comments WHERE id = ?", (comment_id,))
-    row = cur.fetchone()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT bot_message_id FROM comments WHERE id = ?", (comment_id,))
+        row = cur.fetchone()
     return row[0] if row and row[0] else None
 
-def process_vote(comment_id: int, user_id: int, vote_type: str) -> Tuple[bool, str]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def write_vote(cur, comment_id: int, user_id: int, vote_type: str) -> Tuple[bool, str]:
     cur.execute("SELECT vote_type FROM comment_votes WHERE comment_id = ? AND user_id = ?", (comment_id, user_id))
     existing_vote = cur.fetchone()
-    
+
     action = "added"
-    
+    old_vote = existing_vote[0] if existing_vote else None
+    new_vote = vote_type
+
     if existing_vote:
         if existing_vote[0] == vote_type:
             cur.execute("DELETE FROM comment_votes WHERE comment_id = ? AND user_id = ?", (comment_id, user_id))
             action = "removed"
+            new_vote = None
         else:
             cur.execute("UPDATE comment_votes SET vote_type = ? WHERE comment_id = ? AND user_id = ?", (vote_type, comment_id, user_id))
             action = "changed"
     else:
         cur.execute("INSERT INTO comment_votes (comment_id, user_id, vote_type) VALUES (?, ?, ?)", (comment_id, user_id, vote_type))
-    
-    conn.commit()
-    conn.close()
-    
-    # ENHANCED BACKUP after vote
-    enhanced_backup_trigger()
-    
+
+    cur.execute("SELECT user_id FROM comments WHERE id = ?", (comment_id,))
+    author = cur.fetchone()
+    if author:
+        add_aura(cur, author[0], vote_aura_delta(old_vote, new_vote))
+
     return True, action
 
+def process_vote(comment_id: int, user_id: int, vote_type: str) -> Tuple[bool, str]:
+    return db_writer.submit(write_vote, comment_id, user_id, vote_type).result()
+
+COMMENT_VOTE_COUNTS_SQL = "SELECT likes, dislikes FROM comments WHERE id = ?"
+
 def get_comment_vote_counts(comment_id: int) -> Dict[str, int]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT vote_type, COUNT(*) FROM comment_votes WHERE comment_id = ? GROUP BY vote_type", (comment_id,))
-    rows = cur.fetchall()
-    conn.close()
-    counts = {row[0]: row[1] for row in rows}
-    return {'likes': counts.get('like', 0), 'dislikes': counts.get('dislike', 0)}
+    with db_cursor() as cur:
+        cur.execute(COMMENT_VOTE_COUNTS_SQL, (comment_id,))
+        row = cur.fetchone()
+    if not row:
+        return {'likes': 0, 'dislikes': 0}
+    return {'likes': row[0], 'dislikes': row[1]}
 
 def get_user_vote_on_comment(comment_id: int, user_id: int) -> Optional[str]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT vote_type FROM comment_votes WHERE comment_id = ? AND user_id = ?", (comment_id, user_id))
-    row = cur.fetchone()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT vote_type FROM comment_votes WHERE comment_id = ? AND user_id = ?", (comment_id, user_id))
+        row = cur.fetchone()
     return row[0] if row else None
 
-def get_comments_for_confession(conf_id: int, page: int = 1, limit: int = COMMENTS_PER_PAGE) -> Tuple[List[Dict[str, Any]], int]:
-    offset = (page - 1) * limit
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
-    cur.execute("SELECT COUNT(*) FROM comments WHERE conf_id = ? AND parent_comment_id IS NULL", (conf_id,))
-    total_count = cur.fetchone()[0]
-    
-    cur.execute(
-        """
-        SELECT id, user_id, content, created_at, parent_comment_id, bot_message_id, file_id, file_type
-        FROM comments 
-        WHERE conf_id = ? AND parent_comment_id IS NULL
-        ORDER BY created_at ASC
-        LIMIT ? OFFSET ?
-        """, 
-        (conf_id, limit, offset)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    
-    comments = []
-    for r in rows:
-        comments.append({
-            'id': r[0], 'user_id': r[1], 'content': r[2], 'created_at': r[3],
-            'parent_comment_id': r[4], 'bot_message_id': r[5], 'file_id': r[6], 'file_type': r[7]
-        })
-    return comments, total_count
+def user_votes_sql(count: int) -> str:
+    return f"SELECT comment_id, vote_type FROM comment_votes WHERE user_id = ? AND comment_id IN ({', '.join('?' * count)})"
 
-def get_replies_for_comment(comment_id: int) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        SELECT id, user_id, content, created_at, parent_comment_id, bot_message_id, file_id, file_type
-        FROM comments 
-        WHERE parent_comment_id = ?
-        ORDER BY created_at ASC
-        """, 
-        (comment_id,)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    
-    replies = []
-    for r in rows:
-        replies.append({
-            'id': r[0], 'user_id': r[1], 'content': r[2], 'created_at': r[3],
-            'parent_comment_id': r[4], 'bot_message_id': r[5], 'file_id': r[6], 'file_type': r[7]
-        })
-    return replies
+def get_user_votes_on_comments(comment_ids: List[int], user_id: int) -> Dict[int, str]:
+    """The user's vote on each of the comments they voted on, in one query"""
+    if not comment_ids:
+        return {}
+    with db_cursor() as cur:
+        cur.execute(user_votes_sql(len(comment_ids)), (user_id, *comment_ids))
+        return dict(cur.fetchall())
+
+COMMENT_ROOT_COUNT_SQL = "SELECT root_comment_count FROM confessions WHERE id = ?"
+
+def comment_page_sql(keyset: bool) -> str:
+    """Root comments plus their reply subtrees; params are conf_id, the keyset or LIMIT/OFFSET values, max_depth"""
+    if keyset:
+        roots_filter = "AND (created_at, id) > (?, ?) ORDER BY created_at ASC, id ASC LIMIT ?"
+    else:
+        roots_filter = "ORDER BY created_at ASC, id ASC LIMIT ? OFFSET ?"
+    return f"""
+            WITH RECURSIVE
+            roots(id) AS (
+                SELECT id FROM comments
+                WHERE conf_id = ? AND parent_comment_id IS NULL {roots_filter}
+            ),
+            thread(id, depth) AS (
+                SELECT id, 0 FROM roots
+                UNION ALL
+                SELECT c.id, t.depth + 1
+                FROM thread t JOIN comments c ON c.parent_comment_id = t.id
+                WHERE t.depth < ?
+            )
+            SELECT {COMMENT_PAGE_COLUMNS}
+            FROM thread JOIN comments USING (id)
+            ORDER BY thread.depth, created_at, id
+            """
+
+def get_comment_page(conf_id: int, page: int = 1, limit: int = COMMENTS_PER_PAGE,
+                     after: Optional[Tuple[int, int]] = None, max_depth: int = MAX_COMMENT_DEPTH) -> Tuple[List[Comment], int]:
+    """One page of root comments with their whole reply subtrees, plus the total root count.
+
+    Pass after=(created_at, id) of the last root already shown to seek
+    straight to the next page; without it the page number falls back to an
+    OFFSET, which only stays cheap for the first page.
+
+    Rows come back ordered by depth, then (created_at, id), so every parent
+    precedes its replies and siblings are already in display order, ready for
+    build_comment_thread. They carry their vote counts too.
+    """
+    if after is not None:
+        roots_params = (after[0], after[1], limit)
+    else:
+        roots_params = (limit, (page - 1) * limit)
+
+    with db_cursor() as cur:
+        cur.execute(COMMENT_ROOT_COUNT_SQL, (conf_id,))
+        row = cur.fetchone()
+        total_count = row[0] if row else 0
+
+        cur.row_factory = _comment_page_row
+        cur.execute(comment_page_sql(after is not None), (conf_id, *roots_params, max_depth))
+        comments = cur.fetchall()
+    return comments, total_count
 
 def get_comment_author_id(comment_id: int) -> Optional[int]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT user_id FROM comments WHERE id = ?", (comment_id,))
-    row = cur.fetchone()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT user_id FROM comments WHERE id = ?", (comment_id,))
+        row = cur.fetchone()
     return row[0] if row else None
 
-def toggle_follow(follower_id: int, following_id: int) -> bool:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def write_follow_toggle(cur, follower_id: int, following_id: int) -> bool:
     cur.execute("SELECT * FROM follows WHERE follower_id = ? AND following_id = ?", (follower_id, following_id))
     exists = cur.fetchone()
-    
+
     if exists:
         cur.execute("DELETE FROM follows WHERE follower_id = ? AND following_id = ?", (follower_id, following_id))
-        conn.commit()
-        conn.close()
-        
-        # ENHANCED BACKUP after unfollow
-        enhanced_backup_trigger()
-        
-        return False
     else:
         ts = int(time.time())
         cur.execute("INSERT INTO follows (follower_id, following_id, created_at) VALUES (?, ?, ?)", (follower_id, following_id, ts))
-        conn.commit()
-        conn.close()
-        
-        # ENHANCED BACKUP after follow
-        enhanced_backup_trigger()
-        
-        return True
+
+    return not exists
+
+def toggle_follow(follower_id: int, following_id: int) -> bool:
+    return db_writer.submit(write_follow_toggle, follower_id, following_id).result()
+
+FOLLOW_COUNTS_SQL = "SELECT follower_count, following_count FROM user_profiles WHERE user_id = ?"
 
 def get_follow_counts(user_id: int) -> Dict[str, int]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM follows WHERE following_id = ?", (user_id,))
-    followers = cur.fetchone()[0]
-    cur.execute("SELECT COUNT(*) FROM follows WHERE follower_id = ?", (user_id,))
-    following = cur.fetchone()[0]
-    conn.close()
-    return {'followers': followers, 'following': following}
+    with db_cursor() as cur:
+        cur.execute(FOLLOW_COUNTS_SQL, (user_id,))
+        row = cur.fetchone()
+    if not row:
+        return {'followers': 0, 'following': 0}
+    return {'followers': row[0], 'following': row[1]}
 
 def is_following(follower_id: int, following_id: int) -> bool:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM follows WHERE follower_id = ? AND following_id = ?", (follower_id, following_id))
-    exists = cur.fetchone()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT 1 FROM follows WHERE follower_id = ? AND following_id = ?", (follower_id, following_id))
+        exists = cur.fetchone()
     return bool(exists)
 
-def get_user_profile(user_id: int) -> Dict[str, Any]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT user_id, aura_points, bio, department, nickname, terms_accepted, start_used FROM user_profiles WHERE user_id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
-    if row:
-        return {
-            'user_id': row[0], 'aura_points': row[1], 'bio': row[2], 'department': row[3],
-            'nickname': row[4], 'terms_accepted': bool(row[5]), 'start_used': bool(row[6])
-        }
-    else:
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        ts = int(time.time())
-        cur.execute("INSERT INTO user_profiles (user_id, aura_points, bio, department, created_at, nickname, terms_accepted, start_used) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
-                   (user_id, 0, "No bio set", "Not specified", ts, "Anonymous", False, False))
-        conn.commit()
-        conn.close()
-        return {
-            'user_id': user_id, 'aura_points': 0, 'bio': "No bio set", 'department': "Not specified",
-            'nickname': "Anonymous", 'terms_accepted': False, 'start_used': False
-        }
+def _loaded_profile(user_id: int, profile: Optional[Profile]) -> Profile:
+    """Normalize a fetched row, or the defaults for users without one"""
+    if profile:
+        profile.terms_accepted = bool(profile.terms_accepted)
+        profile.start_used = bool(profile.start_used)
+        return profile
+    return Profile(
+        user_id=user_id, aura_points=0, bio="No bio set", department="Not specified",
+        nickname="Anonymous", terms_accepted=False, start_used=False
+    )
+
+def get_user_profile(user_id: int) -> Profile:
+    """Cached profile lookup. Users without a row get the defaults; the row is created on first write."""
+    profile, token = profile_cache.get(user_id)
+    if profile is not None:
+        return profile
+
+    with db_cursor() as cur:
+        cur.row_factory = _profile_row
+        cur.execute(f"SELECT {PROFILE_COLUMNS} FROM user_profiles WHERE user_id = ?", (user_id,))
+        profile = _loaded_profile(user_id, cur.fetchone())
+    profile_cache.put(user_id, profile, token)
+    return profile
+
+def profiles_sql(count: int) -> str:
+    return f"SELECT {PROFILE_COLUMNS} FROM user_profiles WHERE user_id IN ({', '.join('?' * count)})"
+
+def get_user_profiles(user_ids) -> Dict[int, Profile]:
+    """Cached profiles for many users; the cache misses are fetched in one query"""
+    profiles, tokens = {}, {}
+    for user_id in set(user_ids):
+        profile, token = profile_cache.get(user_id)
+        if profile is not None:
+            profiles[user_id] = profile
+        else:
+            tokens[user_id] = token
+    if not tokens:
+        return profiles
+
+    with db_cursor() as cur:
+        cur.row_factory = _profile_row
+        cur.execute(profiles_sql(len(tokens)), tuple(tokens))
+        found = {profile.user_id: profile for profile in cur.fetchall()}
+    for user_id, token in tokens.items():
+        profile = _loaded_profile(user_id, found.get(user_id))
+        profile_cache.put(user_id, profile, token)
+        profiles[user_id] = profile
+    return profiles
 
 def update_user_profile(user_id: int, bio: str = None, department: str = None, nickname: str = None, terms_accepted: bool = None, start_used: bool = None):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
     updates = []
     params = []
-    
+
     if bio is not None:
         updates.append("bio = ?")
         params.append(bio)
@@ -738,196 +2979,140 @@ def update_user_profile(user_id: int, bio: str = None, department: str = None, n
     if start_used is not None:
         updates.append("start_used = ?")
         params.append(start_used)
-        
+
     if updates:
         params.append(user_id)
         query = f"UPDATE user_profiles SET {', '.join(updates)} WHERE user_id = ?"
-        cur.execute(query, params)
-    
-    conn.commit()
-    conn.close()
-    
+        with db_transaction() as cur:
+            cur.execute(_ENSURE_PROFILE_SQL.format(user_id="?"), (user_id,))
+            cur.execute(query, params)
+        profile_cache.invalidate(user_id)
+
     # ENHANCED BACKUP after profile update
     enhanced_backup_trigger()
 
-def get_confession(conf_id: int) -> Dict[str, Any]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, user_id, content, file_id, file_type, created_at, status, admin_message_id, channel_message_id, categories "
-        "FROM confessions WHERE id = ?", 
-        (conf_id,)
-    )
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return {}
-    return {
-        "id": row[0], "user_id": row[1], "content": row[2], "file_id": row[3], 
-        "file_type": row[4], "created_at": row[5], "status": row[6], "admin_message_id": row[7],
-        "channel_message_id": row[8], "categories": row[9] 
-    }
+def get_confession(conf_id: int) -> Optional[Confession]:
+    with db_cursor() as cur:
+        cur.row_factory = _confession_row
+        cur.execute(
+            f"SELECT {CONFESSION_COLUMNS} FROM confessions WHERE id = ?",
+            (conf_id,)
+        )
+        return cur.fetchone()
 
 def update_confession_content_and_media(conf_id: int, content: str, file_id: Optional[str], file_type: Optional[str]):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE confessions SET content = ?, file_id = ?, file_type = ? WHERE id = ?", 
-        (content, file_id, file_type, conf_id)
-    )
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute(
+            "UPDATE confessions SET content = ?, file_id = ?, file_type = ? WHERE id = ?",
+            (content, file_id, file_type, conf_id)
+        )
+
     # ENHANCED BACKUP after confession update
     enhanced_backup_trigger()
-    
+
 def update_confession_categories(conf_id: int, categories_list: List[str]):
     categories_json = json.dumps(categories_list)
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("UPDATE confessions SET categories = ? WHERE id = ?", (categories_json, conf_id)) 
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute("UPDATE confessions SET categories = ? WHERE id = ?", (categories_json, conf_id))
+
     # ENHANCED BACKUP after category update
     enhanced_backup_trigger()
 
 def record_channel_message_id(conf_id: int, message_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("UPDATE confessions SET channel_message_id = ? WHERE id = ?", (message_id, conf_id))
-    conn.commit()
-    conn.close()
+    with db_transaction() as cur:
+        cur.execute("UPDATE confessions SET channel_message_id = ? WHERE id = ?", (message_id, conf_id))
 
 def set_confession_status(conf_id: int, status: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("UPDATE confessions SET status = ? WHERE id = ?", (status, conf_id))
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute("SELECT user_id, status FROM confessions WHERE id = ?", (conf_id,))
+        row = cur.fetchone()
+        cur.execute("UPDATE confessions SET status = ? WHERE id = ?", (status, conf_id))
+        if row and (row[1] == 'approved') != (status == 'approved'):
+            add_aura(cur, row[0], AURA_PER_APPROVED_CONFESSION if status == 'approved' else -AURA_PER_APPROVED_CONFESSION)
+
     # ENHANCED BACKUP after status change
     enhanced_backup_trigger()
 
 def record_admin_message_id(conf_id: int, message_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("UPDATE confessions SET admin_message_id = ? WHERE id = ?", (message_id, conf_id))
-    conn.commit()
-    conn.close()
+    with db_transaction() as cur:
+        cur.execute("UPDATE confessions SET admin_message_id = ? WHERE id = ?", (message_id, conf_id))
 
 def get_last_submission_ts(user_id: int) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT last_ts FROM rate_limit WHERE user_id = ?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT last_ts FROM rate_limit WHERE user_id = ?", (user_id,))
+        row = cur.fetchone()
     return row[0] if row else 0
 
-def update_last_submission_ts(user_id: int):
-    ts = int(time.time())
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def write_last_submission_ts(cur, user_id: int, ts: int):
     cur.execute(
         "INSERT OR REPLACE INTO rate_limit (user_id, last_ts) VALUES (?, ?)",
         (user_id, ts),
     )
-    conn.commit()
-    conn.close()
 
-def get_user_draft_confession(user_id: int) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, user_id, content, file_id, file_type, status, categories "
-        "FROM confessions WHERE user_id = ? AND status = 'draft' ORDER BY created_at DESC LIMIT 1",
-        (user_id,)
-    )
-    row = cur.fetchone()
-    conn.close()
-    if not row:
-        return None
-    return {
-        "id": row[0], "user_id": row[1], "content": row[2], "file_id": row[3], 
-        "file_type": row[4], "status": row[5], "categories": row[6]
-    }
+def update_last_submission_ts(user_id: int):
+    db_writer.submit(write_last_submission_ts, user_id, int(time.time())).result()
+
+DRAFT_CONFESSION_SQL = (f"SELECT {CONFESSION_COLUMNS} "
+                        "FROM confessions WHERE user_id = ? AND status = 'draft' ORDER BY created_at DESC LIMIT 1")
+
+def get_user_draft_confession(user_id: int) -> Optional[Confession]:
+    with db_cursor() as cur:
+        cur.row_factory = _confession_row
+        cur.execute(DRAFT_CONFESSION_SQL, (user_id,))
+        return cur.fetchone()
+
+COMMENT_COUNT_SQL = "SELECT comment_count FROM confessions WHERE id = ?"
 
 def get_comment_count_for_confession(conf_id: int) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM comments WHERE conf_id = ?", (conf_id,))
-    count = cur.fetchone()[0]
-    conn.close()
-    return count
+    with db_cursor() as cur:
+        cur.execute(COMMENT_COUNT_SQL, (conf_id,))
+        row = cur.fetchone()
+    return row[0] if row else 0
 
 def get_user_confessions_count(user_id: int) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM confessions WHERE user_id = ?", (user_id,))
-    count = cur.fetchone()[0]
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM confessions WHERE user_id = ?", (user_id,))
+        count = cur.fetchone()[0]
     return count
 
 def get_user_comments_count(user_id: int) -> int:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM comments WHERE user_id = ?", (user_id,))
-    count = cur.fetchone()[0]
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM comments WHERE user_id = ?", (user_id,))
+        count = cur.fetchone()[0]
     return count
 
-def get_user_confessions(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, content, status, created_at FROM confessions WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
-        (user_id, limit)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    
-    confessions = []
-    for row in rows:
-        confessions.append({
-            'id': row[0], 'content': row[1], 'status': row[2], 'created_at': row[3]
-        })
-    return confessions
+def get_user_confessions(user_id: int, limit: int = 10) -> List[Confession]:
+    with db_cursor() as cur:
+        cur.row_factory = _confession_row
+        cur.execute(
+            f"SELECT {CONFESSION_COLUMNS} FROM confessions WHERE user_id = ? ORDER BY created_at DESC LIMIT ?",
+            (user_id, limit)
+        )
+        return cur.fetchall()
 
-def get_user_comments(user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        """SELECT c.id, c.content, c.created_at, conf.id as conf_id, conf.content as conf_content, c.file_id, c.file_type
-        FROM comments c 
-        JOIN confessions conf ON c.conf_id = conf.id 
-        WHERE c.user_id = ? 
-        ORDER BY c.created_at DESC LIMIT ?""",
-        (user_id, limit)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    
-    comments = []
-    for row in rows:
-        comments.append({
-            'id': row[0], 'content': row[1], 'created_at': row[2],
-            'conf_id': row[3], 'conf_content': row[4], 'file_id': row[5], 'file_type': row[6]
-        })
-    return comments
+USER_COMMENTS_SQL = f"""SELECT {USER_COMMENT_COLUMNS}
+            FROM comments c
+            JOIN confessions conf ON c.conf_id = conf.id
+            WHERE c.user_id = ?
+            ORDER BY c.created_at DESC LIMIT ?"""
+
+def get_user_comments(user_id: int, limit: int = 10) -> List[Comment]:
+    with db_cursor() as cur:
+        cur.row_factory = _user_comment_row
+        cur.execute(USER_COMMENTS_SQL, (user_id, limit))
+        return cur.fetchall()
 
 def get_following_users(user_id: int) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        """SELECT u.user_id, u.nickname 
-        FROM user_profiles u 
-        JOIN follows f ON u.user_id = f.following_id 
-        WHERE f.follower_id = ?""",
-        (user_id,)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    
+    with db_cursor() as cur:
+        cur.execute(
+            """SELECT u.user_id, u.nickname
+            FROM user_profiles u
+            JOIN follows f ON u.user_id = f.following_id
+            WHERE f.follower_id = ?""",
+            (user_id,)
+        )
+        rows = cur.fetchall()
+
     users = []
     for row in rows:
         users.append({
@@ -936,18 +3121,16 @@ def get_following_users(user_id: int) -> List[Dict[str, Any]]:
     return users
 
 def get_follower_users(user_id: int) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        """SELECT u.user_id, u.nickname 
-        FROM user_profiles u 
-        JOIN follows f ON u.user_id = f.follower_id 
-        WHERE f.following_id = ?""",
-        (user_id,)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    
+    with db_cursor() as cur:
+        cur.execute(
+            """SELECT u.user_id, u.nickname
+            FROM user_profiles u
+            JOIN follows f ON u.user_id = f.follower_id
+            WHERE f.following_id = ?""",
+            (user_id,)
+        )
+        rows = cur.fetchall()
+
     users = []
     for row in rows:
         users.append({
@@ -955,37 +3138,30 @@ def get_follower_users(user_id: int) -> List[Dict[str, Any]]:
         })
     return users
 
-def create_chat_request(from_user_id: int, to_user_id: int) -> bool:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
-    cur.execute("SELECT id FROM chat_requests WHERE from_user_id = ? AND to_user_id = ?", (from_user_id, to_user_id))
-    if cur.fetchone():
-        conn.close()
-        return False
-    
-    ts = int(time.time())
-    cur.execute(
-        "INSERT INTO chat_requests (from_user_id, to_user_id, status, created_at) VALUES (?, ?, ?, ?)",
-        (from_user_id, to_user_id, "pending", ts)
-    )
-    conn.commit()
-    conn.close()
-    
+def create_chat_request(from_user_id: int, to_user_id: int) -> bool:
+    with db_transaction() as cur:
+        cur.execute("SELECT id FROM chat_requests WHERE from_user_id = ? AND to_user_id = ?", (from_user_id, to_user_id))
+        if cur.fetchone():
+            return False
+
+        ts = int(time.time())
+        cur.execute(
+            "INSERT INTO chat_requests (from_user_id, to_user_id, status, created_at) VALUES (?, ?, ?, ?)",
+            (from_user_id, to_user_id, "pending", ts)
+        )
+
     # ENHANCED BACKUP after chat request
     enhanced_backup_trigger()
-    
+
     return True
 
 def get_chat_request(from_user_id: int, to_user_id: int) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, from_user_id, to_user_id, status, created_at FROM chat_requests WHERE from_user_id = ? AND to_user_id = ?",
-        (from_user_id, to_user_id)
-    )
-    row = cur.fetchone()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute(
+            "SELECT id, from_user_id, to_user_id, status, created_at FROM chat_requests WHERE from_user_id = ? AND to_user_id = ?",
+            (from_user_id, to_user_id)
+        )
+        row = cur.fetchone()
     if not row:
         return None
     return {
@@ -993,195 +3169,643 @@ def get_chat_request(from_user_id: int, to_user_id: int) -> Optional[Dict[str, A
     }
 
 def update_chat_request_status(request_id: int, status: str):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("UPDATE chat_requests SET status = ? WHERE id = ?", (status, request_id))
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute("UPDATE chat_requests SET status = ? WHERE id = ?", (status, request_id))
+
     # ENHANCED BACKUP after chat status change
     enhanced_backup_trigger()
 
 def create_active_chat(user1_id: int, user2_id: int) -> int:
     ts = int(time.time())
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
+
     if user1_id > user2_id:
         user1_id, user2_id = user2_id, user1_id
-    
-    cur.execute(
-        "INSERT OR REPLACE INTO active_chats (user1_id, user2_id, created_at) VALUES (?, ?, ?)",
-        (user1_id, user2_id, ts)
-    )
-    chat_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    
+
+    with db_transaction() as cur:
+        cur.execute(
+            "INSERT OR REPLACE INTO active_chats (user1_id, user2_id, created_at) VALUES (?, ?, ?)",
+            (user1_id, user2_id, ts)
+        )
+        chat_id = cur.lastrowid
+
     # ENHANCED BACKUP after active chat creation
     enhanced_backup_trigger()
-    
+
     return chat_id
 
 def get_active_chat(user1_id: int, user2_id: int) -> Optional[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
     if user1_id > user2_id:
         user1_id, user2_id = user2_id, user1_id
-    
-    cur.execute(
-        "SELECT id, user1_id, user2_id, created_at FROM active_chats WHERE user1_id = ? AND user2_id = ?",
-        (user1_id, user2_id)
-    )
-    row = cur.fetchone()
-    conn.close()
+
+    with db_cursor() as cur:
+        cur.execute(
+            "SELECT id, user1_id, user2_id, created_at FROM active_chats WHERE user1_id = ? AND user2_id = ?",
+            (user1_id, user2_id)
+        )
+        row = cur.fetchone()
     if not row:
         return None
     return {
         'id': row[0], 'user1_id': row[1], 'user2_id': row[2], 'created_at': row[3]
     }
 
+ACTIVE_CHATS_FOR_USER_SQL = """SELECT id, user1_id, user2_id, created_at
+            FROM active_chats
+            WHERE user1_id = ? OR user2_id = ?"""
+
 def get_active_chats_for_user(user_id: int) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
-    cur.execute(
-        """SELECT id, user1_id, user2_id, created_at 
-        FROM active_chats 
-        WHERE user1_id = ? OR user2_id = ?""",
-        (user_id, user_id)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    
+    with db_cursor() as cur:
+        cur.execute(ACTIVE_CHATS_FOR_USER_SQL, (user_id, user_id))
+        rows = cur.fetchall()
+
     chats = []
     for row in rows:
         chat_id, user1_id, user2_id, created_at = row
         other_user_id = user2_id if user1_id == user_id else user1_id
         other_user_profile = get_user_profile(other_user_id)
-        
+
         chats.append({
             'chat_id': chat_id,
             'other_user_id': other_user_id,
             'other_user_nickname': other_user_profile['nickname'] or 'Anonymous',
             'created_at': created_at
         })
-    
+
     return chats
 
-def save_chat_message(chat_id: int, from_user_id: int, to_user_id: int, content: str) -> int:
-    ts = int(time.time())
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def write_chat_message(cur, chat_id: int, from_user_id: int, to_user_id: int, content: str, ts: int) -> int:
     cur.execute(
         "INSERT INTO chat_messages (chat_id, from_user_id, to_user_id, content, created_at) VALUES (?, ?, ?, ?, ?)",
         (chat_id, from_user_id, to_user_id, content, ts)
     )
-    message_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    
-    # ENHANCED BACKUP after chat message
-    enhanced_backup_trigger()
-    
-    return message_id
+    return cur.lastrowid
 
-def get_chat_messages(chat_id: int, limit: int = 50) -> List[Dict[str, Any]]:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, from_user_id, to_user_id, content, created_at FROM chat_messages WHERE chat_id = ? ORDER BY created_at ASC LIMIT ?",
-        (chat_id, limit)
-    )
-    rows = cur.fetchall()
-    conn.close()
-    
-    messages = []
-    for row in rows:
-        messages.append({
-            'id': row[0], 'from_user_id': row[1], 'to_user_id': row[2], 'content': row[3], 'created_at': row[4]
-        })
-    return messages
+def save_chat_message(chat_id: int, from_user_id: int, to_user_id: int, content: str) -> int:
+    ts = int(time.time())
+    return db_writer.submit(write_chat_message, chat_id, from_user_id, to_user_id, content, ts).result()
+
+CHAT_MESSAGES_SQL = f"SELECT {CHAT_MESSAGE_COLUMNS} FROM chat_messages WHERE chat_id = ? ORDER BY created_at ASC LIMIT ?"
+
+def get_chat_messages(chat_id: int, limit: int = 50) -> List[ChatMessage]:
+    with db_cursor() as cur:
+        cur.row_factory = _chat_message_row
+        cur.execute(CHAT_MESSAGES_SQL, (chat_id, limit))
+        return cur.fetchall()
 
 def end_chat(chat_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("DELETE FROM active_chats WHERE id = ?", (chat_id,))
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute("DELETE FROM active_chats WHERE id = ?", (chat_id,))
+
     # ENHANCED BACKUP after chat end
     enhanced_backup_trigger()
 
 def block_user(blocker_id: int, blocked_id: int):
     ts = int(time.time())
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT OR REPLACE INTO blocked_users (blocker_id, blocked_id, created_at) VALUES (?, ?, ?)",
-        (blocker_id, blocked_id, ts)
-    )
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute(
+            "INSERT OR REPLACE INTO blocked_users (blocker_id, blocked_id, created_at) VALUES (?, ?, ?)",
+            (blocker_id, blocked_id, ts)
+        )
+
     # ENHANCED BACKUP after block
     enhanced_backup_trigger()
 
 def unblock_user(blocker_id: int, blocked_id: int):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("DELETE FROM blocked_users WHERE blocker_id = ? AND blocked_id = ?", (blocker_id, blocked_id))
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute("DELETE FROM blocked_users WHERE blocker_id = ? AND blocked_id = ?", (blocker_id, blocked_id))
+
     # ENHANCED BACKUP after unblock
     enhanced_backup_trigger()
 
 def is_blocked(blocker_id: int, blocked_id: int) -> bool:
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT 1 FROM blocked_users WHERE blocker_id = ? AND blocked_id = ?", (blocker_id, blocked_id))
-    result = cur.fetchone()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("SELECT 1 FROM blocked_users WHERE blocker_id = ? AND blocked_id = ?", (blocker_id, blocked_id))
+        result = cur.fetchone()
     return bool(result)
 
 def create_user_report(reporter_id: int, reported_user_id: int, reason: str = None, custom_reason: str = None):
     ts = int(time.time())
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO user_reports (reporter_id, reported_user_id, reason, custom_reason, created_at) VALUES (?, ?, ?, ?, ?)",
-        (reporter_id, reported_user_id, reason, custom_reason, ts)
-    )
-    report_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute(
+            "INSERT INTO user_reports (reporter_id, reported_user_id, reason, custom_reason, created_at) VALUES (?, ?, ?, ?, ?)",
+            (reporter_id, reported_user_id, reason, custom_reason, ts)
+        )
+        report_id = cur.lastrowid
+
     # ENHANCED BACKUP after report
     enhanced_backup_trigger()
-    
+
     return report_id
 
 def save_admin_message(user_id: int, message_text: str) -> int:
     ts = int(time.time())
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO admin_messages (user_id, message_text, created_at) VALUES (?, ?, ?)",
-        (user_id, message_text, ts)
-    )
-    message_id = cur.lastrowid
-    conn.commit()
-    conn.close()
-    
+    with db_transaction() as cur:
+        cur.execute(
+            "INSERT INTO admin_messages (user_id, message_text, created_at) VALUES (?, ?, ?)",
+            (user_id, message_text, ts)
+        )
+        message_id = cur.lastrowid
+
     # ENHANCED BACKUP after admin message
     enhanced_backup_trigger()
-    
+
     return message_id
 
+PENDING_CONFESSIONS_SQL = "SELECT COUNT(*) FROM confessions WHERE status = 'pending'"
+
+def get_admin_dashboard_counts() -> Tuple[int, int, int]:
+    with db_cursor() as cur:
+        cur.execute(PENDING_CONFESSIONS_SQL)
+        pending_count = cur.fetchone()[0]
+
+        cur.execute("SELECT COUNT(*) FROM user_reports")
+        report_count = cur.fetchone()[0]
+
+        cur.execute("SELECT COUNT(*) FROM chat_requests WHERE status = 'pending'")
+        chat_requests_count = cur.fetchone()[0]
+    return pending_count, report_count, chat_requests_count
+
+def get_system_stats() -> Dict[str, int]:
+    with db_cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM user_profiles")
+        user_count = cur.fetchone()[0]
+
+        cur.execute("SELECT COUNT(*) FROM confessions WHERE status = 'approved'")
+        approved_count = cur.fetchone()[0]
+
+        cur.execute("SELECT COUNT(*) FROM confessions WHERE status = 'pending'")
+        pending_count = cur.fetchone()[0]
+
+        cur.execute("SELECT COUNT(*) FROM comments")
+        comment_count = cur.fetchone()[0]
+
+        cur.execute("SELECT COUNT(*) FROM active_chats")
+        active_chats_count = cur.fetchone()[0]
+    return {
+        'users': user_count, 'approved': approved_count, 'pending': pending_count,
+        'comments': comment_count, 'active_chats': active_chats_count
+    }
+
+def get_all_user_ids() -> List[int]:
+    with db_cursor() as cur:
+        # Everyone with a profile, confession or comment; there is no separate users table
+        cur.execute("SELECT user_id FROM user_profiles UNION SELECT user_id FROM confessions "
+                    "UNION SELECT user_id FROM comments")
+        return [row[0] for row in cur.fetchall()]
+
+def repair_counters() -> Dict[str, int]:
+    with db_transaction() as cur:
+        return repair_counters_in(cur)
+
+def recompute_aura() -> int:
+    with db_transaction() as cur:
+        changed = recompute_aura_in(cur)
+    profile_cache.clear()
+    return changed
+
+# Tables counted by /export; users are the user_profiles rows, there is no users table
+EXPORT_TABLES = [
+    "confessions", "comments", "comment_votes",
+    "follows", "user_profiles", "chat_requests", "active_chats",
+    "chat_messages", "blocked_users", "user_reports", "admin_messages"
+]
+
+def get_table_row_counts(tables: List[str]) -> Dict[str, int]:
+    counts = {}
+    with db_cursor() as cur:
+        for table in tables:
+            cur.execute(f"SELECT COUNT(*) FROM {table}")
+            counts[table] = cur.fetchone()[0]
+    return counts
+
+# Queries on the request path that must be served by an index: the statements the helpers
+# above execute, with sample parameters. The third item lists plan steps that are expected,
+# e.g. the comment page scanning its own CTE work queue and sorting the page it returns.
+COMMENT_PAGE_PLAN_STEPS = {'SCAN roots', 'SCAN t', 'SCAN thread', 'USE TEMP B-TREE FOR ORDER BY'}
+HOT_QUERIES = {
+    'comment_page_keyset': (comment_page_sql(True), (0, 0, 0, COMMENTS_PER_PAGE, MAX_COMMENT_DEPTH), COMMENT_PAGE_PLAN_STEPS),
+    'comment_page_offset': (comment_page_sql(False), (0, COMMENTS_PER_PAGE, 0, MAX_COMMENT_DEPTH), COMMENT_PAGE_PLAN_STEPS),
+    'comment_root_count': (COMMENT_ROOT_COUNT_SQL, (0,), set()),
+    'comment_vote_counts': (COMMENT_VOTE_COUNTS_SQL, (0,), set()),
+    'comment_page_user_votes': (user_votes_sql(2), (0, 0, 0), set()),
+    'comment_page_profiles': (profiles_sql(2), (0, 0), set()),
+    'comment_count': (COMMENT_COUNT_SQL, (0,), set()),
+    'follow_counts': (FOLLOW_COUNTS_SQL, (0,), set()),
+    'draft_confession': (DRAFT_CONFESSION_SQL, (0,), set()),
+    'user_comments': (USER_COMMENTS_SQL, (0, 10), set()),
+    'chat_messages': (CHAT_MESSAGES_SQL, (0, 50), set()),
+    'active_chats_for_user': (ACTIVE_CHATS_FOR_USER_SQL, (0, 0), set()),
+    'pending_confessions': (PENDING_CONFESSIONS_SQL, (), set()),
+}
+
+def verify_query_plans() -> List[str]:
+    """EXPLAIN every hot query and return the unexpected steps that scan a table or sort in a temp b-tree"""
+    problems = []
+    with db_cursor() as cur:
+        for name, (sql, params, expected) in HOT_QUERIES.items():
+            cur.execute("EXPLAIN QUERY PLAN " + sql, params)
+            for row in cur.fetchall():
+                detail = row[3]
+                if detail.startswith(("SCAN", "USE TEMP B-TREE")) and detail not in expected:
+                    problems.append(f"{name}: {detail}")
+    return problems
+
+# ------------------------------ ASYNC DATABASE EXECUTOR ------------------------------
+
+DB_WORKER_THREADS = 4
+
+_db_executor = ThreadPoolExecutor(max_workers=DB_WORKER_THREADS, thread_name_prefix="db_worker")
+
+async def run_db(func, *args, **kwargs):
+    """Await a synchronous database helper on the DB worker pool.
+
+    Handlers use this instead of calling helpers directly, so a slow query or a
+    lock wait blocks one worker thread instead of the event loop. The helpers
+    themselves stay synchronous and can still be called from plain threads.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+async def run_write(operation, *args):
+    """Queue a write operation on the group-commit writer and await its result.
+
+    Unlike run_db this does not hold a DB worker while waiting, so a burst of
+    votes from many updates can pile into the same batch.
+    """
+    return await asyncio.wrap_future(db_writer.submit(operation, *args))
+
+# ------------------------------ GROUP-COMMIT WRITE QUEUE ------------------------------
+
+WRITE_BATCH_MAX_SIZE = 200
+WRITE_BATCH_MAX_LATENCY_MS = 5
+
+class GroupCommitWriter:
+    """Coalesces high-frequency writes into one transaction per batch.
+
+    Callers submit an operation (a function taking a cursor) and get a Future
+    back. A single writer thread drains the queue, waiting at most
+    max_latency_ms for more work or until max_batch_size operations are
+    queued, and runs the whole batch inside one BEGIN IMMEDIATE ... COMMIT.
+    Each operation runs under its own savepoint, so one failing write only
+    fails its own Future. Futures resolve after COMMIT, and the writer's
+    connection uses synchronous=FULL, so a resolved Future means the write is
+    durable.
+    """
+
+    def __init__(self, max_batch_size: int = WRITE_BATCH_MAX_SIZE, max_latency_ms: int = WRITE_BATCH_MAX_LATENCY_MS):
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000
+        self.batches_committed = 0
+        self.writes_committed = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._conn = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db_writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, operation, *args) -> Future:
+        future = Future()
+        self.start()
+        self._queue.put((operation, args, future))
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        # Held for the whole batch so a database swap waits for the commit
+        with db_connection() as conn:
+            if conn is not self._conn:
+                conn.execute("PRAGMA synchronous=FULL")
+                self._conn = conn
+
+            outcomes = []
+            cur = conn.cursor()
+            try:
+                cur.execute("BEGIN IMMEDIATE")
+                for operation, args, future in batch:
+                    cur.execute("SAVEPOINT write_op")
+                    try:
+                        outcomes.append((future, operation(cur, *args), None))
+                        cur.execute("RELEASE write_op")
+                    except Exception as e:
+                        cur.execute("ROLLBACK TO write_op")
+                        cur.execute("RELEASE write_op")
+                        outcomes.append((future, None, e))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Write batch of {len(batch)} failed: {e}")
+                for _, _, future in batch:
+                    future.set_exception(e)
+                return
+            finally:
+                cur.close()
+                run_after_transaction_callbacks()
+
+            self.batches_committed += 1
+            self.writes_committed += len(batch)
+            for future, result, error in outcomes:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+        # One backup trigger per committed batch instead of one per write
+        enhanced_backup_trigger()
+
+db_writer = GroupCommitWriter()
+
+# ------------------------------ OUTBOUND SEND SCHEDULER ------------------------------
+
+SEND_GLOBAL_RATE = 30              # requests per second across all chats
+SEND_GLOBAL_BURST = 30
+SEND_PRIVATE_RATE = 1.0            # sustained messages per second to one private chat
+SEND_PRIVATE_BURST = 60            # Telegram allows short bursts: a full comment page with replies goes at the global rate
+SEND_GROUP_RATE = 20 / 60          # groups and channels allow 20 messages per minute
+SEND_GROUP_BURST = 3
+SEND_MAX_RETRIES = 3               # RetryAfter retries before the error reaches the caller
+SEND_LANE_IDLE_SECONDS = 60        # per-chat state older than this is dropped ...
+SEND_MAX_IDLE_LANES = 1024         # ... once more than this many chats are tracked
+SEND_WAIT_SAMPLES = 1000
+BROADCAST_CONCURRENCY = 10         # enough to keep the global bucket busy without starving replies
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst"""
+
+    __slots__ = ('rate', 'burst', 'tokens', 'updated')
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token and return 0, or return the seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+class _ChatLane:
+    """Per-chat FIFO lock and bucket"""
+
+    __slots__ = ('lock', 'bucket', 'users', 'last_used')
+
+    def __init__(self, group: bool):
+        self.lock = asyncio.Lock()
+        self.bucket = TokenBucket(SEND_GROUP_RATE, SEND_GROUP_BURST) if group else TokenBucket(SEND_PRIVATE_RATE, SEND_PRIVATE_BURST)
+        self.users = 0
+        self.last_used = time.monotonic()
+
+def retry_after_seconds(exc: RetryAfter) -> float:
+    """The pause a RetryAfter asks for, in seconds.
+
+    PTB returns an int (with a deprecation warning) unless PTB_TIMEDELTA is
+    set, in which case it returns a timedelta.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', PTBDeprecationWarning)
+        retry_after = exc.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+class SendScheduler(BaseRateLimiter):
+    """Rate limiter for every Bot API request the application makes.
+
+    Requests carrying a chat_id wait on that chat's lane (an asyncio.Lock,
+    which wakes waiters in arrival order) and keep it until Telegram has
+    answered, so messages to one chat go out one at a time and in order.
+    They then take a token from the chat's bucket and from the global
+    bucket; requests for different chats proceed concurrently. Requests
+    without a chat_id (answerCallbackQuery, getMe) are not throttled. A
+    RetryAfter pauses all sends for the requested time before retrying.
+    """
+
+    def __init__(self):
+        self._lanes: Dict[Any, _ChatLane] = {}
+        self._global = TokenBucket(SEND_GLOBAL_RATE, SEND_GLOBAL_BURST)
+        self._global_lock = asyncio.Lock()
+        self._paused_until = 0.0
+        self._next_prune = 0.0
+        self.pending = 0     # requests inside process_request
+        self.in_flight = 0   # of those, awaiting Telegram
+        self.sent = 0
+        self.retries = 0
+        self.errors = 0
+        self.wait_total = 0.0
+        self.wait_count = 0
+        self._waits = deque(maxlen=SEND_WAIT_SAMPLES)
+        self._stats_lock = threading.Lock()  # stats() is read from the metrics thread
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        self._lanes.clear()
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get('chat_id')
+        if chat_id is None:
+            return await self._send(callback, args, kwargs, endpoint, None)
+
+        queued_at = time.monotonic()
+        lane = self._lanes.get(chat_id)
+        if lane is None:
+            # String chat ids are @channel usernames; negative ids are groups and channels
+            lane = self._lanes[chat_id] = _ChatLane(isinstance(chat_id, str) or chat_id < 0)
+        lane.users += 1
+        self.pending += 1
+        try:
+            async with lane.lock:
+                await self._take(lane.bucket)
+                return await self._send(callback, args, kwargs, endpoint, queued_at)
+        finally:
+            self.pending -= 1
+            lane.users -= 1
+            lane.last_used = time.monotonic()
+            if len(self._lanes) > SEND_MAX_IDLE_LANES and lane.last_used >= self._next_prune:
+                self._prune_lanes()
+
+    async def _send(self, callback, args, kwargs, endpoint: str, queued_at: Optional[float]):
+        for attempt in itertools.count():
+            await self._wait_out_pause()
+            if queued_at is not None:
+                async with self._global_lock:
+                    await self._take(self._global)
+                if attempt == 0:
+                    self._record_wait(time.monotonic() - queued_at)
+            self.in_flight += 1
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as exc:
+                if attempt >= SEND_MAX_RETRIES:
+                    self.errors += 1
+                    raise
+                delay = retry_after_seconds(exc)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self.retries += 1
+                logger.warning(f"Flood limit on {endpoint}: pausing sends for {delay:.0f}s "
+                               f"(retry {attempt + 1}/{SEND_MAX_RETRIES})")
+            except Exception:
+                self.errors += 1
+                raise
+            finally:
+                self.in_flight -= 1
+
+    @staticmethod
+    async def _take(bucket: TokenBucket):
+        while True:
+            delay = bucket.take()
+            if not delay:
+                return
+            await asyncio.sleep(delay)
+
+    async def _wait_out_pause(self):
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def _record_wait(self, seconds: float):
+        with self._stats_lock:
+            self._waits.append(seconds)
+            self.wait_total += seconds
+            self.wait_count += 1
+
+    def _prune_lanes(self):
+        # At most once a second, so a broadcast to thousands of chats does not rescan them per send
+        now = time.monotonic()
+        self._next_prune = now + 1
+        cutoff = now - SEND_LANE_IDLE_SECONDS
+        for chat_id in [chat_id for chat_id, lane in self._lanes.items() if not lane.users and lane.last_used < cutoff]:
+            del self._lanes[chat_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            waits = sorted(self._waits)
+            wait_total, wait_count = self.wait_total, self.wait_count
+
+        def quantile(q: float) -> float:
+            return waits[min(int(q * len(waits)), len(waits) - 1)] if waits else 0.0
+
+        return {
+            'queued': self.pending - self.in_flight, 'in_flight': self.in_flight,
+            'sent': self.sent, 'retries': self.retries, 'errors': self.errors,
+            'chats': len(self._lanes), 'paused_for': max(self._paused_until - time.monotonic(), 0.0),
+            'wait_p50': quantile(0.5), 'wait_p95': quantile(0.95), 'wait_max': waits[-1] if waits else 0.0,
+            'wait_total': wait_total, 'wait_count': wait_count,
+        }
+
+send_scheduler = SendScheduler()
+
+def render_send_metrics() -> str:
+    """send_scheduler.stats() in the Prometheus text exposition format"""
+    stats = send_scheduler.stats()
+    return format_prometheus([
+        ('send_queue_depth', 'gauge', 'Bot API requests waiting for a rate limit token', [({}, stats['queued'])]),
+        ('send_in_flight', 'gauge', 'Bot API requests awaiting a response', [({}, stats['in_flight'])]),
+        ('send_requests_total', 'counter', 'Bot API requests by outcome',
+         [({'outcome': 'sent'}, stats['sent']), ({'outcome': 'error'}, stats['errors'])]),
+        ('send_retries_total', 'counter', 'Requests retried after a RetryAfter', [({}, stats['retries'])]),
+        ('send_paused_seconds', 'gauge', 'Remaining flood-limit pause', [({}, stats['paused_for'])]),
+        ('send_tracked_chats', 'gauge', 'Chats with rate limit state', [({}, stats['chats'])]),
+        ('send_wait_seconds', 'gauge', f'Queue wait quantiles over the last {SEND_WAIT_SAMPLES} throttled requests',
+         [({'quantile': '0.5'}, stats['wait_p50']), ({'quantile': '0.95'}, stats['wait_p95']),
+          ({'quantile': '1'}, stats['wait_max'])]),
+        ('send_wait_seconds_total', 'counter', 'Total queue wait of throttled requests', [({}, stats['wait_total'])]),
+        ('send_throttled_requests_total', 'counter', 'Requests that went through a chat queue', [({}, stats['wait_count'])]),
+    ])
+
+register_metrics(render_send_metrics)
+
+# ------------------------------ UPDATE PROCESSING ------------------------------
+
+UPDATE_MAX_CONCURRENT = 256  # updates handled at once across all users
+
+def update_lane_key(update: object):
+    """Updates with the same key are handled one after another: the sender, else the chat"""
+    if isinstance(update, Update):
+        if update.effective_user:
+            return ('user', update.effective_user.id)
+        if update.effective_chat:
+            return ('chat', update.effective_chat.id)
+    return None
+
+class _UpdateLane:
+    __slots__ = ('lock', 'users')
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Handles updates from different users concurrently and each user's updates in arrival order.
+
+    ConversationHandler keys its state by chat and user and expects those
+    updates one at a time, the chat relay must forward a user's messages in
+    order, and a double-tapped admin button must not run its handler twice
+    at once. A user waiting on a slow query still does not hold up anyone
+    else.
+    """
+
+    def __init__(self, max_concurrent_updates: int = UPDATE_MAX_CONCURRENT):
+        super().__init__(max_concurrent_updates)
+        self._lanes: Dict[Any, _UpdateLane] = {}
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = update_lane_key(update)
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = _UpdateLane()
+        lane.users += 1
+        try:
+            async with lane.lock:
+                await coroutine
+        finally:
+            lane.users -= 1
+            if not lane.users:
+                del self._lanes[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
 # ------------------------------ ENHANCED UTILS ------------------------------
 
+def get_bot_username(context: ContextTypes.DEFAULT_TYPE) -> str:
+    """Username for deep links: the identity post_init fetched once, or BOT_USERNAME until then"""
+    return context.bot_data.get('bot_username') or BOT_USERNAME
+
+def deep_link(bot_username: str, payload: str) -> str:
+    return f"https://t.me/{bot_username}?start={payload}"
+
 def escape_html(text: str) -> str:
     if text is None:
         return ""
@@ -1228,26 +3852,48 @@ def format_confession_for_channel(conf: Dict[str, Any]) -> str:
     
     return text.strip()
 
-async def format_comment_display(comment: Dict[str, Any], conf_id: int, depth: int, context: ContextTypes.DEFAULT_TYPE) -> str:
-    current_user_id = context.user_data.get('current_user_id', context._user_id)
+class CommentPage:
+    """Everything rendering one page of comments needs, loaded before the first message is sent.
+
+    Vote counts arrive with the page rows, and the viewer's votes and the
+    author profiles take one query each (see load_comment_page). Replies are
+    threaded under the messages sent earlier in the same render, and the new
+    message ids are written back in one batch once the page is out.
+    """
+
+    def __init__(self, conf: Confession, viewer_id: int, bot_username: str, comments: List[Comment],
+                 user_votes: Dict[int, str], profiles: Dict[int, Profile]):
+        self.conf = conf
+        self.viewer_id = viewer_id
+        self.bot_username = bot_username
+        self.user_votes = user_votes
+        self.profiles = profiles
+        self.message_ids = {comment.id: comment.bot_message_id for comment in comments if comment.bot_message_id}
+        self.sent = {}
+
+    def record_sent(self, comment_id: int, message_id: int):
+        self.message_ids[comment_id] = message_id
+        self.sent[comment_id] = message_id
+
+def load_comment_page(comments: List[Comment], viewer_id: int) -> Tuple[Dict[int, str], Dict[int, Profile]]:
+    """The viewer's votes and the authors' profiles for a page of comments, one query each"""
+    user_votes = get_user_votes_on_comments([comment.id for comment in comments], viewer_id)
+    profiles = get_user_profiles(comment.user_id for comment in comments)
+    return user_votes, profiles
+
+def format_comment_display(comment: Comment, depth: int, page: CommentPage) -> str:
     target_user_id = comment['user_id']
-    conf = get_confession(conf_id)
+    profile = page.profiles[target_user_id]
     
-    if target_user_id == current_user_id:
+    if target_user_id == page.viewer_id:
         display_name = "You"
-    elif target_user_id == conf['user_id']:
-        bot_username = (await context.application.bot.get_me()).username
-        profile_deep_link = f"t.me/{bot_username}?start=profile_{target_user_id}"
-        display_name = f"[Confession Author]({profile_deep_link})"
+    elif target_user_id == page.conf['user_id']:
+        display_name = f"[Confession Author]({deep_link(page.bot_username, f'profile_{target_user_id}')})"
     else:
-        profile = get_user_profile(target_user_id)
         display_name = profile['nickname'] or 'Anonymous'
         
-        bot_username = (await context.application.bot.get_me()).username
-        profile_deep_link = f"t.me/{bot_username}?start=profile_{target_user_id}"
-        display_name = f"[{display_name}]({profile_deep_link})"
+        display_name = f"[{display_name}]({deep_link(page.bot_username, f'profile_{target_user_id}')})"
     
-    profile = get_user_profile(target_user_id)
     aura_points = profile.get('aura_points', 0)
     
     indent = " " * (depth * 4)
@@ -1270,37 +3916,43 @@ async def format_comment_display(comment: Dict[str, Any], conf_id: int, depth: i
     
     return text
 
-def build_comment_thread(flat_comments: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    comment_map = {c['id']: {**c, 'replies': []} for c in flat_comments}
+def build_comment_thread(flat_comments: List[Comment]) -> List[Comment]:
+    """Link comments into reply trees in place; the records themselves are not copied.
+
+    Expects rows in get_comment_page order (parents before replies, siblings
+    by created_at), so each list is built already sorted.
+    """
+    comment_map = {}
+    for comment in flat_comments:
+        comment.replies = []
+        comment_map[comment.id] = comment
+
     thread_roots = []
-    for comment in comment_map.values():
-        parent_id = comment.get('parent_comment_id')
-        if parent_id in comment_map:
-            comment_map[parent_id]['replies'].append(comment)
+    for comment in flat_comments:
+        parent = comment_map.get(comment.parent_comment_id)
+        if parent is not None:
+            parent.replies.append(comment)
         else:
             thread_roots.append(comment)
-            
-    for comment in comment_map.values():
-        comment['replies'].sort(key=lambda x: x['created_at'])
-            
+
     return thread_roots
 
 async def send_comment_and_replies(
     chat_id: int, 
     context: ContextTypes.DEFAULT_TYPE, 
-    comment: Dict[str, Any], 
-    conf_id: int,
+    comment: Comment, 
+    page: CommentPage,
     depth: int = 0
 ):
-    current_user_id = context.user_data.get('current_user_id', chat_id)
+    current_user_id = page.viewer_id
     
-    counts = get_comment_vote_counts(comment['id'])
-    user_vote = get_user_vote_on_comment(comment['id'], current_user_id)
-    comment_text = await format_comment_display(comment, conf_id, depth, context) 
+    counts = {'likes': comment['likes'] or 0, 'dislikes': comment['dislikes'] or 0}
+    user_vote = page.user_votes.get(comment['id'])
+    comment_text = format_comment_display(comment, depth, page)
 
     parent_message_id = None
     if comment.get('parent_comment_id'):
-        parent_message_id = get_comment_message_id(comment['parent_comment_id'])
+        parent_message_id = page.message_ids.get(comment['parent_comment_id'])
     
     if comment.get('file_id'):
         file_id = comment['file_id']
@@ -1341,14 +3993,15 @@ async def send_comment_and_replies(
             reply_to_message_id=parent_message_id
         )
     
-    update_comment_message_id(comment['id'], sent_message.message_id)
+    page.record_sent(comment['id'], sent_message.message_id)
     
     if depth < MAX_COMMENT_DEPTH and comment.get('replies'):
         for reply in comment['replies']:
-            await send_comment_and_replies(chat_id, context, reply, conf_id, depth + 1)
+            await send_comment_and_replies(chat_id, context, reply, page, depth + 1)
 
-async def show_comments(update: Update, context: ContextTypes.DEFAULT_TYPE, conf_id: int, page: int = 1):
-    conf = get_confession(conf_id)
+async def show_comments(update: Update, context: ContextTypes.DEFAULT_TYPE, conf_id: int, page: int = 1,
+                        after: Optional[Tuple[int, int]] = None):
+    conf = await run_db(get_confession, conf_id)
     if not conf:
         await context.bot.send_message(
             chat_id=update.effective_chat.id,
@@ -1363,15 +4016,9 @@ async def show_comments(update: Update, context: ContextTypes.DEFAULT_TYPE, conf
         )
         return
     
-    flat_comments, total_count = get_comments_for_confession(conf_id, page)
-    
-    all_comments_for_page = []
-    for comment in flat_comments:
-        all_comments_for_page.append(comment)
-        replies = get_replies_for_comment(comment['id'])
-        all_comments_for_page.extend(replies)
+    flat_comments, total_count = await run_db(get_comment_page, conf_id, page, COMMENTS_PER_PAGE, after)
     
-    thread_roots = build_comment_thread(all_comments_for_page)
+    thread_roots = build_comment_thread(flat_comments)
     
     chat_id = update.effective_chat.id
     
@@ -1389,15 +4036,22 @@ async def show_comments(update: Update, context: ContextTypes.DEFAULT_TYPE, conf
         )
         return
 
-    for root_comment in thread_roots:
-        await send_comment_and_replies(chat_id, context, root_comment, conf_id, depth=0)
+    user_votes, profiles = await run_db(load_comment_page, flat_comments, update.effective_user.id)
+    comment_page = CommentPage(conf, update.effective_user.id, get_bot_username(context), flat_comments, user_votes, profiles)
+    try:
+        for root_comment in thread_roots:
+            await send_comment_and_replies(chat_id, context, root_comment, comment_page, depth=0)
+    finally:
+        # Whatever was sent is recorded, even if the page stopped half way
+        if comment_page.sent:
+            await run_write(write_comment_message_ids, comment_page.sent)
     
     pagination_text = f"**Displaying page {page}/{total_pages}. Total {total_count} Comments**"
     await context.bot.send_message(
         chat_id=chat_id,
         text=pagination_text,
         parse_mode="Markdown",
-        reply_markup=get_comment_pagination_keyboard(conf_id, page, total_pages, total_count)
+        reply_markup=get_comment_pagination_keyboard(conf_id, page, total_pages, total_count, thread_roots[-1])
     )
 # ------------------------------ ENHANCED KEYBOARDS ------------------------------
 
@@ -1464,19 +4118,21 @@ def get_deep_link_keyboard(conf_id: int, comment_count: int):
     ]
     return InlineKeyboardMarkup(keyboard)
 
-def get_channel_post_keyboard(conf_id: int) -> InlineKeyboardMarkup:
+def get_channel_post_keyboard(conf_id: int, bot_username: str = BOT_USERNAME) -> InlineKeyboardMarkup:
     comment_count = get_comment_count_for_confession(conf_id)
-    deep_link_url = f"https://t.me/{BOT_USERNAME}?start=comment_{conf_id}"
+    deep_link_url = deep_link(bot_username, f"comment_{conf_id}")
     button_text = f"💬 Add/View Comments ({comment_count})"
     keyboard = [[InlineKeyboardButton(button_text, url=deep_link_url)]]
     return InlineKeyboardMarkup(keyboard)
 
-def get_comment_pagination_keyboard(conf_id: int, current_page: int, total_pages: int, total_count: int):
+def get_comment_pagination_keyboard(conf_id: int, current_page: int, total_pages: int, total_count: int, last_comment: Optional[Comment] = None):
     keyboard = []
     
     nav_buttons = []
     if current_page < total_pages:
-        nav_buttons.append(InlineKeyboardButton("📥 Load More", callback_data=f"comment_page:{conf_id}:{current_page+1}"))
+        # Keyset cursor: (created_at, id) of the last root shown, well under Telegram's 64-byte callback limit
+        cursor = f":{last_comment['created_at']}:{last_comment['id']}" if last_comment else ""
+        nav_buttons.append(InlineKeyboardButton("📥 Load More", callback_data=f"comment_page:{conf_id}:{current_page+1}{cursor}"))
     
     nav_buttons.append(InlineKeyboardButton(f"Page {current_page}/{total_pages}", callback_data=f"comment_page_info:{conf_id}:{current_page}"))
     
@@ -1620,8 +4276,8 @@ Use the custom keyboard below to continue."""
 async def deep_link_profile(update: Update, context: ContextTypes.DEFAULT_TYPE, target_user_id: int):
     """Enhanced profile viewing with deep links"""
     user_id = update.effective_user.id
-    profile = get_user_profile(target_user_id)
-    follow_counts = get_follow_counts(target_user_id)
+    profile = await run_db(get_user_profile, target_user_id)
+    follow_counts = await run_db(get_follow_counts, target_user_id)
     
     if target_user_id == user_id:
         profile_text = (
@@ -1662,18 +4318,18 @@ async def deep_link_profile(update: Update, context: ContextTypes.DEFAULT_TYPE,
         
         await update.message.reply_text(
             profile_text,
-            reply_markup=get_user_profile_keyboard(target_user_id, user_id),
+            reply_markup=await run_db(get_user_profile_keyboard, target_user_id, user_id),
             parse_mode="Markdown"
         )
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Enhanced start command with backup status"""
     user_id = update.effective_user.id
-    profile = get_user_profile(user_id)
+    profile = await run_db(get_user_profile, user_id)
     
     # Enhanced startup with immediate backup trigger
     if not profile.get('start_used', False):
-        update_user_profile(user_id, start_used=True)
+        await run_db(update_user_profile, user_id, start_used=True)
         
         # Trigger initial backup for new users
         enhanced_backup_trigger()
@@ -1715,9 +4371,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if start_payload.startswith("comment_"):
             try:
                 conf_id = int(start_payload.split("_")[1])
-                conf = get_confession(conf_id)
+                conf = await run_db(get_confession, conf_id)
                 if conf and conf['status'] == 'approved':
-                    comment_count = get_comment_count_for_confession(conf_id)
+                    comment_count = await run_db(get_comment_count_for_confession, conf_id)
                     channel_text = format_confession_for_channel(conf)
                     await update.effective_chat.send_message("Loading confession...", reply_markup=ReplyKeyboardRemove())
                     await update.effective_chat.send_message(
@@ -1740,12 +4396,12 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif start_payload.startswith("reply_"):
             try:
                 comment_id = int(start_payload.split("_")[1])
-                comment = get_comment(comment_id)
+                comment = await run_db(get_comment, comment_id)
                 if comment:
                     conf_id = comment['conf_id']
-                    conf = get_confession(conf_id)
+                    conf = await run_db(get_confession, conf_id)
                     if conf and conf['status'] == 'approved':
-                        comment_count = get_comment_count_for_confession(conf_id)
+                        comment_count = await run_db(get_comment_count_for_confession, conf_id)
                         channel_text = format_confession_for_channel(conf)
                         await update.effective_chat.send_message(
                             channel_text,
@@ -1762,7 +4418,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif start_payload.startswith("chat_"):
             try:
                 target_user_id = int(start_payload.split("_")[1])
-                active_chat = get_active_chat(user_id, target_user_id)
+                active_chat = await run_db(get_active_chat, user_id, target_user_id)
                 if active_chat:
                     context.user_data['active_chat_with'] = target_user_id
                     context.user_data['active_chat_id'] = active_chat['id']
@@ -1784,7 +4440,7 @@ async def menu_callback_handler(update: Update, context: ContextTypes.DEFAULT_TY
     
     if data == CB_ACCEPT:
         user_id = update.effective_user.id
-        update_user_profile(user_id, terms_accepted=True, start_used=True)
+        await run_db(update_user_profile, user_id, terms_accepted=True, start_used=True)
         
         # Trigger backup after terms acceptance
         enhanced_backup_trigger()
@@ -1815,10 +4471,12 @@ async def comment_page_callback(update: Update, context: ContextTypes.DEFAULT_TY
             parts = data.split(":")
             conf_id = int(parts[1])
             page = int(parts[2])
+            # Buttons sent before keyset pagination carry no cursor and fall back to the page number
+            after = (int(parts[3]), int(parts[4])) if len(parts) >= 5 else None
             
             await query.delete_message()
             
-            await show_comments(update, context, conf_id, page)
+            await show_comments(update, context, conf_id, page, after)
             
         except (IndexError, ValueError) as e:
             logger.error(f"Error processing comment page: {e}")
@@ -1921,11 +4579,11 @@ async def comment_interaction_callback(update: Update, context: ContextTypes.DEF
         vote_type = parts[1]
         comment_id = int(parts[2])
         
-        success, action = process_vote(comment_id, user_id, vote_type)
+        success, action = await run_write(write_vote, comment_id, user_id, vote_type)
         
         if success:
-            counts = get_comment_vote_counts(comment_id)
-            user_vote = get_user_vote_on_comment(comment_id, user_id)
+            counts = await run_db(get_comment_vote_counts, comment_id)
+            user_vote = await run_db(get_user_vote_on_comment, comment_id, user_id)
             
             comment_dict = {'id': comment_id}
             new_keyboard = get_comment_interaction_keyboard(comment_dict, user_id, counts, user_vote)
@@ -1945,18 +4603,14 @@ async def comment_interaction_callback(update: Update, context: ContextTypes.DEF
             await query.message.reply_text("Invalid comment ID.")
             return ConversationHandler.END
         
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
-        cur.execute("SELECT conf_id, user_id FROM comments WHERE id = ?", (parent_comment_id,))
-        row = cur.fetchone()
-        conn.close()
+        parent_comment = await run_db(get_comment, parent_comment_id)
         
-        if not row:
+        if not parent_comment:
             await query.message.reply_text("Could not find the comment to reply to.")
             return ConversationHandler.END
         
-        conf_id = row[0]
-        parent_author_id = row[1]
+        conf_id = parent_comment['conf_id']
+        parent_author_id = parent_comment['user_id']
         
         context.user_data['current_conf_id'] = conf_id
         context.user_data['parent_comment_id'] = parent_comment_id
@@ -1972,12 +4626,12 @@ async def comment_interaction_callback(update: Update, context: ContextTypes.DEF
     
     elif data.startswith("follow_user:"):
         target_user_id = int(data.split(":")[1])
-        followed = toggle_follow(user_id, target_user_id)
+        followed = await run_write(write_follow_toggle, user_id, target_user_id)
         
         action_text = "followed" if followed else "unfollowed"
         await query.answer(f"You have {action_text} this user.", show_alert=True)
         
-        new_keyboard = get_user_profile_keyboard(target_user_id, user_id)
+        new_keyboard = await run_db(get_user_profile_keyboard, target_user_id, user_id)
         try:
             await query.edit_message_reply_markup(reply_markup=new_keyboard)
         except Exception:
@@ -2009,39 +4663,39 @@ async def comment_interaction_callback(update: Update, context: ContextTypes.DEF
     elif data.startswith("request_chat:"):
         target_user_id = int(data.split(":")[1])
         
-        active_chat = get_active_chat(user_id, target_user_id)
+        active_chat = await run_db(get_active_chat, user_id, target_user_id)
         if active_chat:
             context.user_data['active_chat_with'] = target_user_id
             context.user_data['active_chat_id'] = active_chat['id']
             await enter_chat_mode(update, context, target_user_id)
             return WAITING_FOR_CHAT_MESSAGE
         
-        chat_request = get_chat_request(user_id, target_user_id)
+        chat_request = await run_db(get_chat_request, user_id, target_user_id)
         if chat_request and chat_request['status'] == 'pending':
             await query.answer("✅ Chat request already sent.", show_alert=True)
             
-            new_keyboard = get_user_profile_keyboard(target_user_id, user_id)
+            new_keyboard = await run_db(get_user_profile_keyboard, target_user_id, user_id)
             try:
                 await query.edit_message_reply_markup(reply_markup=new_keyboard)
             except Exception:
                 pass
             return
         
-        existing_request = get_chat_request(target_user_id, user_id)
+        existing_request = await run_db(get_chat_request, target_user_id, user_id)
         if existing_request and existing_request['status'] == 'pending':
-            update_chat_request_status(existing_request['id'], 'accepted')
-            chat_id = create_active_chat(user_id, target_user_id)
+            await run_db(update_chat_request_status, existing_request['id'], 'accepted')
+            chat_id = await run_db(create_active_chat, user_id, target_user_id)
             
             await query.answer("✅ Chat request accepted automatically!", show_alert=True)
             
-            new_keyboard = get_user_profile_keyboard(target_user_id, user_id)
+            new_keyboard = await run_db(get_user_profile_keyboard, target_user_id, user_id)
             try:
                 await query.edit_message_reply_markup(reply_markup=new_keyboard)
             except Exception:
                 pass
             
             try:
-                user_profile = get_user_profile(user_id)
+                user_profile = await run_db(get_user_profile, user_id)
                 await context.bot.send_message(
                     chat_id=target_user_id,
                     text=f"💬 **Chat Request Accepted**\n\n"
@@ -2050,14 +4704,15 @@ async def comment_interaction_callback(update: Update, context: ContextTypes.DEF
                     parse_mode="Markdown"
                 )
                 
-                target_profile = get_user_profile(target_user_id)
-                new_keyboard_for_other = get_user_profile_keyboard(user_id, target_user_id)
+                target_profile = await run_db(get_user_profile, target_user_id)
+                new_keyboard_for_other = await run_db(get_user_profile_keyboard, user_id, target_user_id)
+                user_follow_counts = await run_db(get_follow_counts, user_id)
                 
                 await context.bot.send_message(
                     chat_id=target_user_id,
                     text=f"👤 **{user_profile['nickname'] or 'Anonymous'}'s Public Profile**\n\n"
                          f"⚡ Aura Points: {user_profile['aura_points']}\n"
-                         f"👥 Followers: {get_follow_counts(user_id)['followers']} | Following: {get_follow_counts(user_id)['following']}\n"
+                         f"👥 Followers: {user_follow_counts['followers']} | Following: {user_follow_counts['following']}\n"
                          f"Department: {user_profile['department'] or 'Not specified'}\n"
                          f"📝 Bio: {user_profile['bio']}",
                     reply_markup=new_keyboard_for_other,
@@ -2069,17 +4724,17 @@ async def comment_interaction_callback(update: Update, context: ContextTypes.DEF
             
             return
 
-        if create_chat_request(user_id, target_user_id):
+        if await run_db(create_chat_request, user_id, target_user_id):
             await query.answer("✅ Chat request sent!", show_alert=True)
             
-            new_keyboard = get_user_profile_keyboard(target_user_id, user_id)
+            new_keyboard = await run_db(get_user_profile_keyboard, target_user_id, user_id)
             try:
                 await query.edit_message_reply_markup(reply_markup=new_keyboard)
             except Exception:
                 pass
             
             try:
-                user_profile = get_user_profile(user_id)
+                user_profile = await run_db(get_user_profile, user_id)
                 await context.bot.send_message(
                     chat_id=target_user_id,
                     text=f"💬 **Chat Request**\n\n"
@@ -2095,7 +4750,7 @@ async def comment_interaction_callback(update: Update, context: ContextTypes.DEF
     elif data.startswith("start_chat:"):
         target_user_id = int(data.split(":")[1])
         
-        active_chat = get_active_chat(user_id, target_user_id)
+        active_chat = await run_db(get_active_chat, user_id, target_user_id)
         if not active_chat:
             await query.edit_message_text("Chat not found or no longer active.")
             return ConversationHandler.END
@@ -2130,7 +4785,7 @@ async def report_reason_callback(update: Update, context: ContextTypes.DEFAULT_T
             return ConversationHandler.END
         
         elif reason == "skip":
-            create_user_report(query.from_user.id, target_user_id)
+            await run_db(create_user_report, query.from_user.id, target_user_id)
             await query.edit_message_text("✅ User reported to the admin. Thank you.")
             
             await notify_admin_about_report(context, query.from_user.id, target_user_id)
@@ -2144,7 +4799,7 @@ async def report_reason_callback(update: Update, context: ContextTypes.DEFAULT_T
             return WAITING_FOR_CUSTOM_REPORT
         
         else:
-            create_user_report(query.from_user.id, target_user_id, reason=reason)
+            await run_db(create_user_report, query.from_user.id, target_user_id, reason=reason)
             await query.edit_message_text("✅ User reported to the admin. Thank you.")
             
             await notify_admin_about_report(context, query.from_user.id, target_user_id, reason)
@@ -2162,7 +4817,7 @@ async def custom_report_reason(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("Error: No user to report.")
         return ConversationHandler.END
     
-    create_user_report(update.effective_user.id, target_user_id, custom_reason=text)
+    await run_db(create_user_report, update.effective_user.id, target_user_id, custom_reason=text)
     await update.message.reply_text("✅ User reported to the admin. Thank you.")
     
     await notify_admin_about_report(context, update.effective_user.id, target_user_id, custom_reason=text)
@@ -2171,8 +4826,8 @@ async def custom_report_reason(update: Update, context: ContextTypes.DEFAULT_TYP
 
 async def notify_admin_about_report(context: ContextTypes.DEFAULT_TYPE, reporter_id: int, reported_user_id: int, reason: str = None, custom_reason: str = None):
     """Enhanced admin notification for reports"""
-    reporter_profile = get_user_profile(reporter_id)
-    reported_profile = get_user_profile(reported_user_id)
+    reporter_profile = await run_db(get_user_profile, reporter_id)
+    reported_profile = await run_db(get_user_profile, reported_user_id)
     
     report_text = (
         "🚨 **User Report**\n\n"
@@ -2206,13 +4861,13 @@ async def chat_request_response(update: Update, context: ContextTypes.DEFAULT_TY
         from_user_id = int(data.split(":")[1])
         to_user_id = query.from_user.id
         
-        chat_request = get_chat_request(from_user_id, to_user_id)
+        chat_request = await run_db(get_chat_request, from_user_id, to_user_id)
         if not chat_request:
             await query.edit_message_text("Chat request not found or already processed.")
             return
         
-        update_chat_request_status(chat_request['id'], 'accepted')
-        chat_id = create_active_chat(from_user_id, to_user_id)
+        await run_db(update_chat_request_status, chat_request['id'], 'accepted')
+        chat_id = await run_db(create_active_chat, from_user_id, to_user_id)
         
         await query.edit_message_text(
             "✅ Chat request accepted. You can now chat with this user.",
@@ -2220,8 +4875,8 @@ async def chat_request_response(update: Update, context: ContextTypes.DEFAULT_TY
         )
         
         try:
-            from_user_profile = get_user_profile(from_user_id)
-            to_user_profile = get_user_profile(to_user_id)
+            from_user_profile = await run_db(get_user_profile, from_user_id)
+            to_user_profile = await run_db(get_user_profile, to_user_id)
             
             await context.bot.send_message(
                 chat_id=from_user_id,
@@ -2230,26 +4885,28 @@ async def chat_request_response(update: Update, context: ContextTypes.DEFAULT_TY
                 parse_mode="Markdown"
             )
             
-            new_keyboard_for_requester = get_user_profile_keyboard(to_user_id, from_user_id)
+            new_keyboard_for_requester = await run_db(get_user_profile_keyboard, to_user_id, from_user_id)
+            to_user_follow_counts = await run_db(get_follow_counts, to_user_id)
             
             await context.bot.send_message(
                 chat_id=from_user_id,
                 text=f"👤 **{to_user_profile['nickname'] or 'Anonymous'}'s Public Profile**\n\n"
                      f"⚡ Aura Points: {to_user_profile['aura_points']}\n"
-                     f"👥 Followers: {get_follow_counts(to_user_id)['followers']} | Following: {get_follow_counts(to_user_id)['following']}\n"
+                     f"👥 Followers: {to_user_follow_counts['followers']} | Following: {to_user_follow_counts['following']}\n"
                      f"Department: {to_user_profile['department'] or 'Not specified'}\n"
                      f"📝 Bio: {to_user_profile['bio']}",
                 reply_markup=new_keyboard_for_requester,
                 parse_mode="Markdown"
             )
             
-            new_keyboard_for_acceptor = get_user_profile_keyboard(from_user_id, to_user_id)
+            new_keyboard_for_acceptor = await run_db(get_user_profile_keyboard, from_user_id, to_user_id)
+            from_user_follow_counts = await run_db(get_follow_counts, from_user_id)
             
             await context.bot.send_message(
                 chat_id=to_user_id,
                 text=f"👤 **{from_user_profile['nickname'] or 'Anonymous'}'s Public Profile**\n\n"
                      f"⚡ Aura Points: {from_user_profile['aura_points']}\n"
-                     f"👥 Followers: {get_follow_counts(from_user_id)['followers']} | Following: {get_follow_counts(from_user_id)['following']}\n"
+                     f"👥 Followers: {from_user_follow_counts['followers']} | Following: {from_user_follow_counts['following']}\n"
                      f"Department: {from_user_profile['department'] or 'Not specified'}\n"
                      f"📝 Bio: {from_user_profile['bio']}",
                 reply_markup=new_keyboard_for_acceptor,
@@ -2263,12 +4920,12 @@ async def chat_request_response(update: Update, context: ContextTypes.DEFAULT_TY
         from_user_id = int(data.split(":")[1])
         to_user_id = query.from_user.id
         
-        chat_request = get_chat_request(from_user_id, to_user_id)
+        chat_request = await run_db(get_chat_request, from_user_id, to_user_id)
         if not chat_request:
             await query.edit_message_text("Chat request not found or already processed.")
             return
         
-        update_chat_request_status(chat_request['id'], 'rejected')
+        await run_db(update_chat_request_status, chat_request['id'], 'rejected')
         
         await query.edit_message_text(
             "❌ Chat request declined.",
@@ -2287,15 +4944,15 @@ async def chat_request_response(update: Update, context: ContextTypes.DEFAULT_TY
 async def enter_chat_mode(update: Update, context: ContextTypes.DEFAULT_TYPE, target_user_id: int):
     """Enhanced chat mode entry"""
     user_id = update.effective_user.id
-    active_chat = get_active_chat(user_id, target_user_id)
+    active_chat = await run_db(get_active_chat, user_id, target_user_id)
     
     if not active_chat:
         await update.effective_message.reply_text("No active chat found.")
         return ConversationHandler.END
     
-    target_profile = get_user_profile(target_user_id)
+    target_profile = await run_db(get_user_profile, target_user_id)
     
-    chat_messages = get_chat_messages(active_chat['id'])
+    chat_messages = await run_db(get_chat_messages, active_chat['id'])
     
     history_text = f"**Chat History with {target_profile['nickname'] or 'Anonymous'}**\n\n"
     
@@ -2329,17 +4986,17 @@ async def chat_message_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         await update.message.reply_text("No active chat session.")
         return ConversationHandler.END
     
-    if is_blocked(target_user_id, user_id):
+    if await run_db(is_blocked, target_user_id, user_id):
         await update.message.reply_text("⚠️ Unable to send message. The chat has been ended.")
         return ConversationHandler.END
     
     message_text = update.message.text
     
     if message_text == "Block":
-        block_user(user_id, target_user_id)
-        end_chat(chat_id)
+        await run_db(block_user, user_id, target_user_id)
+        await run_db(end_chat, chat_id)
         
-        target_profile = get_user_profile(target_user_id)
+        target_profile = await run_db(get_user_profile, target_user_id)
         await update.message.reply_text(
             f"🚫 You have blocked {target_profile['nickname'] or 'Anonymous'}. They will no longer be able to send you messages through the bot. The chat has been ended.",
             reply_markup=MAIN_REPLY_KEYBOARD
@@ -2368,12 +5025,12 @@ async def chat_message_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return WAITING_FOR_REPORT_REASON
     
-    save_chat_message(chat_id, user_id, target_user_id, message_text)
+    await run_write(write_chat_message, chat_id, user_id, target_user_id, message_text, int(time.time()))
     
     await update.message.reply_text("✅ Message sent!")
     
     try:
-        user_profile = get_user_profile(user_id)
+        user_profile = await run_db(get_user_profile, user_id)
         
         await context.bot.send_message(
             chat_id=target_user_id,
@@ -2412,7 +5069,7 @@ async def leave_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = context.user_data.get('active_chat_id')
     
     if chat_id:
-        end_chat(chat_id)
+        await run_db(end_chat, chat_id)
     
     await update.message.reply_text(
         "You have left the chat.",
@@ -2452,13 +5109,13 @@ async def admin_message_receive(update: Update, context: ContextTypes.DEFAULT_TY
     """Enhanced admin message receiver"""
     message_text = update.message.text.strip()
     user_id = update.effective_user.id
-    user_profile = get_user_profile(user_id)
+    user_profile = await run_db(get_user_profile, user_id)
     
     if not message_text:
         await update.message.reply_text("Please send a valid message.")
         return WAITING_FOR_ADMIN_MESSAGE
     
-    save_admin_message(user_id, message_text)
+    await run_db(save_admin_message, user_id, message_text)
     
     try:
         await context.bot.send_message(
@@ -2497,7 +5154,7 @@ async def confess_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     user_id = update.effective_user.id
     
     # Rate Limiting Check with enhanced logging
-    last_ts = get_last_submission_ts(user_id)
+    last_ts = await run_db(get_last_submission_ts, user_id)
     time_since = int(time.time()) - last_ts
     if time_since < RATE_LIMIT_SECONDS:
         remaining_time = RATE_LIMIT_SECONDS - time_since
@@ -2510,7 +5167,7 @@ async def confess_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         return ConversationHandler.END
     
     # Check for existing draft with enhanced recovery
-    draft_conf = get_user_draft_confession(user_id)
+    draft_conf = await run_db(get_user_draft_confession, user_id)
     if draft_conf:
         conf_id = draft_conf['id']
         await update.effective_message.reply_text(
@@ -2520,7 +5177,7 @@ async def confess_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             parse_mode="Markdown"
         )
     else:
-        conf_id = save_confession(user_id, "", None, None)
+        conf_id = await run_db(save_confession, user_id, "", None, None)
     
     context.user_data['current_conf_id'] = conf_id
     
@@ -2614,7 +5271,7 @@ async def confession_receive(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return WAITING_FOR_CONFESSION
 
     # Update the draft confession in DB with enhanced logging
-    update_confession_content_and_media(conf_id, content, file_id, file_type)
+    await run_db(update_confession_content_and_media, conf_id, content, file_id, file_type)
     
     # Enhanced category selection with guidance
     context.user_data['selected_categories'] = [] 
@@ -2646,8 +5303,8 @@ async def category_selection_callback(update: Update, context: ContextTypes.DEFA
     if data == CB_CAT_DONE:
         if len(current_selection) >= 1:
             conf_id = context.user_data.get('current_conf_id')
-            update_confession_categories(conf_id, current_selection)
-            conf = get_confession(conf_id)
+            await run_db(update_confession_categories, conf_id, current_selection)
+            conf = await run_db(get_confession, conf_id)
 
             review_text = (
                 "*Review & Submit*\n\n"
@@ -2754,13 +5411,13 @@ async def confession_review_callback(update: Update, context: ContextTypes.DEFAU
         return ConversationHandler.END
 
     if action == "submit":
-        set_confession_status(conf_id, "pending")
-        update_last_submission_ts(user_id)
+        await run_db(set_confession_status, conf_id, "pending")
+        await run_write(write_last_submission_ts, user_id, int(time.time()))
         
         # Enhanced backup trigger with status
         enhanced_backup_trigger()
                 
-        conf = get_confession(conf_id)
+        conf = await run_db(get_confession, conf_id)
         admin_text = format_confession_for_admin(conf)
         admin_keyboard = InlineKeyboardMarkup([
             [InlineKeyboardButton("✅ Approve", callback_data=f"{CB_APPROVE_PATTERN}{conf_id}")],
@@ -2790,7 +5447,7 @@ async def confession_review_callback(update: Update, context: ContextTypes.DEFAU
                     reply_markup=admin_keyboard, parse_mode="HTML"
                 )
             
-            record_admin_message_id(conf_id, admin_msg.message_id)
+            await run_db(record_admin_message_id, conf_id, admin_msg.message_id)
 
             await query.edit_message_text(
     "🎉 **Success! Your confession has been submitted for review.**\n\n"
@@ -2842,7 +5499,7 @@ async def confession_review_callback(update: Update, context: ContextTypes.DEFAU
         return WAITING_FOR_CONFESSION
 
     elif action == "cancel":
-        set_confession_status(conf_id, "cancelled") 
+        await run_db(set_confession_status, conf_id, "cancelled") 
         
         await query.edit_message_text(
             "👋 *Confession Cancelled*\n\n"
@@ -2867,7 +5524,7 @@ async def confession_cancel_fallback(update: Update, context: ContextTypes.DEFAU
     context.user_data.pop('selected_categories', None)
     
     if conf_id:
-        set_confession_status(conf_id, "cancelled")
+        await run_db(set_confession_status, conf_id, "cancelled")
         
     msg = update.effective_message
     if msg:
@@ -2892,7 +5549,7 @@ async def admin_action_callback(update: Update, context: ContextTypes.DEFAULT_TY
         await query.answer("❌ Error processing request.", show_alert=True)
         return
 
-    conf = get_confession(conf_id)
+    conf = await run_db(get_confession, conf_id)
     if not conf or conf['status'] != 'pending':
         status_text = f"\n\n⚠️ *Already Processed (Confession {conf_id}).*"
         try:
@@ -2909,10 +5566,10 @@ async def admin_action_callback(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer(f"{action.capitalize()}ing Confession #{conf_id}...") 
 
     if action == "approve":
-        set_confession_status(conf_id, "approved")
+        await run_db(set_confession_status, conf_id, "approved")
         
         channel_text = format_confession_for_channel(conf)
-        channel_buttons = get_channel_post_keyboard(conf_id) 
+        channel_buttons = await run_db(get_channel_post_keyboard, conf_id, get_bot_username(context)) 
         
         try:
             if conf['file_id']:
@@ -2937,7 +5594,7 @@ async def admin_action_callback(update: Update, context: ContextTypes.DEFAULT_TY
                     reply_markup=channel_buttons, parse_mode="HTML"
                 )
             
-            record_channel_message_id(conf_id, channel_msg.message_id)
+            await run_db(record_channel_message_id, conf_id, channel_msg.message_id)
             
             final_status_text = f"✅ APPROVED (Confession {conf_id}) and POSTED to Channel."
             
@@ -2990,7 +5647,7 @@ async def admin_action_callback(update: Update, context: ContextTypes.DEFAULT_TY
                     pass
 
     elif action == "reject":
-        set_confession_status(conf_id, "rejected")
+        await run_db(set_confession_status, conf_id, "rejected")
         
         final_status_text = f"❌ REJECTED (Confession {conf_id})."
         
@@ -3106,7 +5763,7 @@ async def comment_receive(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
     
     # Enhanced validation - check if confession exists and is approved
-    conf = get_confession(conf_id)
+    conf = await run_db(get_confession, conf_id)
     if not conf:
         await msg.reply_text(
             "❌ *Confession Not Found*\n\n"
@@ -3123,7 +5780,7 @@ async def comment_receive(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ConversationHandler.END
     
-    comment_id = save_comment(conf_id, msg.from_user.id, text, parent_comment_id, file_id, file_type)
+    comment_id = await run_db(save_comment, conf_id, msg.from_user.id, text, parent_comment_id, file_id, file_type)
     
     # Enhanced channel update
     if conf and conf.get('channel_message_id'):
@@ -3131,7 +5788,7 @@ async def comment_receive(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await context.bot.edit_message_reply_markup(
                 chat_id=CHANNEL_ID,
                 message_id=conf['channel_message_id'],
-                reply_markup=get_channel_post_keyboard(conf_id)
+                reply_markup=await run_db(get_channel_post_keyboard, conf_id, get_bot_username(context))
             )
         except Exception as e:
             logger.warning(f"Could not update channel message keyboard: {e}")
@@ -3212,16 +5869,16 @@ async def reply_receive(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await msg.reply_text("Session expired. Please try again.")
         return ConversationHandler.END
     
-    comment_id = save_comment(conf_id, msg.from_user.id, text, parent_comment_id, file_id, file_type)
+    comment_id = await run_db(save_comment, conf_id, msg.from_user.id, text, parent_comment_id, file_id, file_type)
     
     # Enhanced channel update
-    conf = get_confession(conf_id)
+    conf = await run_db(get_confession, conf_id)
     if conf and conf.get('channel_message_id'):
         try:
             await context.bot.edit_message_reply_markup(
                 chat_id=CHANNEL_ID,
                 message_id=conf['channel_message_id'],
-                reply_markup=get_channel_post_keyboard(conf_id)
+                reply_markup=await run_db(get_channel_post_keyboard, conf_id, get_bot_username(context))
             )
         except Exception as e:
             logger.warning(f"Could not update channel message keyboard: {e}")
@@ -3229,7 +5886,7 @@ async def reply_receive(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Enhanced notification system
     if parent_author_id and parent_author_id != msg.from_user.id:
         try:
-            deep_link = f"https://t.me/{BOT_USERNAME}?start=reply_{comment_id}"
+            reply_link = deep_link(get_bot_username(context), f"reply_{comment_id}")
             
             await context.bot.send_message(
                 chat_id=parent_author_id,
@@ -3239,7 +5896,7 @@ async def reply_receive(update: Update, context: ContextTypes.DEFAULT_TYPE):
                      f"Click below to view the conversation:",
                 parse_mode="Markdown",
                 reply_markup=InlineKeyboardMarkup([
-                    [InlineKeyboardButton("📨 View Reply", url=deep_link)]
+                    [InlineKeyboardButton("📨 View Reply", url=reply_link)]
                 ])
             )
         except Exception as e:
@@ -3283,10 +5940,10 @@ async def comment_cancel_callback(update: Update, context: ContextTypes.DEFAULT_
 async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Enhanced profile command with comprehensive stats"""
     user_id = update.effective_user.id
-    profile = get_user_profile(user_id)
-    follow_counts = get_follow_counts(user_id)
-    confessions_count = get_user_confessions_count(user_id)
-    comments_count = get_user_comments_count(user_id)
+    profile = await run_db(get_user_profile, user_id)
+    follow_counts = await run_db(get_follow_counts, user_id)
+    confessions_count = await run_db(get_user_confessions_count, user_id)
+    comments_count = await run_db(get_user_comments_count, user_id)
     
     profile_text = (
         f"👤 ***Your Profile***\n\n"
@@ -3316,7 +5973,7 @@ async def profile_callback_handler(update: Update, context: ContextTypes.DEFAULT
     await query.answer()
     
     user_id = update.effective_user.id
-    profile = get_user_profile(user_id)
+    profile = await run_db(get_user_profile, user_id)
     
     if data == "profile_edit":
         profile_text = (
@@ -3336,9 +5993,9 @@ async def profile_callback_handler(update: Update, context: ContextTypes.DEFAULT
         )
         
     elif data == "profile_main":
-        follow_counts = get_follow_counts(user_id)
-        confessions_count = get_user_confessions_count(user_id)
-        comments_count = get_user_comments_count(user_id)
+        follow_counts = await run_db(get_follow_counts, user_id)
+        confessions_count = await run_db(get_user_confessions_count, user_id)
+        comments_count = await run_db(get_user_comments_count, user_id)
         
         profile_text = (
             f"👤 ***Your Profile***\n\n"
@@ -3399,7 +6056,7 @@ async def profile_callback_handler(update: Update, context: ContextTypes.DEFAULT
         return WAITING_FOR_DEPARTMENT_EDIT
         
     elif data == "profile_my_confessions":
-        confessions = get_user_confessions(user_id, limit=10)
+        confessions = await run_db(get_user_confessions, user_id, limit=10)
         
         if not confessions:
             text = (
@@ -3425,7 +6082,7 @@ async def profile_callback_handler(update: Update, context: ContextTypes.DEFAULT
         )
         
     elif data == "profile_my_comments":
-        comments = get_user_comments(user_id, limit=10)
+        comments = await run_db(get_user_comments, user_id, limit=10)
         
         if not comments:
             text = (
@@ -3451,7 +6108,7 @@ async def profile_callback_handler(update: Update, context: ContextTypes.DEFAULT
         )
         
     elif data == "profile_following":
-        following = get_following_users(user_id)
+        following = await run_db(get_following_users, user_id)
         
         if not following:
             text = (
@@ -3474,7 +6131,7 @@ async def profile_callback_handler(update: Update, context: ContextTypes.DEFAULT
         )
         
     elif data == "profile_followers":
-        followers = get_follower_users(user_id)
+        followers = await run_db(get_follower_users, user_id)
         
         if not followers:
             text = (
@@ -3499,7 +6156,7 @@ async def profile_callback_handler(update: Update, context: ContextTypes.DEFAULT
         )
         
     elif data == "profile_my_chats":
-        active_chats = get_active_chats_for_user(user_id)
+        active_chats = await run_db(get_active_chats_for_user, user_id)
         
         if not active_chats:
             text = (
@@ -3556,7 +6213,7 @@ async def profile_bio_edit(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         )
         return WAITING_FOR_BIO_EDIT
     
-    update_user_profile(update.effective_user.id, bio=text)
+    await run_db(update_user_profile, update.effective_user.id, bio=text)
     
     await update.message.reply_text(
         "✅ *Bio Updated Successfully!*\n\n"
@@ -3589,7 +6246,7 @@ async def profile_nickname_edit(update: Update, context: ContextTypes.DEFAULT_TY
         )
         return WAITING_FOR_NICKNAME_EDIT
     
-    update_user_profile(update.effective_user.id, nickname=text)
+    await run_db(update_user_profile, update.effective_user.id, nickname=text)
     
     await update.message.reply_text(
         "✅ *Nickname Updated Successfully!*\n\n"
@@ -3604,7 +6261,7 @@ async def profile_department_edit(update: Update, context: ContextTypes.DEFAULT_
     """Enhanced department editing"""
     text = update.message.text.strip()
     
-    update_user_profile(update.effective_user.id, department=text)
+    await run_db(update_user_profile, update.effective_user.id, department=text)
     
     await update.message.reply_text(
         "✅ *Department Updated Successfully!*\n\n"
@@ -3747,18 +6404,7 @@ async def pending_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ This command is for administrators only.")
         return
     
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM confessions WHERE status = 'pending'")
-    pending_count = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM user_reports")
-    report_count = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM chat_requests WHERE status = 'pending'")
-    chat_requests_count = cur.fetchone()[0]
-    
-    conn.close()
+    pending_count, report_count, chat_requests_count = await run_db(get_admin_dashboard_counts)
     
     status_text = (
         "📊 ***Administrative Dashboard***\n\n"
@@ -3774,6 +6420,39 @@ async def pending_count(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     await update.message.reply_text(status_text, parse_mode="Markdown")
 
+async def repair_counters_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Recompute the cached vote, comment and follow counters (admin only)"""
+    user_id = update.effective_user.id
+
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ This command is for administrators only.")
+        return
+
+    drifted = await run_db(repair_counters)
+
+    lines = [f"• **{name}:** {count}" for name, count in drifted.items()]
+    await update.message.reply_text(
+        "🔧 ***Counter Repair Complete***\n\n"
+        "Rows corrected per counter:\n" + "\n".join(lines),
+        parse_mode="Markdown"
+    )
+
+async def recompute_aura_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Rebuild every aura score from scratch (admin only)"""
+    user_id = update.effective_user.id
+
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ This command is for administrators only.")
+        return
+
+    changed = await run_db(recompute_aura)
+
+    await update.message.reply_text(
+        "✨ ***Aura Recompute Complete***\n\n"
+        f"• **Profiles corrected:** {changed}",
+        parse_mode="Markdown"
+    )
+
 async def unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Enhanced unknown command handler"""
     if update.effective_message.text.startswith('/'):
@@ -3791,18 +6470,44 @@ async def unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
 
 async def force_github_restore(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Enhanced force GitHub restoration for admins"""
+    """Enhanced force GitHub restoration for admins.
+
+    /github_restore restores the latest backup, /github_restore list shows
+    the retained versions and /github_restore <number|id> restores one of them.
+    """
     user_id = update.effective_user.id
     
     if user_id != ADMIN_USER_ID:
         await update.message.reply_text("❌ This command is for admin only.")
         return
+    
+    version = context.args[0] if context.args else None
+    if version == "list":
+        try:
+            versions = await run_db(list_backup_versions)
+        except Exception as e:
+            await update.message.reply_text(f"❌ Could not read the backup index: {e}")
+            return
+        if not versions:
+            await update.message.reply_text("📭 No backup versions retained yet.")
+            return
+        lines = [
+            f"{number}. `{v['id']}` - {datetime.fromtimestamp(v['created_at']).strftime('%Y-%m-%d %H:%M')} "
+            f"({v['size'] / 1024 / 1024:.2f} MB)"
+            for number, v in enumerate(versions, 1)
+        ]
+        await update.message.reply_text(
+            "🕰️ ***Retained Backup Versions***\n\n" + "\n".join(lines) +
+            "\n\nRestore one with /github_restore <number or id>",
+            parse_mode="Markdown"
+        )
+        return
         
     await update.message.reply_text(
         "🔄 ***Forcing Database Restoration***\n\n"
         "Initiating emergency restoration from GitHub backup...\n\n"
         "***This will:***\n"
-        "• Download latest backup from GitHub\n"
+        f"• Download {'version ' + version if version else 'latest backup'} from GitHub\n"
         "• Replace current database\n"
         "• Restore all user data\n"
         "• Preserve current session\n\n"
@@ -3811,7 +6516,7 @@ async def force_github_restore(update: Update, context: ContextTypes.DEFAULT_TYP
     )
     
     def restore_thread():
-        success = restore_database_from_github()
+        success = restore_database_from_github(version)
         if success:
             context.application.create_task(
                 update.message.reply_text(
@@ -3845,7 +6550,7 @@ async def force_github_restore(update: Update, context: ContextTypes.DEFAULT_TYP
     thread.start()
 
 async def test_github_backup(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Enhanced GitHub backup test for admins"""
+    """Run a backup through the worker now and report its actual outcome (admins only)"""
     user_id = update.effective_user.id
     
     if user_id != ADMIN_USER_ID:
@@ -3853,13 +6558,10 @@ async def test_github_backup(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return
         
     await update.message.reply_text(
-        "🔄 ***Testing GitHub Backup System***\n\n"
-        "Performing comprehensive backup system test...\n\n"
+        "🔄 ***Testing Backup System***\n\n"
         "***Testing:***\n"
         "• Database file existence and size\n"
-        "• GitHub API connectivity\n"
-        "• File encoding and upload\n"
-        "• Backup verification\n\n"
+        f"• A backup upload to {backup_backend.describe()}\n\n"
         "Please wait...",
         parse_mode="Markdown"
     )
@@ -3873,27 +6575,35 @@ async def test_github_backup(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.message.reply_text("❌ Database file is empty!")
         return
         
-    # Test backup
-    if trigger_immediate_backup():
+    # Wait for a real upload through the worker, so the report is its actual outcome
+    result = await asyncio.to_thread(backup_worker.run_now, BACKUP_TEST_TIMEOUT_SECONDS)
+    last_run = backup_metrics.stats()['last_run'] or {}
+    if result is None:
+        await update.message.reply_text(
+            "⏳ ***Backup Queued***\n\n"
+            f"The upload to {backup_backend.describe()} has not finished after {BACKUP_TEST_TIMEOUT_SECONDS}s.\n"
+            "Check /backup_status for its outcome.",
+            parse_mode="Markdown"
+        )
+    elif result:
         await update.message.reply_text(
-            "✅ ***GitHub Backup Test Successful!***\n\n"
+            "✅ ***Backup Test Successful!***\n\n"
             "***Test Results:***\n"
             f"• **Database Size:** {db_size} bytes\n"
-            f"• **GitHub API:** ✅ Connected\n"
-            f"• **File Upload:** ✅ Successful\n"
-            f"• **Backup Verification:** ✅ Passed\n\n"
-            "The backup system is working correctly.",
+            f"• **Backend:** {backup_backend.describe()}\n"
+            f"• **Outcome:** {last_run.get('outcome', 'uploaded')} ({last_run.get('kind') or 'no upload needed'})\n"
+            f"• **Bytes Sent:** {last_run.get('bytes_sent', 0)}\n"
+            f"• **Duration:** {last_run.get('duration', 0):.1f}s",
             parse_mode="Markdown"
         )
     else:
+        error = backup_metrics.stats()['last_error'] or "another backup or a restore was running"
         await update.message.reply_text(
-            "❌ ***GitHub Backup Test Failed!***\n\n"
-            "***Possible Issues:***\n"
+            "❌ ***Backup Test Failed!***\n\n"
             f"• **Database Size:** {db_size} bytes\n"
-            "• **GitHub API:** ❌ Connection failed\n"
-            "• **File Upload:** ❌ Failed\n"
-            "• **Authentication:** ❌ Invalid token\n\n"
-            "Check environment variables and GitHub credentials.",
+            f"• **Backend:** {backup_backend.describe()}\n"
+            f"• **Error:** {escape_markdown(str(error))}\n\n"
+            "Check the backend credentials and /backup_status.",
             parse_mode="Markdown"
         )
 
@@ -3903,25 +6613,12 @@ async def system_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     is_admin = user_id == ADMIN_USER_ID
     
     # Get basic statistics
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
-    cur.execute("SELECT COUNT(*) FROM users")
-    user_count = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM confessions WHERE status = 'approved'")
-    approved_count = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM confessions WHERE status = 'pending'")
-    pending_count = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM comments")
-    comment_count = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM active_chats")
-    active_chats_count = cur.fetchone()[0]
-    
-    conn.close()
+    stats = await run_db(get_system_stats)
+    user_count = stats['users']
+    approved_count = stats['approved']
+    pending_count = stats['pending']
+    comment_count = stats['comments']
+    active_chats_count = stats['active_chats']
     
     # Calculate database size
     db_size = os.path.getsize(DB_PATH) if os.path.exists(DB_PATH) else 0
@@ -3943,12 +6640,17 @@ async def system_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if is_admin:
         # Add admin-only details
+        cache_stats = profile_cache.stats()
+        send_stats = send_scheduler.stats()
         admin_text = (
             "\n***Admin Details:***\n"
             f"• **GitHub Connected:** {bool(GITHUB_ACCESS_TOKEN)}\n"
-            f"• **Last Backup:** {context.bot_data.get('last_backup', 'Never')}\n"
-            f"• **Backup Queue:** {0}\n"
+            f"• **Last Backup:** {format_duration(backup_metrics.stats()['seconds_since_success'])} ago\n"
+            f"• **Send Queue:** {send_stats['queued']} queued, {send_stats['in_flight']} in flight, "
+            f"p95 wait {send_stats['wait_p95']:.1f}s, {send_stats['retries']} flood retries\n"
             f"• **Memory Usage:** {os.path.getsize(DB_PATH) / 1024 / 1024:.2f} MB\n"
+            f"• **Profile Cache:** {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.0%}), {cache_stats['size']} entries\n"
         )
         status_text += admin_text
         
@@ -3980,10 +6682,22 @@ async def backup_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     github_connected = bool(GITHUB_ACCESS_TOKEN and GITHUB_REPO_OWNER and GITHUB_REPO_NAME)
     db_exists = os.path.exists(DB_PATH)
     db_size = os.path.getsize(DB_PATH) if db_exists else 0
+    telemetry = backup_telemetry()
+    last_run = telemetry['last_run']
+    if last_run:
+        phases = ", ".join(f"{phase} {last_run['phases'][phase]:.2f}s" for phase in BackupMetrics.PHASES
+                           if phase in last_run['phases'])
+        last_run_text = (f"{last_run['outcome']}{' ' + last_run['kind'] if last_run['kind'] else ''} in "
+                         f"{last_run['duration']:.2f}s, {last_run['bytes_sent'] / 1024:.1f} KB sent"
+                         f"{' (' + phases + ')' if phases else ''}")
+    else:
+        last_run_text = "None yet"
+    log_lag = telemetry['log_lag_seconds']
     
     status_text = (
         "🔄 ***Backup System Status***\n\n"
         "***Configuration:***\n"
+        f"• **Backend:** {backup_backend.describe()} {'✅' if backup_backend.is_configured() else '❌ Not configured'}\n"
         f"• **GitHub Access:** {'✅ Connected' if github_connected else '❌ Disconnected'}\n"
         f"• **Repository:** {GITHUB_REPO_OWNER}/{GITHUB_REPO_NAME if github_connected else 'Not set'}\n"
         f"• **Backup Path:** {GITHUB_BACKUP_PATH if github_connected else 'Not set'}\n"
@@ -3993,11 +6707,25 @@ async def backup_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"• **File Size:** {db_size / 1024 / 1024:.2f} MB\n"
         f"• **Last Modified:** {datetime.fromtimestamp(os.path.getmtime(DB_PATH)).strftime('%Y-%m-%d %H:%M:%S') if db_exists else 'N/A'}\n\n"
         "***System:***\n"
-        f"• **Backup Thread:** {'✅ Running' if any(t.name == 'backup_thread' for t in threading.enumerate()) else '❌ Stopped'}\n"
-        f"• **Backup In Progress:** {'✅ Yes' if backup_in_progress else '❌ No'}\n"
-        f"• **Successful Backups:** {context.bot_data.get('successful_backups', 0)}\n"
-        f"• **Failed Backups:** {context.bot_data.get('failed_backups', 0)}\n"
+        f"• **Startup:** {'✅ Ready' if startup.ready.is_set() else '⏳ Degraded'} ({startup.phase})\n"
+        f"• **Backup Thread:** {'✅ Running' if telemetry['worker_alive'] else '❌ Stopped'}\n"
+        f"• **Change Log Thread:** {'✅ Running' if telemetry['shipper_alive'] else '❌ Stopped'}\n"
+        f"• **Backup In Progress:** {'✅ Yes' if telemetry['in_progress'] else '❌ No'}\n"
+        f"• **Pending Changes:** {'✅ Yes' if telemetry['dirty'] else '❌ No'}\n"
+        f"• **Write Triggers:** {telemetry['triggers']} ({telemetry['coalesced_triggers']} coalesced)\n\n"
+        "***Backups:***\n"
+        f"• **Last Good Backup:** {format_duration(telemetry['seconds_since_success'])} ago\n"
+        f"• **Last Run:** {last_run_text}\n"
+        f"• **Successful Backups:** {telemetry['successes']} ({telemetry['unchanged']} unchanged skipped)\n"
+        f"• **Failed Backups:** {telemetry['failures']} ({telemetry['recent_failures']} in the last "
+        f"{BACKUP_FAILURE_WINDOW_SECONDS // 60} min)\n"
+        f"• **Bytes Sent:** {telemetry['bytes_sent'] / 1024 / 1024:.2f} MB\n"
+        f"• **Change Log:** {telemetry['log_rows_shipped']} rows in {telemetry['log_segments']} segments shipped, "
+        f"{telemetry['log_pending_writes']} writes pending"
+        f"{f' (oldest {format_duration(log_lag)})' if log_lag else ''}\n"
     )
+    if telemetry['last_error'] and telemetry['failures']:
+        status_text += f"• **Last Error:** {escape_markdown(telemetry['last_error'][:200])}\n"
     
     keyboard = [
         [InlineKeyboardButton("🔄 Test Backup Now", callback_data="test_backup"),
@@ -4032,11 +6760,7 @@ async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message_text = ' '.join(context.args)
     
     # Get all users
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT user_id FROM users")
-    users = [row[0] for row in cur.fetchall()]
-    conn.close()
+    users = await run_db(get_all_user_ids)
     
     total_users = len(users)
     successful_sends = 0
@@ -4050,21 +6774,24 @@ async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
     
-    # Send to all users
-    for user_id in users:
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"📢 ***Announcement***\n\n{message_text}",
-                parse_mode="Markdown"
-            )
-            successful_sends += 1
-        except Exception as e:
-            failed_sends += 1
-            logger.warning(f"Failed to send broadcast to user {user_id}: {e}")
-        
-        # Small delay to avoid rate limiting
-        await asyncio.sleep(0.1)
+    # A few workers share one iterator over the recipients; send_scheduler paces them
+    recipients = iter(users)
+
+    async def send_worker():
+        nonlocal successful_sends, failed_sends
+        for recipient_id in recipients:
+            try:
+                await context.bot.send_message(
+                    chat_id=recipient_id,
+                    text=f"📢 ***Announcement***\n\n{message_text}",
+                    parse_mode="Markdown"
+                )
+                successful_sends += 1
+            except Exception as e:
+                failed_sends += 1
+                logger.warning(f"Failed to send broadcast to user {recipient_id}: {e}")
+
+    await asyncio.gather(*(send_worker() for _ in range(BROADCAST_CONCURRENCY)))
     
     await update.message.reply_text(
         f"📢 ***Broadcast Complete***\n\n"
@@ -4072,7 +6799,7 @@ async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"• ✅ Successful: {successful_sends}\n"
         f"• ❌ Failed: {failed_sends}\n"
         f"• 📊 Total: {total_users}\n\n"
-        f"**Success Rate:** {successful_sends/total_users*100:.1f}%",
+        f"**Success Rate:** {successful_sends/max(total_users, 1)*100:.1f}%",
         parse_mode="Markdown"
     )
 
@@ -4103,21 +6830,7 @@ async def export_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
     
     # Get statistics
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    
-    tables = [
-        "users", "confessions", "comments", "comment_votes", 
-        "follows", "user_profiles", "chat_requests", "active_chats",
-        "chat_messages", "blocked_users", "user_reports", "admin_messages"
-    ]
-    
-    for table in tables:
-        cur.execute(f"SELECT COUNT(*) FROM {table}")
-        count = cur.fetchone()[0]
-        export_data["statistics"][table] = count
-    
-    conn.close()
+    export_data["statistics"] = await run_db(get_table_row_counts, EXPORT_TABLES)
     
     # Create export file
     export_filename = f"bot_export_{int(time.time())}.json"
@@ -4143,26 +6856,41 @@ async def periodic_backup_monitor():
         try:
             await asyncio.sleep(60)  # Check every minute
             
-            # Check if backup thread is running
-            backup_threads = [t for t in threading.enumerate() if t.name == 'backup_thread']
-            if not backup_threads:
-                logger.warning("🔴 Backup thread not running, restarting...")
-                schedule_backups()
+            # Check if the backup worker and change log shipper are running (they start once the database is ready)
+            if not startup.ready.is_set():
+                continue
+            if not backup_worker.is_alive:
+                logger.warning("🔴 Backup worker not running, restarting...")
+                backup_worker.start()
+            if not change_log_shipper.is_alive:
+                logger.warning("🔴 Change log shipper not running, restarting...")
+                change_log_shipper.start()
+            
+            stats = backup_metrics.stats()
+            if stats['recent_failures']:
+                logger.warning(f"🟠 {stats['recent_failures']} backup failure(s) in the last "
+                               f"{BACKUP_FAILURE_WINDOW_SECONDS // 60} min, last error: {stats['last_error']}")
+            if stats['seconds_since_success'] is not None and stats['seconds_since_success'] > 3 * BACKUP_MAX_STALENESS_SECONDS:
+                logger.warning(f"🟠 Last good backup was {format_duration(stats['seconds_since_success'])} ago")
                 
         except Exception as e:
             logger.error(f"Backup monitor error: {e}")
 
-def initialize_backup_system():
-    """Enhanced backup system initialization"""
+def initialize_backup_system() -> bool:
+    """Enhanced backup system initialization.
+
+    Only checks the local database; nothing is downloaded or uploaded here.
+    Returns True when the local database is usable, otherwise starts the
+    restore in the background and returns False (the bot runs degraded
+    until it finishes).
+    """
     print("🚀 Initializing Enhanced Backup System...")
     
-    # Perform startup restoration
-    backup_on_startup()
-    
-    # Schedule regular backups
-    schedule_backups()
-    
-    # Start backup monitor
+    local_ok = check_local_database()
+    startup.mark("local database check")
+    if not local_ok:
+        print(f"🔄 Database needs restoration from {backup_backend.describe()}, starting degraded while it runs")
+        threading.Thread(target=restore_on_startup, name="startup_restore", daemon=True).start()
     
     print("✅ Enhanced Backup System Initialized Successfully!")
     print(f"🔧 Features Enabled:")
@@ -4171,6 +6899,31 @@ def initialize_backup_system():
     print(f"   • Backup monitoring and recovery")
     print(f"   • Enhanced error handling")
     print(f"   • Non-blocking backup operations")
+    return local_ok
+
+async def degraded_mode_gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs before every handler: logs the first update and holds updates back while a startup restore runs"""
+    startup.note_update()
+    if startup.ready.is_set():
+        return
+    is_admin = bool(update.effective_user and update.effective_user.id == ADMIN_USER_ID)
+    text = update.message.text if update.message and update.message.text else ""
+    command = text.split()[0][1:].split('@')[0] if text.startswith('/') else None
+    if is_admin and command in STARTUP_ADMIN_COMMANDS:
+        return
+    if is_admin and startup.failure is not None:
+        notice = (f"❌ Startup restore failed and will not be retried: {startup.failure}. "
+                  f"Fix the backup settings and restart the bot.")
+    elif is_admin:
+        notice = (f"⏳ Startup restore still running ({startup.phase}). Until it finishes only "
+                  f"{', '.join('/' + name for name in sorted(STARTUP_ADMIN_COMMANDS))} is available.")
+    else:
+        notice = "⏳ The bot is restoring its data after a restart. Please try again in a minute."
+    if update.callback_query:
+        await update.callback_query.answer(notice, show_alert=True)
+    elif update.effective_message and update.effective_chat and (is_admin or update.effective_chat.type == "private"):
+        await update.effective_message.reply_text(notice)
+    raise ApplicationHandlerStop
 # ------------------------------ ERROR HANDLER ------------------------------
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -4232,29 +6985,43 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
 
 def main():
     """Enhanced main application with comprehensive backup integration"""
-    # Initialize enhanced backup system
-    initialize_backup_system()
-    
-    # Initialize database
-    if not init_db():
-        logger.error("❌ Failed to initialize database!")
-        return
-    
     if not BOT_TOKEN:
         logger.error("❌ BOT_TOKEN is missing.")
         return
+    
+    # Initialize enhanced backup system; a needed restore runs in the background
+    if initialize_backup_system():
+        # Initialize database
+        if not finish_startup():
+            logger.error("❌ Failed to initialize database!")
+            return
         
     # Add post_init to start backup monitor after app is running
     async def post_init(application):
+        # Fetch the bot's identity once; deep links read it from bot_data instead of calling getMe
+        me = await application.bot.get_me()
+        application.bot_data['bot_id'] = me.id
+        application.bot_data['bot_username'] = me.username
+        if me.username != BOT_USERNAME:
+            logger.warning(f"⚠️ BOT_USERNAME is {BOT_USERNAME} but the token belongs to @{me.username}; using @{me.username}")
+        
         # Start backup monitor when application is running
         asyncio.create_task(periodic_backup_monitor())
+        await startup.attach(application.bot)
+        startup.mark("polling started")
         
-    application = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
+    # Different users' updates run concurrently, so a handler awaiting a slow query does not hold up the rest;
+    # one user's updates stay sequential, as the ConversationHandlers require
+    # Every outgoing request goes through send_scheduler, which applies Telegram's flood limits
+    application = (Application.builder().token(BOT_TOKEN).post_init(post_init)
+                   .concurrent_updates(PerUserUpdateProcessor()).rate_limiter(send_scheduler).build())
+    startup.mark("application built")
     
     # Store startup time for status monitoring
     application.bot_data['start_time'] = time.time()
-    application.bot_data['successful_backups'] = 0
-    application.bot_data['failed_backups'] = 0
+    
+    # Runs first for every update: startup timing and the degraded-mode gate
+    application.add_handler(TypeHandler(Update, degraded_mode_gate), group=-1)
 
     # Enhanced Confession Conversation Handler
     confession_conv_handler = ConversationHandler(
@@ -4440,6 +7207,8 @@ def main():
     application.add_handler(CommandHandler("backup_status", backup_status))
     application.add_handler(CommandHandler("broadcast", broadcast_message))
     application.add_handler(CommandHandler("export", export_data))
+    application.add_handler(CommandHandler("repair_counters", repair_counters_command))
+    application.add_handler(CommandHandler("recompute_aura", recompute_aura_command))
     
     # Enhanced Fallback Handler
     application.add_handler(MessageHandler(filters.COMMAND, unknown))
@@ -4463,9 +7232,15 @@ def main():
         )
     except Exception as e:
         logger.error(f"❌ Bot crashed: {e}")
-        # Attempt final backup before crashing
-        print("🔄 Attempting emergency backup before shutdown...")
-        backup_database()
+        # Attempt final backup before crashing (not while a startup restore is still pending)
+        if startup.ready.is_set():
+            print("🔄 Attempting emergency backup before shutdown...")
+            backup_database()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--recover-to":
+        # python bot.py --recover-to "YYYY-MM-DD HH:MM:SS" [output.db]
+        target = datetime.strptime(sys.argv[2], "%Y-%m-%d %H:%M:%S").timestamp()
+        output = sys.argv[3] if len(sys.argv) > 3 else f"{DB_PATH}.recovered"
+        sys.exit(0 if recover_database_to(target, output) else 1)
     main()
@@ -1,17 +1,40 @@
 # keep_alive.py
-from flask import Flask
+import hmac
+import os
+from flask import Flask, Response, request
 from threading import Thread
 
 app = Flask('')
+_metrics = []  # callables returning Prometheus text, joined by /metrics
+# With METRICS_TOKEN set, /metrics needs "Authorization: Bearer <token>"; without it, only local scrapes are served
+_metrics_token = os.getenv('METRICS_TOKEN')
 
 @app.route('/')
 def home():
     return "Bot is running!"
 
+def _metrics_allowed() -> bool:
+    if _metrics_token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {_metrics_token}")
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/metrics')
+def metrics():
+    if not _metrics:
+        return Response("metrics not available\n", status=404, mimetype='text/plain')
+    if not _metrics_allowed():
+        return Response("forbidden\n", status=403, mimetype='text/plain')
+    return Response("".join(provider() for provider in _metrics), mimetype='text/plain; version=0.0.4')
+
+def register_metrics(provider):
+    _metrics.append(provider)
+
 def run():
     app.run(host='0.0.0.0', port=8080)
 
-def keep_alive():
+def keep_alive(metrics=None):
+    if metrics is not None:
+        register_metrics(metrics)
     t = Thread(target=run)
     t.daemon = True
     t.start()
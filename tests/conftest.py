@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bot  # noqa: E402
+
+
+def enable_change_log():
+    """init_db ran before the test picked a backend, so the change log is still off"""
+    with bot.db_transaction() as cur:
+        assert bot.sync_change_log(cur)
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A fresh, migrated confessions.db in a temporary directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(bot, 'enhanced_backup_trigger', lambda: None)
+    bot.close_db_connections()
+    bot.profile_cache.clear()
+    assert bot.init_db()
+    yield tmp_path
+    bot.close_db_connections()
+    bot.profile_cache.clear()
+
+
+@pytest.fixture
+def backup_state(monkeypatch):
+    """Forget what this process knows about earlier backups"""
+    monkeypatch.setattr(bot, '_last_backup_digest', None)
+    monkeypatch.setattr(bot, '_backup_page_state', None)
+    monkeypatch.setattr(bot, '_backup_index', None)
+    monkeypatch.setattr(bot, '_version_manifests', {})
+
+
+@pytest.fixture
+def github(db, backup_state, monkeypatch):
+    """bot.backup_backend is a GitHubBackend talking to a local FakeGitHub"""
+    from fake_github import FakeGitHub
+
+    gh = FakeGitHub().start()
+    monkeypatch.setattr(bot, 'GITHUB_API_URL', gh.url)
+    monkeypatch.setattr(bot, 'GITHUB_ACCESS_TOKEN', 'token')
+    monkeypatch.setattr(bot, 'GITHUB_REPO_OWNER', 'owner')
+    monkeypatch.setattr(bot, 'GITHUB_REPO_NAME', 'repo')
+    monkeypatch.setattr(bot, 'backup_backend', bot.GitHubBackend(bot.GitHubTransport(backoff=0.01)))
+    enable_change_log()
+    yield gh
+    gh.stop()
+
+
+@pytest.fixture
+def local_store(db, backup_state, monkeypatch):
+    """bot.backup_backend is a LocalBackend in the test directory"""
+    backend = bot.LocalBackend(str(db / 'store'))
+    monkeypatch.setattr(bot, 'backup_backend', backend)
+    enable_change_log()
+    return backend
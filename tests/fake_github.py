@@ -0,0 +1,181 @@
+"""A local fake of the GitHub REST endpoints the backup backend uses.
+
+It covers contents (JSON and raw), blobs, trees, commits and the branch ref,
+with fast-forward checking on ref updates. Everything is kept in memory on a
+FakeGitHub instance. Tests can seed files into the head tree with seed(),
+and queue failures with fail (an HTTP status, or "hang" for a slow 503). With keep_blobs=False
+uploaded blob contents are dropped, so the fake adds nothing to the memory
+use of the process under test.
+"""
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def blob_sha(data: bytes) -> str:
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class FakeGitHub:
+    def __init__(self, keep_blobs: bool = True):
+        self.keep_blobs = keep_blobs
+        self.blobs = {}
+        self.trees = {'t0': {}}
+        self.commits = {'c0': {'tree': 't0', 'parents': []}}
+        self.ref = 'c0'
+        self.requests = []
+        self.max_body = 0
+        self.fail = []
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _make_handler(self))
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def head_tree(self) -> dict:
+        return dict(self.trees[self.commits[self.ref]['tree']])
+
+    def file(self, path: str) -> bytes:
+        return self.blobs[self.head_tree()[path]]
+
+    def seed(self, path: str, data: bytes):
+        """Commit a file straight into the head tree, as another client would"""
+        sha = blob_sha(data)
+        self.blobs[sha] = data
+        tree = self.head_tree()
+        tree[path] = sha
+        tree_sha = 'seed-tree-' + sha
+        self.trees[tree_sha] = tree
+        commit_sha = 'seed-commit-' + sha
+        self.commits[commit_sha] = {'tree': tree_sha, 'parents': [self.ref]}
+        self.ref = commit_sha
+
+    def count(self, method: str, path: str) -> int:
+        return self.requests.count((method, path))
+
+
+def _make_handler(gh: FakeGitHub):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _body(self):
+            length = int(self.headers.get('Content-Length', 0))
+            gh.max_body = max(gh.max_body, length)
+            return json.loads(self.rfile.read(length))
+
+        def _path(self):
+            return re.sub(r'^/repos/[^/]+/[^/]+/', '', self.path.split('?')[0])
+
+        def _injected_failure(self):
+            if not gh.fail:
+                return False
+            status = gh.fail.pop(0)
+            if status == 'hang':
+                time.sleep(3)
+                status = 503
+            self._send(status, {'message': 'injected'})
+            return True
+
+        def do_GET(self):
+            path = self._path()
+            gh.requests.append(('GET', path))
+            if self._injected_failure():
+                return
+            if path.startswith('contents/'):
+                tree = gh.head_tree()
+                name = path[len('contents/'):]
+                if name not in tree:
+                    return self._send(404, {'message': 'Not Found'})
+                data = gh.blobs[tree[name]]
+                if self.headers.get('Accept') == 'application/vnd.github.raw':
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/octet-stream')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                return self._send(200, {'sha': tree[name], 'content': base64.b64encode(data).decode()})
+            if path.startswith('git/blobs/'):
+                sha = path.rsplit('/', 1)[1]
+                if sha not in gh.blobs:
+                    return self._send(404, {'message': 'Not Found'})
+                return self._send(200, {'sha': sha, 'encoding': 'base64',
+                                        'content': base64.b64encode(gh.blobs[sha]).decode()})
+            if path.startswith('git/trees/'):
+                return self._send(200, {'tree': [{'path': name, 'type': 'blob', 'sha': sha}
+                                                 for name, sha in gh.head_tree().items()]})
+            if path.startswith('git/ref/heads/'):
+                return self._send(200, {'object': {'sha': gh.ref}})
+            if path.startswith('git/commits/'):
+                return self._send(200, {'tree': {'sha': gh.commits[path.rsplit('/', 1)[1]]['tree']}})
+            self._send(404, {'message': 'Not Found'})
+
+        def do_POST(self):
+            path = self._path()
+            body = self._body()
+            gh.requests.append(('POST', path))
+            if self._injected_failure():
+                return
+            if path == 'git/blobs':
+                data = base64.b64decode(body['content'])
+                sha = blob_sha(data)
+                gh.blobs[sha] = data if gh.keep_blobs else b''
+                return self._send(201, {'sha': sha})
+            if path == 'git/trees':
+                tree = dict(gh.trees[body['base_tree']]) if body.get('base_tree') else {}
+                for entry in body['tree']:
+                    if 'content' in entry:
+                        data = entry['content'].encode()
+                        gh.blobs[blob_sha(data)] = data
+                        tree[entry['path']] = blob_sha(data)
+                    elif entry['sha'] is None:
+                        tree.pop(entry['path'], None)
+                    elif entry['sha'] not in gh.blobs:
+                        return self._send(422, {'message': 'tree.sha is not a valid blob'})
+                    else:
+                        tree[entry['path']] = entry['sha']
+                sha = hashlib.sha1(json.dumps(sorted(tree.items())).encode()).hexdigest()
+                gh.trees[sha] = tree
+                return self._send(201, {'sha': sha})
+            if path == 'git/commits':
+                sha = hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest()
+                gh.commits[sha] = body
+                return self._send(201, {'sha': sha})
+            self._send(404, {'message': 'Not Found'})
+
+        def do_PATCH(self):
+            path = self._path()
+            body = self._body()
+            gh.requests.append(('PATCH', path))
+            if self._injected_failure():
+                return
+            if path.startswith('git/refs/heads/'):
+                if gh.ref not in gh.commits[body['sha']].get('parents', []) and not body.get('force'):
+                    return self._send(422, {'message': 'Update is not a fast forward'})
+                gh.ref = body['sha']
+                return self._send(200, {'object': {'sha': gh.ref}})
+            self._send(404, {'message': 'Not Found'})
+
+    return Handler
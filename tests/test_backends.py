@@ -0,0 +1,147 @@
+"""Conformance and throughput checks that every backup backend must pass.
+
+Local runs against a temporary directory, GitHub against the fake server in
+fake_github.py, and Dropbox against an in-memory client that speaks the real
+SDK's types (skipped when the dropbox package is not installed).
+"""
+import hashlib
+import os
+import time
+
+import pytest
+
+import bot
+
+
+class FakeDropboxClient:
+    """The subset of dropbox.Dropbox that DropboxBackend calls, backed by a dict"""
+
+    PAGE_SIZE = 3
+
+    def __init__(self):
+        import dropbox
+        self.sdk = dropbox
+        self.files = {}
+
+    def _not_found(self, error):
+        return self.sdk.exceptions.ApiError('request-id', error, None, None)
+
+    def files_upload(self, data, path, mode=None, mute=False):
+        self.files[path] = bytes(data)
+
+    def files_download(self, path):
+        if path not in self.files:
+            raise self._not_found(self.sdk.files.DownloadError.path(self.sdk.files.LookupError.not_found))
+        response = type('Response', (), {'content': self.files[path]})()
+        return self.sdk.files.FileMetadata(name=path.rsplit('/', 1)[1], path_display=path), response
+
+    def _page(self, paths):
+        entries = [self.sdk.files.FileMetadata(name=path.rsplit('/', 1)[1], path_display=path)
+                   for path in paths[:self.PAGE_SIZE]]
+        rest = paths[self.PAGE_SIZE:]
+        self._cursors = {'cursor': rest}
+        return self.sdk.files.ListFolderResult(entries=entries, cursor='cursor', has_more=bool(rest))
+
+    def files_list_folder(self, root, recursive=False):
+        paths = sorted(path for path in self.files if path.startswith(root + '/'))
+        if not paths:
+            raise self._not_found(self.sdk.files.ListFolderError.path(self.sdk.files.LookupError.not_found))
+        return self._page(paths)
+
+    def files_list_folder_continue(self, cursor):
+        return self._page(self._cursors[cursor])
+
+    def files_delete_v2(self, path):
+        if path not in self.files:
+            raise self._not_found(self.sdk.files.DeleteError.path_lookup(self.sdk.files.LookupError.not_found))
+        del self.files[path]
+
+
+@pytest.fixture(params=['local', 'github', 'dropbox'])
+def backend(request, db, backup_state, monkeypatch):
+    if request.param == 'local':
+        backend = bot.LocalBackend(str(db / 'store'))
+    elif request.param == 'github':
+        request.getfixturevalue('github')
+        backend = bot.backup_backend
+    else:
+        pytest.importorskip('dropbox')
+        backend = bot.DropboxBackend(token='token')
+        backend._client = FakeDropboxClient()
+    monkeypatch.setattr(bot, 'backup_backend', backend)
+    with bot.db_transaction() as cur:
+        bot.sync_change_log(cur)
+    return backend
+
+
+def chunk_key(data: bytes) -> str:
+    return f"{bot.BACKUP_CHUNK_DIR}/{hashlib.sha256(data).hexdigest()}"
+
+
+def test_put_get_list_delete(backend):
+    assert backend.is_configured()
+    assert backend.load_manifest() is None
+    one, two = chunk_key(b"one"), chunk_key(b"two")
+    one_locator, two_locator = backend.put(one, b"one"), backend.put(two, b"two")
+    assert backend.get(one, one_locator) == b"one"
+    assert backend.get(two, two_locator) == b"two"
+    with pytest.raises(KeyError):
+        backend.get(chunk_key(b"missing"), bot.git_blob_sha(b"missing"))
+
+    first = {'chunks': [{'sha256': one.rsplit('/', 1)[1], 'blob': one_locator},
+                        {'sha256': two.rsplit('/', 1)[1], 'blob': two_locator}], 'sha256': 'first'}
+    backend.publish(first, None, "first")
+    assert backend.load_manifest() == first
+    assert backend.current_manifest() == first
+    assert backend.list(bot.BACKUP_CHUNK_DIR) == sorted([one, two])
+
+    second = {'chunks': [{'sha256': two.rsplit('/', 1)[1], 'blob': two_locator}], 'sha256': 'second'}
+    backend.publish(second, first, "second", documents={bot.BACKUP_INDEX_KEY: b"[]"}, removed=[one])
+    assert backend.load_manifest() == second
+    assert backend.read(bot.BACKUP_INDEX_KEY) == b"[]"
+    assert backend.list(bot.BACKUP_CHUNK_DIR) == [two]
+
+    backend.delete(two)
+    backend.delete(two)  # deleting a missing object is not an error
+    assert backend.list(bot.BACKUP_CHUNK_DIR) == []
+
+
+def test_throughput(backend):
+    blobs = [os.urandom(256 * 1024) for _ in range(16)]
+    megabytes = len(blobs) * 256 / 1024
+
+    start = time.perf_counter()
+    locators = [backend.put(chunk_key(data), data) for data in blobs]
+    put_rate = megabytes / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    assert [backend.get(chunk_key(data), locator) for data, locator in zip(blobs, locators)] == blobs
+    get_rate = megabytes / (time.perf_counter() - start)
+
+    # A floor well below what each backend does locally, to catch per-object overhead regressions
+    assert put_rate > 5 and get_rate > 5, f"put {put_rate:.1f} MiB/s, get {get_rate:.1f} MiB/s"
+
+
+def test_backup_ship_and_restore(backend):
+    conf_id = bot.save_confession(1, "hi", None, None)
+    bot.save_comment(conf_id, 2, "first")
+    assert bot.backup_database()
+    bot.save_comment(conf_id, 3, "second")
+    assert bot.ship_change_log() > 0
+
+    bot.close_db_connections()
+    for name in os.listdir('.'):
+        if name.startswith(bot.DB_PATH):
+            os.remove(name)
+    assert bot.restore_database_from_github()
+    assert bot.get_comment_count_for_confession(conf_id) == 2
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        bot.create_backup_backend("s3")
+
+
+def test_local_keys_cannot_escape_the_directory(tmp_path):
+    with pytest.raises(ValueError):
+        bot.LocalBackend(str(tmp_path)).put("../outside", b"x")
@@ -0,0 +1,119 @@
+import os
+import time
+
+import pytest
+
+import bot
+
+
+@pytest.fixture(autouse=True)
+def one_second_versions(monkeypatch):
+    # Keep a version per second, so backups a second apart are both retained
+    monkeypatch.setattr(bot, 'BACKUP_RETENTION', [(1, 100)])
+
+
+@pytest.fixture(params=['local_store', 'github'])
+def store(request):
+    return request.getfixturevalue(request.param)
+
+
+def nickname(user_id: int) -> str:
+    with bot.db_cursor() as cur:
+        cur.execute("SELECT nickname FROM user_profiles WHERE user_id = ?", (user_id,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def crash_and_restore():
+    bot.close_db_connections()
+    for name in os.listdir('.'):
+        if name.startswith(bot.DB_PATH):
+            os.remove(name)
+    bot.profile_cache.clear()
+    assert bot.restore_database_from_github()
+
+
+def test_versions_are_listed_and_restorable(store):
+    bot.update_user_profile(1, nickname="First")
+    assert bot.backup_database()
+    time.sleep(1.1)
+    bot.update_user_profile(2, nickname="Second")
+    assert bot.backup_database()
+
+    versions = bot.list_backup_versions()
+    assert len(versions) == 2
+    assert bot.restore_database_from_github("2")
+    assert nickname(1) == "First" and nickname(2) is None
+    assert bot.restore_database_from_github("nope") is False
+
+
+def test_changes_after_a_version_restore_extend_the_restored_timeline(store):
+    bot.update_user_profile(1, nickname="Kept")
+    assert bot.backup_database()
+    time.sleep(1.1)
+    bot.update_user_profile(3, nickname="NewTimeline")
+    assert bot.backup_database()
+    bot.update_user_profile(5, nickname="Shipped")
+    assert bot.ship_change_log() > 0
+
+    assert bot.restore_database_from_github("2")
+    assert nickname(3) is None
+    bot.update_user_profile(4, nickname="AfterRestore")
+    assert bot.ship_change_log() > 0
+
+    crash_and_restore()
+    assert nickname(1) == "Kept"
+    assert nickname(4) == "AfterRestore"
+    assert nickname(3) is None
+    assert nickname(5) is None
+
+    # The next snapshot builds on the restored head too
+    assert bot.backup_database()
+    crash_and_restore()
+    assert (nickname(3), nickname(4)) == (None, "AfterRestore")
+
+
+def test_failed_swap_leaves_the_remote_head_alone(store, monkeypatch):
+    bot.update_user_profile(1, nickname="Old")
+    assert bot.backup_database()
+    time.sleep(1.1)
+    bot.update_user_profile(1, nickname="Head")
+    assert bot.backup_database()
+    head = bot.backup_backend.load_manifest()
+
+    def failing_swap(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(bot, 'replace_database_file', failing_swap)
+    assert bot.restore_database_from_github("2") is False
+    bot.backup_backend.refresh()
+    assert bot.backup_backend.load_manifest() == head
+    assert nickname(1) == "Head"
+
+
+def test_failed_publish_keeps_the_restore_and_snapshots_it(store, monkeypatch):
+    bot.update_user_profile(1, nickname="Old")
+    assert bot.backup_database()
+    time.sleep(1.1)
+    bot.update_user_profile(1, nickname="Head")
+    assert bot.backup_database()
+    head = bot.backup_backend.load_manifest()
+    snapshots = []
+    monkeypatch.setattr(bot.backup_worker, 'request_immediate', lambda: snapshots.append(True))
+
+    def failing_publish(*args, **kwargs):
+        raise bot.BackupConflict("head moved")
+
+    with monkeypatch.context() as m:
+        m.setattr(bot, 'publish_backup', failing_publish)
+        assert bot.restore_database_from_github("2")
+    assert nickname(1) == "Old"
+    assert snapshots
+    assert bot.backup_backend.load_manifest() == head
+
+    # Nothing of the restored timeline ships onto the old head; the snapshot replaces it
+    bot.update_user_profile(2, nickname="AfterRestore")
+    assert bot.ship_change_log() == 0
+    assert bot.backup_database()
+    crash_and_restore()
+    assert (nickname(1), nickname(2)) == ("Old", "AfterRestore")
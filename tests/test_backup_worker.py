@@ -0,0 +1,55 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from telegram import Chat, Message, Update, User
+
+import bot
+
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    # Never uploads on its own schedule, so the thread stays idle once the test is over
+    worker = bot.BackupWorker(min_interval=0, max_staleness=10 ** 9)
+    monkeypatch.setattr(bot, 'backup_worker', worker)
+    return worker
+
+
+def run_test_command(stub: StubBot):
+    chat = Chat(id=bot.ADMIN_USER_ID, type=Chat.PRIVATE)
+    message = Message(message_id=1, date=datetime.now(), chat=chat, text="/test_github_backup",
+                      from_user=User(id=bot.ADMIN_USER_ID, first_name="admin", is_bot=False))
+    message.set_bot(stub)
+    asyncio.run(bot.test_github_backup(Update(update_id=1, message=message), None))
+
+
+def test_run_now_waits_for_the_upload(local_store, worker):
+    bot.save_confession(1, "hello", None, None)
+    assert worker.run_now(30) is True
+    assert local_store.load_manifest() is not None
+
+
+def test_command_reports_a_failed_upload(local_store, worker, monkeypatch):
+    def unreachable(key, data):
+        raise OSError("backend unreachable")
+
+    monkeypatch.setattr(local_store, 'put', unreachable)
+    stub = StubBot()
+    run_test_command(stub)
+    assert "Failed" in stub.sent[-1]
+    assert "backend unreachable" in stub.sent[-1]
+
+
+def test_command_reports_a_successful_upload(local_store, worker):
+    stub = StubBot()
+    run_test_command(stub)
+    assert "Successful" in stub.sent[-1]
+    assert "uploaded" in stub.sent[-1]
@@ -0,0 +1,93 @@
+import json
+import os
+
+import pytest
+
+import bot
+
+
+def logged(op=None):
+    with bot.db_cursor() as cur:
+        cur.execute("SELECT tbl, op, data FROM change_log WHERE ? IS NULL OR op = ? ORDER BY seq", (op, op))
+        return cur.fetchall()
+
+
+def crash_and_restore():
+    bot.close_db_connections()
+    for name in os.listdir('.'):
+        if name.startswith(bot.DB_PATH):
+            os.remove(name)
+    bot.profile_cache.clear()
+    assert bot.restore_database_from_github()
+
+
+@pytest.fixture
+def requested_snapshots(monkeypatch):
+    requests = []
+    monkeypatch.setattr(bot.backup_worker, 'request_immediate', lambda: requests.append(True))
+    return requests
+
+
+def test_nothing_is_logged_without_a_backend(db, monkeypatch):
+    monkeypatch.setattr(bot, 'GITHUB_ACCESS_TOKEN', None)
+    monkeypatch.setattr(bot, 'backup_backend', bot.GitHubBackend(bot.GitHubTransport()))
+    with bot.db_transaction() as cur:
+        assert not bot.sync_change_log(cur)
+    bot.save_confession(1, "hello", None, None)
+    assert logged() == []
+
+
+def test_counter_updates_log_only_the_changed_columns(local_store):
+    conf_id = bot.save_confession(1, "confession", None, None)
+    comment_id = bot.save_comment(conf_id, 2, "a long comment " * 50)
+    with bot.db_transaction() as cur:
+        cur.execute("DELETE FROM change_log")
+    bot.process_vote(comment_id, 3, 'like')
+
+    patches = {tbl: json.loads(data) for tbl, op, data in logged('P')}
+    assert patches['comments'] == {'likes': 1}
+    assert list(patches['user_profiles']) == ['aura_points']
+
+
+def test_patches_replay_onto_the_snapshot(local_store):
+    conf_id = bot.save_confession(1, "confession", None, None)
+    comment_id = bot.save_comment(conf_id, 2, "comment")
+    assert bot.backup_database()
+    bot.process_vote(comment_id, 3, 'like')
+    bot.process_vote(comment_id, 4, 'dislike')
+    assert bot.ship_change_log() > 0
+
+    crash_and_restore()
+    assert bot.get_comment_vote_counts(comment_id) == {'likes': 1, 'dislikes': 1}
+    assert bot.get_comment(comment_id)['content'] == "comment"
+
+
+def test_log_is_bounded_before_the_first_snapshot(local_store, monkeypatch):
+    monkeypatch.setattr(bot, 'CHANGE_LOG_MAX_ROWS', 10)
+    for i in range(30):
+        bot.save_confession(i, "hello", None, None)
+    assert bot.ship_change_log() == 0
+    assert len(logged()) <= 11
+    assert len(logged('G')) == 1
+
+
+def test_pruned_log_waits_for_a_snapshot(local_store, monkeypatch, requested_snapshots):
+    monkeypatch.setattr(bot, 'CHANGE_LOG_MAX_ROWS', 10)
+    assert bot.backup_database()
+    for i in range(30):
+        bot.save_confession(i, "pruned from the log", None, None)
+    # The backend is unreachable, so the shipper prunes instead of letting the log grow
+    assert bot.prune_change_log() > 0
+    assert bot.ship_change_log() == 0
+    assert requested_snapshots
+
+    assert bot.backup_database()
+    conf_id = bot.save_confession(99, "after the snapshot", None, None)
+    assert bot.ship_change_log() == 1
+    assert logged() == []
+
+    crash_and_restore()
+    assert bot.get_confession(conf_id)['content'] == "after the snapshot"
+    with bot.db_cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM confessions")
+        assert cur.fetchone()[0] == 31
@@ -0,0 +1,97 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+
+
+VIEWER_ID = 999
+
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+        self.get_me_calls = 0
+
+    async def get_me(self):
+        self.get_me_calls += 1
+        return SimpleNamespace(username="stub_bot")
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append(text)
+        return SimpleNamespace(message_id=len(self.sent))
+
+
+@pytest.fixture
+def statements(db, monkeypatch):
+    """Every statement run on a pooled connection, PRAGMAs aside"""
+    executed = []
+    open_db_connection = bot._open_db_connection
+
+    def traced():
+        conn = open_db_connection()
+        conn.set_trace_callback(lambda sql: None if sql.startswith('PRAGMA') else executed.append(sql))
+        return conn
+
+    monkeypatch.setattr(bot, '_open_db_connection', traced)
+    bot.close_db_connections()
+    return executed
+
+
+def confession_with_comments(roots: int) -> int:
+    conf_id = bot.save_confession(1, "confession", None, None)
+    bot.set_confession_status(conf_id, 'approved')
+    for i in range(roots):
+        comment_id = bot.save_comment(conf_id, 100 + i, f"comment {i}")
+        bot.save_comment(conf_id, 200 + i, f"reply {i}", comment_id)
+    return conf_id
+
+
+def render(conf_id: int, stub: StubBot):
+    update = SimpleNamespace(effective_chat=SimpleNamespace(id=VIEWER_ID), effective_user=SimpleNamespace(id=VIEWER_ID))
+    context = SimpleNamespace(bot=stub, application=SimpleNamespace(bot=stub), bot_data={}, user_data={})
+    asyncio.run(bot.show_comments(update, context, conf_id))
+
+
+def reads_per_page(statements, roots: int) -> int:
+    conf_id = confession_with_comments(roots)
+    stub = StubBot()
+    statements.clear()
+    render(conf_id, stub)
+    # One message per comment and reply, plus the pagination footer
+    assert len(stub.sent) == 2 * roots + 1
+    return len([sql for sql in statements if sql.lstrip().upper().startswith(('SELECT', 'WITH'))])
+
+
+def test_page_reads_do_not_grow_with_comment_count(statements, monkeypatch):
+    monkeypatch.setattr(bot, 'COMMENTS_PER_PAGE', 50)
+    small = reads_per_page(statements, 5)
+    large = reads_per_page(statements, 50)
+    assert 0 < small == large <= 5
+
+
+def test_comment_page_makes_no_get_me_calls(db, monkeypatch):
+    monkeypatch.setattr(bot, 'COMMENTS_PER_PAGE', 50)
+    conf_id = bot.save_confession(1, "confession", None, None)
+    bot.set_confession_status(conf_id, 'approved')
+    for i in range(50):
+        bot.save_comment(conf_id, 100 + i, f"comment {i}")
+    stub = StubBot()
+
+    async def answer():
+        pass
+
+    async def delete_message():
+        pass
+
+    query = SimpleNamespace(data=f"comment_page:{conf_id}:1", answer=answer, delete_message=delete_message)
+    update = SimpleNamespace(callback_query=query, effective_chat=SimpleNamespace(id=VIEWER_ID),
+                             effective_user=SimpleNamespace(id=VIEWER_ID))
+    context = SimpleNamespace(bot=stub, application=SimpleNamespace(bot=stub),
+                              bot_data={'bot_username': "cached_bot"}, user_data={})
+    asyncio.run(bot.comment_page_callback(update, context))
+
+    assert len(stub.sent) == 51
+    assert stub.get_me_calls == 0
+    assert all("https://t.me/cached_bot?start=profile_" in text for text in stub.sent[:50])
@@ -0,0 +1,8 @@
+import bot
+
+
+def test_export_tables_exist(db):
+    bot.save_confession(1, "hello", None, None)
+    counts = bot.get_table_row_counts(bot.EXPORT_TABLES)
+    assert set(counts) == set(bot.EXPORT_TABLES)
+    assert counts['confessions'] == 1
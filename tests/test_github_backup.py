@@ -0,0 +1,119 @@
+import json
+import os
+import tracemalloc
+
+import pytest
+
+import bot
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(bot, 'BACKUP_CHUNK_SIZE', CHUNK_SIZE)
+    monkeypatch.setattr(bot, 'BACKUP_MAX_DELTA_BYTES', 4 * CHUNK_SIZE)
+
+
+def fill(rows: int, size: int = 2000):
+    """Incompressible confessions, so chunks stay close to CHUNK_SIZE after compression"""
+    with bot.db_transaction() as cur:
+        for i in range(rows):
+            cur.execute("INSERT INTO confessions (user_id, content, status) VALUES (?, ?, 'pending')",
+                        (i, os.urandom(size // 2).hex()))
+
+
+def drop_local_database():
+    bot.close_db_connections()
+    for name in os.listdir('.'):
+        if name.startswith(bot.DB_PATH):
+            os.remove(name)
+
+
+def test_backup_uploads_chunks_and_restores(github):
+    conf_id = bot.save_confession(1, "hello", None, None)
+    bot.save_comment(conf_id, 2, "first")
+    fill(1500)
+
+    assert bot.backup_database()
+    tree = github.head_tree()
+    manifest = json.loads(github.file(bot.BACKUP_MANIFEST_KEY))
+    assert len(manifest['chunks']) > 10
+    assert {f"{bot.BACKUP_CHUNK_DIR}/{chunk['sha256']}" for chunk in manifest['chunks']} <= set(tree)
+    # Every request carries at most one base64-encoded chunk
+    assert github.max_body < 2 * CHUNK_SIZE
+
+    drop_local_database()
+    assert bot.restore_database_from_github()
+    assert bot.get_comment_count_for_confession(conf_id) == 1
+
+
+def test_backup_memory_is_bounded_by_chunk_size(github):
+    github.keep_blobs = False
+    fill(4000)
+    tracemalloc.start()
+    try:
+        assert bot.backup_database()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Chunks are streamed from disk; what grows with the database is only the per-page fingerprints
+    assert peak < os.path.getsize(bot.DB_PATH) / 8
+
+
+def test_unchanged_database_uploads_nothing(github):
+    fill(300)
+    assert bot.backup_database()
+    blobs = github.count('POST', 'git/blobs')
+    commits = github.count('POST', 'git/commits')
+
+    assert bot.backup_database()
+    assert github.count('POST', 'git/blobs') == blobs
+    assert github.count('POST', 'git/commits') == commits
+
+
+def test_small_change_uploads_few_objects(github):
+    conf_id = bot.save_confession(1, "hello", None, None)
+    fill(1500)
+    assert bot.backup_database()
+    blobs = github.count('POST', 'git/blobs')
+
+    bot.save_comment(conf_id, 2, "new")
+    assert bot.backup_database()
+    assert github.count('POST', 'git/blobs') - blobs <= 3
+
+    drop_local_database()
+    assert bot.restore_database_from_github()
+    assert bot.get_comment_count_for_confession(conf_id) == 1
+
+
+def test_transient_errors_are_retried(github):
+    bot.save_confession(1, "hello", None, None)
+    github.fail = [503, 502]
+    assert bot.backup_database()
+    assert github.fail == []
+
+
+def test_corrupt_chunk_fails_restore_and_keeps_database(github):
+    conf_id = bot.save_confession(1, "hello", None, None)
+    fill(200)
+    assert bot.backup_database()
+    manifest = json.loads(github.file(bot.BACKUP_MANIFEST_KEY))
+    github.blobs[manifest['chunks'][2]['blob']] = bot.compress_backup(b"x" * 10)
+
+    assert not bot.restore_database_from_github()
+    assert bot.get_confession(conf_id)['content'] == "hello"
+    assert not [name for name in os.listdir('.') if name.endswith(('.snapshot', '.restore'))]
+
+
+def test_legacy_single_file_backup_restores(github):
+    conf_id = bot.save_confession(1, "legacy", None, None)
+    snapshot = bot.create_db_snapshot()
+    with open(snapshot, 'rb') as f:
+        github.seed(bot.GITHUB_BACKUP_PATH, f.read())
+    os.remove(snapshot)
+
+    drop_local_database()
+    assert bot.restore_database_from_github()
+    assert bot.get_confession(conf_id)['content'] == "legacy"
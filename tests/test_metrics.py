@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+import bot
+import keep_alive
+
+
+@pytest.fixture
+def client():
+    return keep_alive.app.test_client()
+
+
+def test_metrics_are_served_to_local_scrapes(client, monkeypatch):
+    monkeypatch.setattr(keep_alive, '_metrics_token', None)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert 'backup_runs_total' in body and 'send_queue_depth' in body
+
+
+def test_remote_scrapes_are_refused_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(keep_alive, '_metrics_token', None)
+    assert client.get('/metrics', environ_base={'REMOTE_ADDR': '203.0.113.7'}).status_code == 403
+
+
+def test_token_is_required_when_configured(client, monkeypatch):
+    monkeypatch.setattr(keep_alive, '_metrics_token', 'secret')
+    remote = {'REMOTE_ADDR': '203.0.113.7'}
+    assert client.get('/metrics', environ_base=remote).status_code == 403
+    assert client.get('/metrics', environ_base=remote, headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/metrics', environ_base=remote, headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+
+def test_metrics_do_not_touch_the_database(client, tmp_path, monkeypatch):
+    # A pending startup restore: no database file yet, and scraping must not create one
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(keep_alive, '_metrics_token', None)
+    bot.close_db_connections()
+    assert client.get('/metrics').status_code == 200
+    assert not os.path.exists(bot.DB_PATH)
+
+
+def test_change_log_backlog_is_tracked_in_memory(monkeypatch):
+    shipper = bot.ChangeLogShipper()
+    assert shipper.backlog() == (0, 0.0)
+    shipper.mark_pending()
+    shipper.mark_pending()
+    writes, lag = shipper.backlog()
+    assert writes == 2 and lag >= 0.0
@@ -0,0 +1,11 @@
+import bot
+
+
+def test_hot_queries_use_indexes(db):
+    assert bot.verify_query_plans() == []
+
+
+def test_missing_index_is_reported(db):
+    with bot.db_transaction() as cur:
+        cur.execute("DROP INDEX idx_chat_messages_chat")
+    assert any(problem.startswith("chat_messages:") for problem in bot.verify_query_plans())
@@ -0,0 +1,24 @@
+import pytest
+
+import bot
+
+
+def test_row_factory_fills_slots(db):
+    conf_id = bot.save_confession(7, "text", None, None)
+    with bot.db_cursor() as cur:
+        cur.row_factory = bot._confession_row
+        cur.execute(f"SELECT {bot.CONFESSION_COLUMNS} FROM confessions WHERE id = ?", (conf_id,))
+        conf = cur.fetchone()
+    assert isinstance(conf, bot.Confession)
+    assert (conf.id, conf.user_id, conf['content'], conf.get('file_id')) == (conf_id, 7, "text", None)
+
+
+def test_aliased_columns_map_to_their_alias(db):
+    build = bot.record_factory(bot.Comment, "c.id, conf.content AS conf_content")
+    comment = build(None, (3, "parent"))
+    assert (comment.id, comment.conf_content) == (3, "parent")
+
+
+def test_unknown_column_is_rejected():
+    with pytest.raises(ValueError):
+        bot.record_factory(bot.Comment, "id, nope")
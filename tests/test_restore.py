@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+import tracemalloc
+
+import pytest
+
+import bot
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+@pytest.fixture(autouse=True)
+def small_chunks(monkeypatch):
+    monkeypatch.setattr(bot, 'BACKUP_CHUNK_SIZE', CHUNK_SIZE)
+    monkeypatch.setattr(bot, 'BACKUP_MAX_DELTA_BYTES', 4 * CHUNK_SIZE)
+
+
+def fill(rows: int, size: int = 2000):
+    with bot.db_transaction() as cur:
+        for i in range(rows):
+            cur.execute("INSERT INTO confessions (user_id, content, status) VALUES (?, ?, 'pending')",
+                        (i, os.urandom(size // 2).hex()))
+
+
+def confession_count() -> int:
+    with bot.db_cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM confessions")
+        return cur.fetchone()[0]
+
+
+def traced_restore() -> int:
+    tracemalloc.start()
+    try:
+        assert bot.restore_database_from_github()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_chunked_restore_memory_is_bounded(github):
+    fill(4000)
+    assert bot.backup_database()
+    size = os.path.getsize(bot.DB_PATH)
+
+    peak = traced_restore()
+    assert peak < size / 8
+    assert confession_count() == 4000
+
+
+def test_legacy_restore_is_streamed(github):
+    fill(6000)
+    snapshot = bot.create_db_snapshot()
+    size = os.path.getsize(snapshot)
+    with open(snapshot, 'rb') as f:
+        github.seed(bot.GITHUB_BACKUP_PATH, f.read())
+    os.remove(snapshot)
+
+    peak = traced_restore()
+    # The old path held the base64 JSON body and the decoded file at once, about 2.5x the size
+    assert peak < size / 8
+    assert confession_count() == 6000
+
+
+def test_tampered_row_counts_keep_the_live_database(github):
+    conf_id = bot.save_confession(1, "live", None, None)
+    assert bot.backup_database()
+    manifest = json.loads(github.file(bot.BACKUP_MANIFEST_KEY))
+    manifest['tables']['confessions'] += 1
+    github.seed(bot.BACKUP_MANIFEST_KEY, json.dumps(manifest).encode())
+
+    assert not bot.restore_database_from_github()
+    assert bot.get_confession(conf_id)['content'] == "live"
+
+
+def test_restore_waits_for_a_running_backup(github, monkeypatch):
+    fill(200)
+    assert bot.backup_database()
+    snapshotting = threading.Event()
+    resume = threading.Event()
+    create_db_snapshot = bot.create_db_snapshot
+
+    def slow_snapshot():
+        snapshotting.set()
+        assert resume.wait(10)
+        return create_db_snapshot()
+
+    monkeypatch.setattr(bot, 'create_db_snapshot', slow_snapshot)
+    backup = threading.Thread(target=bot.backup_database)
+    backup.start()
+    assert snapshotting.wait(10)
+    restored = []
+    restore = threading.Thread(target=lambda: restored.append(bot.restore_database_from_github()))
+    restore.start()
+    restore.join(0.5)
+    try:
+        assert restore.is_alive()
+    finally:
+        resume.set()
+        backup.join()
+        restore.join()
+    assert restored == [True]
+
+
+def test_restore_is_gated_against_queries_and_backups(github):
+    fill(1000)
+    assert bot.backup_database()
+    errors = []
+    stop = threading.Event()
+
+    def run(work):
+        while not stop.is_set():
+            try:
+                work()
+            except Exception as e:  # pragma: no cover - reported below
+                errors.append(repr(e))
+
+    workers = [threading.Thread(target=run, args=(confession_count,)) for _ in range(3)]
+    workers.append(threading.Thread(target=run, args=(lambda: bot.save_confession(7, "during", None, None),)))
+    workers.append(threading.Thread(target=run, args=(bot.backup_database,)))
+    for worker in workers:
+        worker.start()
+    try:
+        for _ in range(3):
+            assert bot.restore_database_from_github()
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    assert errors == []
+    assert bot.verify_database_file(bot.DB_PATH)
+    previous = [name for name in os.listdir('.') if name.startswith(bot.DB_PATH + '.backup.')]
+    assert previous
+    for name in previous:
+        assert bot.verify_database_file(name)
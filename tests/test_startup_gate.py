@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from telegram import Chat, Message, Update, User
+from telegram.ext import ApplicationHandlerStop
+
+import bot
+
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent.append((chat_id, text))
+
+
+def command_update(user_id: int, text: str, stub: StubBot) -> Update:
+    chat = Chat(id=user_id, type=Chat.PRIVATE)
+    message = Message(message_id=1, date=datetime.now(), chat=chat, text=text,
+                      from_user=User(id=user_id, first_name="user", is_bot=False))
+    message.set_bot(stub)
+    return Update(update_id=1, message=message)
+
+
+@pytest.fixture
+def restoring(monkeypatch):
+    monkeypatch.setattr(bot, 'startup', bot.StartupState())
+
+
+def gate(update: Update) -> bool:
+    """True when the update is let through"""
+    try:
+        asyncio.run(bot.degraded_mode_gate(update, None))
+    except ApplicationHandlerStop:
+        return False
+    return True
+
+
+@pytest.mark.parametrize('text', ['/github_restore', '/backup', '/status', '/export', 'hello'])
+def test_admin_cannot_touch_the_database_while_restoring(restoring, text):
+    stub = StubBot()
+    assert not gate(command_update(bot.ADMIN_USER_ID, text, stub))
+    assert '/backup_status' in stub.sent[0][1]
+
+
+def test_admin_can_check_backup_status_while_restoring(restoring):
+    stub = StubBot()
+    assert gate(command_update(bot.ADMIN_USER_ID, f'/backup_status@{bot.BOT_USERNAME}', stub))
+    assert stub.sent == []
+
+
+def test_users_are_turned_away_while_restoring(restoring):
+    stub = StubBot()
+    assert not gate(command_update(12345, '/backup_status', stub))
+    assert 'restoring' in stub.sent[0][1]
+
+
+def test_everything_passes_once_ready(restoring):
+    bot.startup.ready.set()
+    assert gate(command_update(bot.ADMIN_USER_ID, '/github_restore', StubBot()))
+    assert gate(command_update(12345, '/start', StubBot()))
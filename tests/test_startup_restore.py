@@ -0,0 +1,61 @@
+import asyncio
+import os
+
+import pytest
+
+import bot
+from test_startup_gate import StubBot, command_update, gate
+
+
+@pytest.fixture
+def startup(monkeypatch):
+    """A fresh startup whose finish is recorded instead of run"""
+    state = bot.StartupState()
+    finished = []
+    monkeypatch.setattr(bot, 'startup', state)
+    monkeypatch.setattr(bot, 'finish_startup', lambda: finished.append(True))
+    monkeypatch.setattr(bot, 'STARTUP_RESTORE_RETRY_SECONDS', 0)
+    state.finished = finished
+    return state
+
+
+def test_rejected_credentials_are_not_retried(github, startup):
+    github.fail = [401]
+    bot.restore_on_startup()
+    assert startup.restore_attempts == 1
+    assert '401' in startup.failure
+    assert startup.finished == [] and not startup.ready.is_set()
+
+
+def test_missing_backup_objects_are_not_retried(local_store, startup):
+    bot.save_confession(1, "backed up", None, None)
+    assert bot.backup_database()
+    chunk_dir = os.path.join(local_store.root, bot.BACKUP_CHUNK_DIR)
+    for name in os.listdir(chunk_dir):
+        os.remove(os.path.join(chunk_dir, name))
+
+    bot.restore_on_startup()
+    assert startup.restore_attempts == 1
+    assert startup.failure.startswith('KeyError')
+    assert startup.finished == []
+
+
+def test_transient_errors_are_retried(github, startup):
+    assert bot.backup_database()
+    github.fail = [503] * (bot.GITHUB_MAX_RETRIES + 1)
+    bot.restore_on_startup()
+    assert startup.restore_attempts == 2
+    assert startup.failure is None
+    assert startup.finished == [True]
+
+
+def test_admin_hears_of_the_failure(startup):
+    startup.fail("HTTPError: 401 Client Error")
+    stub = StubBot()
+    asyncio.run(startup.attach(stub))
+    assert stub.sent[0][0] == bot.ADMIN_USER_ID
+    assert "401" in stub.sent[0][1]
+
+    stub = StubBot()
+    assert not gate(command_update(bot.ADMIN_USER_ID, '/status', stub))
+    assert "will not be retried" in stub.sent[0][1]
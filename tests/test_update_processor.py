@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+
+import bot
+
+
+def message_update(update_id: int, user_id: int) -> Update:
+    chat = Chat(id=user_id, type=Chat.PRIVATE)
+    message = Message(message_id=update_id, date=datetime.now(), chat=chat, text="hi",
+                      from_user=User(id=user_id, first_name="user", is_bot=False))
+    return Update(update_id=update_id, message=message)
+
+
+def run(updates):
+    """Feed updates to a fresh processor; returns (event, update_id) in the order handlers saw them"""
+    events = []
+
+    async def handle(update: Update):
+        events.append(('start', update.update_id))
+        await asyncio.sleep(0.05)
+        events.append(('end', update.update_id))
+
+    async def main():
+        processor = bot.PerUserUpdateProcessor()
+        await asyncio.gather(*(processor.process_update(update, handle(update)) for update in updates))
+        assert processor._lanes == {}
+
+    asyncio.run(main())
+    return events
+
+
+def test_one_users_updates_run_one_at_a_time():
+    events = run([message_update(1, 7), message_update(2, 7)])
+    assert events == [('start', 1), ('end', 1), ('start', 2), ('end', 2)]
+
+
+def test_different_users_run_concurrently():
+    events = run([message_update(1, 7), message_update(2, 8)])
+    assert events[:2] == [('start', 1), ('start', 2)]